@@ -0,0 +1,29 @@
+"""Times a temperature sweep of one fluid with :class:`PengRobinson` against one
+:func:`peng_robinson` call per state.
+
+Run from the repository root with ``python -m benchmarks.eos_objects``
+"""
+import timeit
+import numpy as np
+from cheme_calculations.thermodynamics import PengRobinson, peng_robinson
+from cheme_calculations.units.units import Pressure, Temperature
+
+
+def main(states: int=500, repeat: int=3):
+    T = np.linspace(250, 450, states)
+    fluid = PengRobinson(369.83, 42.48E5, 0.152)
+    Tc = Temperature(369.83, "K")
+    Pc = Pressure(4248, "kPa")
+    P = Pressure(2000, "kPa")
+
+    def free_functions():
+        return [peng_robinson(Temperature(t, "K"), P, Tc, Pc, "vapor", 0.152, 6) for t in T]
+
+    loop_time = min(timeit.repeat(free_functions, number=1, repeat=repeat))
+    object_time = min(timeit.repeat(lambda: fluid.z(T, 2E6), number=1, repeat=repeat))
+    print(f"{states} states: free functions {loop_time*1E3:.2f} ms, "
+          f"PengRobinson.z {object_time*1E3:.3f} ms ({loop_time/object_time:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
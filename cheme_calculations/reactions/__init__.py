@@ -1,3 +1,10 @@
+from .formula import *
 from .balance import *
+from .network import *
 from .reaction_parameters import *
-from .reactor_design import *
\ No newline at end of file
+from .reactor_design import *
+from .kinetic_fitting import *
+from .reactor_simulation import *
+from .flowsheet import *
+from .mechanism import *
+from .equilibrium import *
\ No newline at end of file
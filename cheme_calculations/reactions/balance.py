@@ -1,112 +1,174 @@
-from collections import defaultdict
-from email.mime import multipart
-from fractions import Fraction
+from collections import namedtuple, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 import math
-from pprint import pprint
+import os
 import re
-from itertools import chain
-from typing import List
-import numpy as np
+from typing import Iterable, Iterator, List
+from .formula import InvalidFormula, InvalidParentheses, parse_formula
 
 
-class InvalidParentheses(Exception):
+class ImproperChemicalEquation(Exception):
     pass
 
-class ImproperChemicalEquation:
+class MultipleIndependentReactions(Exception):
     pass
 
-__all__ = ["balance_equation"]
+__all__ = ["balance_equation", "balance_equations", "independent_reactions", "BalanceResult"]
 
 
-def _check_valid_parenthese(equation: str):
-    char_list = ["()"]
-    while any(x in equation for x in char_list):
-        for char in char_list:
-            equation = equation.replace(char, "")
-    return not equation
+BalanceResult = namedtuple(
+    'BalanceResult', ["equation", "reactants", "products", "coefficients", "status", "message"]
+)
 
+# status of each result from balance_equations
+BALANCED = "balanced"
+UNBALANCEABLE = "unbalanceable"
+MULTIPLE = "multiple"
+INVALID = "invalid"
 
-def _get_chemical_dict(chemical_dict: dict, search_group: str, multiplier: int):
-    elements = re.findall(r"[A-Z][a-z]?\d+|[A-Z][a-z]?", search_group)      
-    # pair them up 
-    for element in elements:
-        if re.findall(r"\d", element):
-            coefficient = re.findall(r"\d+", element)
-            ele, _ = re.split("\d+", element)
-            chemical_dict[ele] += int(coefficient[0])*multiplier
-        else:
-            chemical_dict[element] += 1*multiplier
-    return chemical_dict
 
+def _integer_nullspace(matrix: List[List[int]])-> List[List[int]]:
+    # fraction free gauss-jordan elimination, every row is kept as integers (divided
+    # through by its gcd) so the result is exact for coefficients of any size
+    rows = [list(row) for row in matrix]
+    n_cols = len(rows[0]) if rows else 0
+    pivots = []
+    r = 0
+    for c in range(n_cols):
+        if r == len(rows):
+            break
+        pivot = next((i for i in range(r, len(rows)) if rows[i][c] != 0), None)
+        if pivot is None:
+            continue
+        rows[r], rows[pivot] = rows[pivot], rows[r]
+        for i in range(len(rows)):
+            if i != r and rows[i][c] != 0:
+                a, b = rows[r][c], rows[i][c]
+                rows[i] = [a*x - b*y for x, y in zip(rows[i], rows[r])]
+                g = math.gcd(*rows[i])
+                if g > 1:
+                    rows[i] = [x//g for x in rows[i]]
+        pivots.append(c)
+        r += 1
+    
+    # one basis vector per free column, x_free = L and x_pivot = -row[free]*L/row[pivot]
+    # with L the lcm of the pivots so every entry is an integer
+    basis = []
+    for free in (c for c in range(n_cols) if c not in pivots):
+        multiple = math.lcm(*(rows[i][p] for i, p in enumerate(pivots))) if pivots else 1
+        vector = [0]*n_cols
+        vector[free] = multiple
+        for i, p in enumerate(pivots):
+            vector[p] = -rows[i][free]*multiple//rows[i][p]
+        g = math.gcd(*vector)
+        # the first nonzero coefficient is made positive
+        sign = 1 if next(x for x in vector if x != 0) > 0 else -1
+        basis.append([sign*x//g for x in vector])
+    
+    return basis
 
 
-def _get_fraction_lcm(fraction_list: List[Fraction]):
-    frac_tuples = [x.as_integer_ratio() for x in fraction_list]
-    num = [x[0] for x in frac_tuples]
-    den = [x[1] for x in frac_tuples]
+def _format_reaction(coefficients: List[int], reactants: List[str], products: List[str])-> str:
+    # coefficients are positive for species on their own side, species with a zero
+    # coefficient are left out and species with a negative one swap sides
+    n = len(reactants)
+    left = ([(c, x) for c, x in zip(coefficients[:n], reactants) if c > 0]
+            + [(-c, x) for c, x in zip(coefficients[n:], products) if c < 0])
+    right = ([(c, x) for c, x in zip(coefficients[n:], products) if c > 0]
+             + [(-c, x) for c, x in zip(coefficients[:n], reactants) if c < 0])
+    
+    # return string
+    reactant_string = " + ".join([f"{float(x)} {y}" for x, y in left])
+    product_string = " + ".join([f"{float(x)} {y}" for x, y in right])
     
-    numerator = math.gcd(*num)
-    denominator = math.lcm(*den)
+    return f"{reactant_string} -> {product_string}"
 
 
-    return Fraction(denominator/numerator).limit_denominator()
+# a + between species is surrounded by spaces or sits between two formulas ie Al+O2,
+# a + at the end of a formula is a charge ie NH4+ + OH-
+SPECIES_SEPARATOR = re.compile(r"\s+\+\s+|(?<=[A-Za-z0-9)\]])\+(?=[A-Z(\[])")
 
 
-def _parse_equation_side(side: List[str]):
+def _split_equation(equation: str)-> tuple:
+    # split on the arrow 
+    left_side, right_side = equation.split("->")
     
-    molecule_list = []
-    for molecule in side:
+    # split on the + and strip whitespace
+    reactants = [x.strip() for x in SPECIES_SEPARATOR.split(left_side.strip())]
+    products = [x.strip() for x in SPECIES_SEPARATOR.split(right_side.strip())]
     
-        paren_groups = re.findall(r"\(.+\)", molecule)
+    return reactants, products
 
-        if paren_groups:
-            for paren_group in paren_groups:
-                
-                # add backslashes
-                paren_group = re.sub("\(", "\\(", paren_group)
-                paren_group = re.sub("\)", "\\)", paren_group)
-                
-                ## do workaround for now as regex is not working 
-                # TODO make this better
-                idx = molecule.index(")")
-                
-                # assume multiplier of less than 9
-                multiplier = int(molecule[idx+1])
-                
-                molecule_dict = defaultdict(lambda: 0)
 
-                molecule_dict = _get_chemical_dict(molecule_dict, paren_group, multiplier)
-                
-                molecule = re.sub(f"{paren_group}\d+", "", molecule)
-                
-                molecule_dict = _get_chemical_dict(molecule_dict, molecule, 1)
-                
-                molecule_list.append(molecule_dict)
-                
-            # go to next product 
-            continue
-                    
-        # pair them up 
-        molecule_dict = defaultdict(lambda: 0)
-        molecule_dict = _get_chemical_dict(molecule_dict, molecule, 1)
-        molecule_list.append(molecule_dict)
-        
-    return molecule_list
+def _equation_nullspace(reactants: List[str], products: List[str])-> List[List[int]]:
+    reactant_list = [parse_formula(x) for x in reactants]
+    product_list = [parse_formula(x) for x in products]
+    
+    reactant_elements = {i for x in reactant_list for i in x.counts.nonzero()[0]}
+    product_elements = {i for x in product_list for i in x.counts.nonzero()[0]}
+    if reactant_elements != product_elements:
+        raise ImproperChemicalEquation("There are elements that are on one side but not the other")
+    
+    # element by species matrix, negative for the product side, with a row for the
+    # charge if there are ions
+    matrix = [[int(x.counts[i]) for x in reactant_list] + [-int(x.counts[i]) for x in product_list] 
+              for i in sorted(reactant_elements)]
+    if any(x.charge for x in reactant_list + product_list):
+        matrix.append([x.charge for x in reactant_list] + [-x.charge for x in product_list])
+    
+    return _integer_nullspace(matrix)
+
+
+def independent_reactions(equation: str)-> List[str]:
+    """Finds a set of independent balanced reactions between the species of an equation,
+    one for each dimension of the nullspace of its element matrix. An equation with a 
+    single balance gives one reaction, species that can react in more than one 
+    independent way give several, and any balance of the equation is a combination of them.
+    
+    Species with a zero coefficient are left out of a reaction and species whose 
+    coefficient has the opposite sign are moved to the other side.
+
+    :param equation: The string representing the equation
+    :type equation: str
+    :raises InvalidParentheses: Raises an error if the parentheses dont match in the equation ie missing one
+    :raises ImproperChemicalEquation: Raises an error if one side has an element the other doesn't
+    :return: The independent reactions with integer coefficients
+    :rtype: List[str]
+    
+    :Example:
+    
+    >>> from cheme_calculations.reactions import independent_reactions
+    >>> print(independent_reactions("C + O2 -> CO + CO2"))
+    >>> ['2.0 C + 1.0 O2 -> 2.0 CO', '1.0 C + 1.0 O2 -> 1.0 CO2']
+    """
+    reactants, products = _split_equation(equation)
+    basis = _equation_nullspace(reactants, products)
+    
+    return [_format_reaction(vector, reactants, products) for vector in basis]
     
 
 def balance_equation(equation:str)-> str:
     """Balances a string representing a chemical equation, returns the balanced 
     equation in the simplest form possible with integer coefficients
     
-    NOTE: The function assumes that there are no preexisting coefficients on the molecules, they will
-    be ignored in the balancing, so distribute them if necessary 
-    NOTE: Currently the function does not allow subscripts outside parentheses greater than 9 (this will be fixed later)
+    The coefficients are the nullspace of the element by species matrix, found by 
+    fraction free (integer) gauss-jordan elimination so they are exact for any size of 
+    coefficient.
+    
+    Formulas are read with :func:`parse_formula` so nested groups, hydrates, charges and
+    isotopes are allowed, ions are balanced for charge as well as atoms.
+    
+    NOTE: The function assumes that there are no preexisting coefficients on the molecules, a 
+    leading number is read as part of the formula ie 2H2O is H4O2
     
 
     :param equation: The string representing the equation to balance 
     :type equation: str
     :raises InvalidParentheses: Raises an error if the parentheses dont match in the equation ie missing one
+    :raises InvalidFormula: Raises an error if a formula can not be read ie an unknown element
     :raises ImproperChemicalEquation: Raises an error if the equation is impossible to balance ie one side has an element the other doesn't
+    :raises MultipleIndependentReactions: Raises an error if the species can be balanced in more than one independent way, see :func:`independent_reactions`
     :return: The new balanced chemical equation
     :rtype: str
     
@@ -130,93 +192,110 @@ def balance_equation(equation:str)-> str:
     # sample equation to parse 
     # C3H8 + O2 -> H2O + CO2
     # assume there are no existing coefficients
+    reactants, products = _split_equation(equation)
+    coefficients = _balance(equation, reactants, products)
     
-    # check for valid parentheses
-    if not _check_valid_parenthese:
-        raise InvalidParentheses(f"The parentheses in the equation {equation} are invalid")
-    
-    # split on the arrow 
-    left_side, right_side = equation.split("->")
-    
-    # now we have C3H8 + O2 and H2O + CO2
-    
-    # split on the +
-    reactants = left_side.split("+")
-    products = right_side.split("+")
-    
-    # strip whitespace 
-    reactants = [x.strip() for x in reactants]
-    products = [x.strip() for x in products]
-    
-    # Cu2S + HNO3 -> Cu(NO3)2 + CuSO4 + NO2 + H2O
-    
-    reactant_list = _parse_equation_side(reactants)
-    
-    product_list = _parse_equation_side(products)
-        
-    # get unique products and reactants
-    unique_reactants = list(set(chain.from_iterable(d.keys() for d in reactant_list)))
-    unique_products = list(set(chain.from_iterable(d.keys() for d in product_list)))
-    
-    if set(unique_products) != set(unique_reactants):
-        raise ImproperChemicalEquation("There are elements that are on one side but not the other")
-    
-    # make the matrix 
-    cols = []
-    for reactant in reactant_list:
-        col = np.zeros(len(unique_reactants))
-        for element, value in reactant.items():
-            col[unique_reactants.index(element)] = value
-        cols.append(col)
-        
-    for product in product_list:
-        col = np.zeros(len(unique_reactants))
-        for element, value in product.items():
-            # negative for the product side
-            col[unique_reactants.index(element)] = -value
-        cols.append(col)
-    
-    chemical_matrix = np.column_stack(cols)
-    
-    x = np.linalg.lstsq(chemical_matrix[:, :-1], chemical_matrix[:, -1], rcond=None)[0]
-    
-    # flip sign
-    x = -x
-    
-    # get fraction representation
-    x = [Fraction(x).limit_denominator() for x in x]
-    
-    # get lcm of all the fractions
-    lcm = _get_fraction_lcm(x)
-    
-    # multiple represents the free variable in the matrix solution
-    # set the multiple to the lcm, this makes it so all the fractions are now integers (technically speaking
-    # , they are floats but can easily be cast to integers ie 4.0 -> 4)
-    multiple = lcm
-    sol = [x*multiple for x in x]
-    sol.append(multiple)
-    sol = [int(x) for x in sol]
-    gcd = math.gcd(*sol)
-    
-    # # divide by gcd to get the most simplified coefficients
-    sol = [x/gcd for x in sol]
-    
-    react_coeff = sol[:len(reactants)]
-    product_coeff = sol[len(reactants):]
-    
-    # return string
-    reactant_string = " + ".join([f"{x} {y}" for x,y in zip(react_coeff, reactants)])
-    product_string = " + ".join([f"{x} {y}" for x,y in zip(product_coeff, products)])
-    
-    return f"{reactant_string} -> {product_string}"
+    return _format_reaction(coefficients, reactants, products)
+
+
+def _balance(equation: str, reactants: List[str], products: List[str])-> List[int]:
+    basis = _equation_nullspace(reactants, products)
     
+    if not basis:
+        raise ImproperChemicalEquation(f"The equation {equation} can not be balanced")
+    if len(basis) > 1:
+        reactions = "\n".join(_format_reaction(x, reactants, products) for x in basis)
+        raise MultipleIndependentReactions(f"The equation {equation} has {len(basis)} independent balances:\n{reactions}")
     
+    coefficients = basis[0]
+    if any(x <= 0 for x in coefficients):
+        raise ImproperChemicalEquation(f"The equation {equation} can not be balanced with every species on its side")
     
+    return coefficients
+
+
+def _balance_result(equation: str)-> BalanceResult:
+    try:
+        reactants, products = _split_equation(equation)
+    except ValueError:
+        return BalanceResult(equation, (), (), None, INVALID, "The equation must have exactly one ->")
+    
+    try:
+        coefficients = _balance(equation, reactants, products)
+    except (InvalidParentheses, InvalidFormula) as e:
+        return BalanceResult(equation, tuple(reactants), tuple(products), None, INVALID, str(e))
+    except MultipleIndependentReactions as e:
+        return BalanceResult(equation, tuple(reactants), tuple(products), None, MULTIPLE, str(e))
+    except ImproperChemicalEquation as e:
+        return BalanceResult(equation, tuple(reactants), tuple(products), None, UNBALANCEABLE, str(e))
+    
+    return BalanceResult(equation, tuple(reactants), tuple(products), tuple(coefficients), BALANCED, "")
+
 
-                    
-                    
-                
-                
-                    
+def _balance_chunk(equations: List[str])-> List[BalanceResult]:
+    # runs in the worker processes, each keeps its own parse_formula cache between chunks
+    return [_balance_result(x) for x in equations]
+
+
+def balance_equations(equations: Iterable[str], workers: int=None, 
+                      chunksize: int=256)-> Iterator[BalanceResult]:
+    """Balances many chemical equations, yielding a structured result for each one in 
+    the same order as the input. The equations are sent to a pool of processes in chunks, 
+    each worker keeps its formula cache (see :func:`parse_formula`) for as long as the
+    pool lives so species shared between equations are only parsed once per worker.
+    
+    The input is read lazily, at most two chunks per worker are in flight at a time, so
+    it can be a generator of any length.
+    
+    An equation that can not be balanced does not stop the batch, its result has a 
+    status other than "balanced" and the reason in the message
+    
+    - "balanced": the coefficients are the positive integer coefficients of the reactants then the products
+    - "unbalanceable": there is no balance with every species on its side
+    - "multiple": the species can be balanced in more than one independent way, see :func:`independent_reactions`
+    - "invalid": the equation or one of its formulas can not be read
+    
+    NOTE: Under the spawn start method (Windows and macOS) the call must be inside an 
+    ``if __name__ == "__main__":`` block
+
+    :param equations: The strings representing the equations to balance
+    :type equations: Iterable[str]
+    :param workers: The number of worker processes, 1 balances in this process without 
+        a pool, defaults to None for the number of CPUs
+    :type workers: int, optional
+    :param chunksize: The number of equations sent to a worker at a time, defaults to 256
+    :type chunksize: int, optional
+    :return: The equation, reactants, products, coefficients, status and message for every equation
+    :rtype: Iterator[BalanceResult]
     
-    
\ No newline at end of file
+    :Example:
+    
+    >>> from cheme_calculations.reactions import balance_equations
+    >>> equations = ["Al + O2 -> Al2O3", "C + O2 -> CO + CO2"]
+    >>> for result in balance_equations(equations, workers=2):
+    >>>     print(result.status, result.coefficients)
+    >>> balanced (4, 3, 2)
+    >>> multiple None
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1 or chunksize < 1:
+        raise ValueError("workers and chunksize must be at least 1")
+    
+    equations = iter(equations)
+    if workers == 1:
+        for equation in equations:
+            yield _balance_result(equation)
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        while True:
+            while len(pending) < 2*workers:
+                chunk = list(islice(equations, chunksize))
+                if not chunk:
+                    break
+                pending.append(executor.submit(_balance_chunk, chunk))
+            if not pending:
+                return
+            yield from pending.popleft().result()
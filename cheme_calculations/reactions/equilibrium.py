@@ -0,0 +1,192 @@
+from collections import namedtuple
+from typing import List
+import numpy as np
+from cheme_calculations.units.units import Pressure, Temperature
+from cheme_calculations.utility import unit_value
+from .formula import _element_matrix, parse_formula
+from .reaction_parameters import GAS_CONSTANT
+
+__all__ = ["gibbs_equilibrium", "element_matrix", "GibbsEquilibrium"]
+
+
+GibbsEquilibrium = namedtuple(
+    'GibbsEquilibrium', ["moles", "mole_fractions", "element_potentials", "iterations", "converged"]
+)
+
+# species below this mole fraction are minor, their steps are limited so they can not jump above it
+MINOR_FRACTION = 1E-4
+
+
+def element_matrix(species: List[str])-> tuple:
+    """The number of atoms of each element in each species from :func:`parse_formula`,
+    with a charge row if any species is charged
+
+    :param species: The formulas of the species
+    :type species: List[str]
+    :raises InvalidParentheses: Raises an error if the parentheses of a formula dont match
+    :raises InvalidFormula: Raises an error if a formula can not be read
+    :return: The elements (and "charge") and the matrix (elements, species)
+    :rtype: tuple
+    """
+    return _element_matrix([parse_formula(x) for x in species], len(species))
+
+
+def gibbs_equilibrium(species: List[str], gibbs_energy, feed, temperature: Temperature,
+                      pressure: Pressure=101325, condensed=None, reference_pressure: float=1E5,
+                      tolerance: float=1E-10, max_iterations: int=200)-> GibbsEquilibrium:
+    """The equilibrium composition of a reacting mixture by minimising its Gibbs energy
+    subject to the element balances, with the RAND method (White, Johnson and Dantzig).
+    Each Newton step solves a small linear system in the element potentials, the change
+    in total moles and the amounts of the condensed species, and updates the gas amounts
+    in log space so they stay positive.
+
+    .. math:: \\min_n \\sum_i n_i\\left(\\frac{\\Delta G_{f,i}}{RT} + \\ln\\frac{P}{P^\\circ} + \\ln\\frac{n_i}{n_{gas}}\\right) + \\sum_c n_c\\frac{\\Delta G_{f,c}}{RT} \\quad \\text{subject to} \\quad An = An_{feed}
+
+    The gas is ideal and each condensed species is a pure phase (ie graphite in a reformer)
+    that appears or disappears as the element potentials dictate.
+
+    Temperatures, pressures and feeds are broadcast together and every case is solved at
+    once for equilibrium maps, the formation Gibbs energies then have a row for each case
+    (or give a function of temperature).
+
+    :param species: The formulas of the species, the element balances come from :func:`parse_formula`
+    :type species: List[str]
+    :param gibbs_energy: The Gibbs energy of formation of each species at the temperature in J/mol,
+        (species,) or broadcast with the cases (..., species), or a function gibbs_energy(T)
+        returning them for an array of temperatures in K
+    :type gibbs_energy: np.ndarray | Callable
+    :param feed: The moles of each species fed, (species,) or (..., species)
+    :type feed: np.ndarray
+    :param temperature: The temperature(s), plain numbers are in K
+    :type temperature: Temperature | float | np.ndarray
+    :param pressure: The pressure(s), plain numbers are in Pa, defaults to 101325
+    :type pressure: Pressure | float | np.ndarray, optional
+    :param condensed: Which species are pure condensed phases, defaults to None for all gas
+    :type condensed: List[bool], optional
+    :param reference_pressure: The standard state pressure of the Gibbs energies in Pa, defaults to 1E5
+    :type reference_pressure: float, optional
+    :param tolerance: The largest change in the log of a gas amount (or the condensed
+        driving force) at convergence, defaults to 1E-10
+    :type tolerance: float, optional
+    :param max_iterations: The most Newton iterations, defaults to 200
+    :type max_iterations: int, optional
+    :return: The moles of each species, the mole fractions in the gas (0 for condensed species),
+        the potential of each element in J/mol, the iterations and whether each case converged
+    :rtype: GibbsEquilibrium
+
+    :Example:
+
+    >>> from cheme_calculations.reactions import gibbs_equilibrium
+    >>> # steam reforming at 1000 K, formation Gibbs energies in J/mol
+    >>> species = ["CH4", "H2O", "CO", "CO2", "H2"]
+    >>> G = [19492, -192590, -200275, -395886, 0]
+    >>> result = gibbs_equilibrium(species, G, [1, 3, 0, 0, 0], Temperature(1000, "K"), Pressure(1, "bar"))
+    >>> print(result.mole_fractions)
+    >>> [0.00244923 0.27001515 0.09763361 0.06740023 0.56250177]
+    """
+    _, A = element_matrix(species)
+    n_species = len(species)
+    condensed = np.zeros(n_species, dtype=bool) if condensed is None else np.asarray(condensed, dtype=bool)
+    gas = ~condensed
+
+    T = unit_value(temperature, Temperature, "K")
+    P = unit_value(pressure, Pressure, "Pa")
+    feed = np.asarray(feed, dtype=float)
+    if callable(gibbs_energy):
+        T_flat = np.ravel(T)
+        G = np.asarray(gibbs_energy(T_flat), dtype=float).reshape(T.shape + (n_species,))
+    else:
+        G = np.asarray(gibbs_energy, dtype=float)
+    shape = np.broadcast_shapes(T.shape, P.shape, feed.shape[:-1], G.shape[:-1])
+    m = int(np.prod(shape))
+    T = np.broadcast_to(T, shape).reshape(m)
+    P = np.broadcast_to(P, shape).reshape(m)
+    feed = np.broadcast_to(feed, shape + (n_species,)).reshape(m, n_species)
+    g = np.broadcast_to(G, shape + (n_species,)).reshape(m, n_species)/(GAS_CONSTANT*T[:, None])
+
+    b = feed @ A.T
+    # species with an element missing from the feed can not form
+    allowed = ~np.any((A.T[None, :, :] != 0) & (np.abs(b)[:, None, :] < 1E-300), axis=-1)
+    gas_allowed = allowed & gas
+    g_gas = g + np.log(P/reference_pressure)[:, None]
+
+    # start from the same amount of every gas species, the first steps restore the element balances
+    n = np.where(gas_allowed, feed.sum(axis=1, keepdims=True)/np.maximum(gas_allowed.sum(axis=1, keepdims=True), 1), 0)
+    active = np.zeros((m, n_species), dtype=bool)
+    n_elements = len(A)
+    # the unknowns are the element potentials, the change in log total gas and the condensed changes
+    solids = np.flatnonzero(condensed)
+    A_solids = A[:, solids]
+    t, c = n_elements, n_elements + 1 + np.arange(len(solids))
+    size = n_elements + 1 + len(solids)
+    potentials = np.zeros((m, n_elements))
+    converged = np.zeros(m, dtype=bool)
+    iterations = 0
+    while iterations < max_iterations and not converged.all():
+        iterations += 1
+        n_gas = np.sum(np.where(gas, n, 0), axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mu = np.where(gas_allowed & (n > 0), g_gas + np.log(n/n_gas[:, None]), 0)
+        n_g = np.where(gas_allowed, n, 0)
+        b_gas = n_g @ A.T
+        b_now = n @ A.T
+
+        present = active[:, solids]
+        M = np.zeros((m, size, size))
+        rhs = np.zeros((m, size))
+        M[:, :n_elements, :n_elements] = np.einsum("ki,mi,ji->mkj", A, n_g, A)
+        M[:, :n_elements, t] = b_gas
+        M[:, :n_elements, c] = np.where(present[:, None, :], A_solids[None], 0)
+        rhs[:, :n_elements] = b - b_now + (n_g*mu) @ A.T
+        M[:, t, :n_elements] = b_gas
+        rhs[:, t] = np.sum(n_g*mu, axis=1)
+        M[:, c, :n_elements] = np.where(present[:, :, None], A_solids.T[None], 0)
+        rhs[:, c] = np.where(present, g[:, solids], 0)
+        # condensed species that are not present keep no change
+        M[:, c, c] = np.where(present, 0, 1)
+        # redundant element balances make the system singular, the pseudo inverse handles them
+        solution = (np.linalg.pinv(M, rcond=1E-13) @ rhs[..., None])[..., 0]
+        pi, u = solution[:, :n_elements], solution[:, t]
+        dn_c = np.zeros((m, n_species))
+        dn_c[:, solids] = solution[:, c]
+
+        # the change in the log of each gas amount
+        d = np.where(gas_allowed, pi @ A + u[:, None] - mu, 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x = n/n_gas[:, None]
+            major = gas_allowed & (x > MINOR_FRACTION)
+            limit = np.maximum(np.abs(u), np.max(np.where(major, np.abs(d), 0), axis=1))
+            step = np.minimum(1, 2/np.maximum(limit, 1E-300))
+            # minor species can not rise above MINOR_FRACTION in one step
+            rising = gas_allowed & ~major & (d - u[:, None] > 0)
+            minor = np.where(rising, (np.log(MINOR_FRACTION) - np.log(x))/(d - u[:, None]), np.inf)
+            step = np.minimum(step, np.maximum(np.min(minor, axis=1), 0.1))
+            # condensed amounts stay positive, one that would empty leaves the system
+            emptying = active & (dn_c < 0)
+            to_zero = np.where(emptying, -n/dn_c, np.inf)
+        step = np.where(converged, 0, step)
+
+        n = np.where(gas_allowed, n*np.exp(step[:, None]*d), n)
+        n = np.where(active, np.maximum(n + step[:, None]*dn_c, 0), n)
+        n = np.where(active & (to_zero <= step[:, None]), 0, n)
+        potentials = np.where(converged[:, None], potentials, pi)
+
+        # condensed species leave when used up and enter when they lower the Gibbs energy
+        driving = g - potentials @ A
+        active = np.where(condensed & allowed, np.where(active, n > 0, driving < -tolerance), False)
+
+        change = np.max(np.abs(np.where(gas_allowed & (n > 0), d, 0)), axis=1, initial=0)
+        balance = np.max(np.abs(n @ A.T - b), axis=1, initial=0) <= 1E-9*np.maximum(np.abs(b).max(axis=1), 1E-300)
+        stable = np.all(~(condensed & allowed) | (driving >= -tolerance) | active, axis=1)
+        converged |= (change <= tolerance) & (np.abs(u) <= tolerance) & balance & stable
+
+    n_gas = np.sum(np.where(gas, n, 0), axis=1, keepdims=True)
+    fractions = np.where(gas, n/np.where(n_gas > 0, n_gas, 1), 0)
+    shape_species = shape + (n_species,)
+    moles = n.reshape(shape_species)
+    if shape == ():
+        return GibbsEquilibrium(moles, fractions.reshape(shape_species),
+                                potentials[0]*GAS_CONSTANT*T[0], iterations, bool(converged[0]))
+    return GibbsEquilibrium(moles, fractions.reshape(shape_species),
+                            (potentials*GAS_CONSTANT*T[:, None]).reshape(shape + (n_elements,)),
+                            iterations, converged.reshape(shape))
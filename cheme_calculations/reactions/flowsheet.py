@@ -0,0 +1,326 @@
+from collections import namedtuple
+from typing import Callable
+import numpy as np
+from cheme_calculations.units import Concentration, VolumetricFlowrate
+from cheme_calculations.units.reactions import MolarFlowRate
+from cheme_calculations.units.units import Temperature, Volume
+from cheme_calculations.utility import unit_value
+from .network import SparseMatrix
+from .reactor_simulation import _stoichiometry
+
+__all__ = ["ReactorFlowsheet", "FlowsheetSolution"]
+
+
+FlowsheetSolution = namedtuple(
+    'FlowsheetSolution', ["flow_rates", "concentrations", "volumetric_flow", "products", "iterations",
+                          "converged"]
+)
+
+
+def _rate_jacobian(rate_law: Callable, C: np.ndarray, T: np.ndarray, r: np.ndarray)-> np.ndarray:
+    # forward differences of the rates for every cell at once, (cells, reactions, species)
+    J = np.empty(r.shape + C.shape[-1:])
+    for j in range(C.shape[1]):
+        delta = np.sqrt(np.finfo(float).eps)*np.maximum(np.abs(C[:, j]), 1E-6)
+        shifted = C.copy()
+        shifted[:, j] += delta
+        J[:, :, j] = (np.asarray(rate_law(shifted, T), dtype=float) - r)/delta[:, None]
+    return J
+
+
+class ReactorFlowsheet:
+    """Steady state network of CSTRs and PFRs joined by streams with any splits, recycles and
+    bypasses. The mole balances of every unit are assembled into one sparse nonlinear system
+    in the molar flow of each species leaving each cell and solved by Newton's method with
+    a sparse Jacobian, so the recycles converge together instead of by successive substitution.
+
+    A CSTR is one cell, a PFR is an inlet cell where its streams mix followed by segments
+    integrated with the trapezoidal rule (second order, keep the segments short enough that
+    each converts well under half of a reactant). Every cell balance has the form
+
+    .. math:: F_c - \\sum_a W_{ca}F_a - \\sum_a A_{ca}\\nu^Tr(F_a/Q_a, T_a) - F_{c,feed} = 0
+
+    where W holds the stream splits (and joins the PFR segments) and A the reacting volumes.
+    The density is taken as constant, so the volumetric flows come from the feeds and splits
+    alone. Any part of a unit outlet that is not sent to another unit leaves the flowsheet
+    as product.
+
+    NOTE: The rate law works in SI like :func:`batch_reactor`, rate_law(C, T) is called with the
+    concentrations in mol/m^3 (cells, species) and the temperatures in K (cells,) for every cell
+    at once and returns the rates in mol/m^3*s (cells, reactions). rate_jacobian(C, T) returns
+    the derivatives of the rates (cells, reactions, species), without it they are found by
+    finite differences.
+
+    :param rate_law: The rates of the reactions, rate_law(C, T)
+    :type rate_law: Callable
+    :param stoichiometry: The stoichiometric coefficients (reactions, species), negative for reactants
+    :type stoichiometry: ReactionNetwork | np.ndarray
+    :param rate_jacobian: The derivatives of the rates, rate_jacobian(C, T), defaults to None
+    :type rate_jacobian: Callable, optional
+
+    :Example:
+
+    >>> from cheme_calculations.reactions import ReactorFlowsheet
+    >>> def rates(C, T):
+    ...     return 0.01*C[:, :1]
+    >>> flowsheet = ReactorFlowsheet(rates, [[-1, 1]])
+    >>> cstr = flowsheet.add_cstr(Volume(1, "m^3"))
+    >>> tubular = flowsheet.add_pfr(Volume(1, "m^3"))
+    >>> flowsheet.add_feed(cstr, [10, 0], 0.01)
+    >>> flowsheet.connect(cstr, tubular)
+    >>> flowsheet.connect(tubular, cstr, 0.5) # recycle half of the PFR outlet
+    >>> solution = flowsheet.solve()
+    >>> print(solution.products/MolarFlowRate(1, "mol/s"))
+    >>> [2.53402394 7.46597606]
+    """
+    def __init__(self, rate_law: Callable, stoichiometry, rate_jacobian: Callable=None):
+        self.rate_law = rate_law
+        self.rate_jacobian = rate_jacobian
+        self.nu = _stoichiometry(stoichiometry)
+        self.n_species = self.nu.shape[1]
+        self.units = []
+        self.feeds = []
+        self.streams = []
+        # the fraction of each unit outlet sent to other units
+        self.sent = {}
+
+    def _add_unit(self, kind: str, volume: Volume, temperature: Temperature, segments: int)-> int:
+        V = float(unit_value(volume, Volume, "m^3"))
+        T = float(unit_value(temperature, Temperature, "K"))
+        if V < 0:
+            raise ValueError("The volume of a unit can not be negative")
+        self.units.append((kind, V, T, segments))
+        return len(self.units) - 1
+
+    def add_cstr(self, volume: Volume, temperature: Temperature=298.15)-> int:
+        """Adds an isothermal CSTR
+
+        :param volume: The volume of the reactor, plain numbers are in m^3
+        :type volume: Volume | float
+        :param temperature: The temperature of the reactor, plain numbers are in K, defaults to 298.15
+        :type temperature: Temperature | float, optional
+        :return: The index of the unit
+        :rtype: int
+        """
+        return self._add_unit("cstr", volume, temperature, 1)
+
+    def add_pfr(self, volume: Volume, temperature: Temperature=298.15, segments: int=20)-> int:
+        """Adds an isothermal PFR split into equal segments
+
+        :param volume: The volume of the reactor, plain numbers are in m^3
+        :type volume: Volume | float
+        :param temperature: The temperature of the reactor, plain numbers are in K, defaults to 298.15
+        :type temperature: Temperature | float, optional
+        :param segments: The number of segments, defaults to 20
+        :type segments: int, optional
+        :return: The index of the unit
+        :rtype: int
+        """
+        if segments < 1:
+            raise ValueError("A PFR needs at least one segment")
+        return self._add_unit("pfr", volume, temperature, segments)
+
+    def add_feed(self, unit: int, flow_rates: MolarFlowRate, volumetric_flow: VolumetricFlowrate):
+        """Adds a fresh feed to the inlet of a unit
+
+        :param unit: The index of the unit
+        :type unit: int
+        :param flow_rates: The molar flow of each species, plain numbers are in mol/s
+        :type flow_rates: MolarFlowRate | np.ndarray
+        :param volumetric_flow: The volumetric flow of the feed, plain numbers are in m^3/s
+        :type volumetric_flow: VolumetricFlowrate | float
+        """
+        F = np.broadcast_to(unit_value(flow_rates, MolarFlowRate, "mol/s"), (self.n_species,))
+        Q = float(unit_value(volumetric_flow, VolumetricFlowrate, "m^3/s"))
+        self.feeds.append((self._check_unit(unit), F, Q))
+
+    def connect(self, source: int, target: int, fraction: float=1.0):
+        """Sends a fraction of the outlet of one unit to the inlet of another, a stream back to
+        an earlier unit is a recycle and one around a unit is a bypass
+
+        :param source: The index of the unit the stream leaves
+        :type source: int
+        :param target: The index of the unit the stream enters
+        :type target: int
+        :param fraction: The fraction of the outlet of source in the stream, defaults to 1.0
+        :type fraction: float, optional
+        :raises ValueError: Raises an error if more than all of an outlet is sent to other units
+        """
+        self._check_unit(source)
+        self._check_unit(target)
+        if fraction < 0 or self.sent.get(source, 0) + fraction > 1 + 1E-12:
+            raise ValueError(f"The fractions sent from unit {source} must be positive and add up to at most 1")
+        self.streams.append((source, target, float(fraction)))
+        self.sent[source] = self.sent.get(source, 0) + fraction
+
+    def _check_unit(self, unit: int)-> int:
+        if not 0 <= unit < len(self.units):
+            raise ValueError(f"There is no unit {unit}")
+        return unit
+
+    def _assemble(self)-> tuple:
+        # the cells of every unit, the stream (W) and volume (A) matrices between cells
+        starts, ends, T = [], [], []
+        W_rows, W_cols, W_data = [], [], []
+        A_rows, A_cols, A_data = [], [], []
+        cells = 0
+        for kind, V, temperature, segments in self.units:
+            starts.append(cells)
+            if kind == "cstr":
+                A_rows.append(cells), A_cols.append(cells), A_data.append(V)
+                cells += 1
+            else:
+                # the inlet cell then each segment from the cell before it
+                segment = np.arange(cells + 1, cells + segments + 1)
+                W_rows.extend(segment), W_cols.extend(segment - 1), W_data.extend([1.0]*segments)
+                A_rows.extend(segment), A_cols.extend(segment - 1), A_data.extend([V/segments/2]*segments)
+                A_rows.extend(segment), A_cols.extend(segment), A_data.extend([V/segments/2]*segments)
+                cells += segments + 1
+            ends.append(cells - 1)
+            T.extend([temperature]*(cells - len(T)))
+        starts, ends = np.array(starts), np.array(ends)
+
+        for source, target, fraction in self.streams:
+            W_rows.append(starts[target]), W_cols.append(ends[source]), W_data.append(fraction)
+        W = SparseMatrix.from_triplets(W_rows, W_cols, W_data, (cells, cells))
+        A = SparseMatrix.from_triplets(A_rows, A_cols, A_data, (cells, cells))
+
+        feed = np.zeros((cells, self.n_species))
+        feed_Q = np.zeros(cells)
+        for unit, F, Q in self.feeds:
+            feed[starts[unit]] += F
+            feed_Q[starts[unit]] += Q
+        return starts, ends, np.array(T), W, A, feed, feed_Q
+
+    def _jacobian(self, W: SparseMatrix, A: SparseMatrix, dR: np.ndarray)-> SparseMatrix:
+        # I - W (x) I - A (x) dR, cell major so each cell's species form a diagonal block
+        cells, n = dR.shape[:2]
+        species = np.arange(n)
+        identity = np.arange(cells*n)
+
+        W_rows = np.repeat(np.arange(cells), np.diff(W.indptr))
+        stream_rows = (W_rows[:, None]*n + species).ravel()
+        stream_cols = (W.indices[:, None]*n + species).ravel()
+        stream_data = np.repeat(-W.data, n)
+
+        A_rows = np.repeat(np.arange(cells), np.diff(A.indptr))
+        volume_rows = np.broadcast_to((A_rows[:, None]*n + species)[:, :, None], (len(A_rows), n, n)).ravel()
+        volume_cols = np.broadcast_to((A.indices[:, None]*n + species)[:, None, :], (len(A_rows), n, n)).ravel()
+        volume_data = (-A.data[:, None, None]*dR[A.indices]).ravel()
+
+        return SparseMatrix.from_triplets(
+            np.concatenate([identity, stream_rows, volume_rows]),
+            np.concatenate([identity, stream_cols, volume_cols]),
+            np.concatenate([np.ones(cells*n), stream_data, volume_data]),
+            (cells*n, cells*n))
+
+    @staticmethod
+    def _upstream(W: SparseMatrix, A: SparseMatrix)-> list:
+        # the (cells, stream fractions, volumes) feeding each cell from cells earlier in the flowsheet
+        upstream = []
+        for c in range(W.shape[0]):
+            links = {}
+            for M, k in ((W, 0), (A, 1)):
+                for a, value in zip(M.indices[M.indptr[c]:M.indptr[c + 1]], M.data[M.indptr[c]:M.indptr[c + 1]]):
+                    if a < c:
+                        links.setdefault(a, [0.0, 0.0])[k] += value
+            a = np.array(sorted(links), dtype=np.int64)
+            w = np.array([links[x][0] for x in a])
+            v = np.array([links[x][1] for x in a])
+            upstream.append((a, w, v))
+        return upstream
+
+    def _linear_solve(self, W: SparseMatrix, A: SparseMatrix, upstream: list, dR: np.ndarray,
+                      b: np.ndarray)-> np.ndarray:
+        # solves J @ x = b, J is preconditioned by substituting forward through the cells in
+        # order, exact without recycles, so GMRES only has to resolve the recycles
+        cells, n = dR.shape[:2]
+        J = self._jacobian(W, A, dR)
+        diagonal = np.linalg.inv(J.diagonal_blocks(n))
+
+        def preconditioner(v):
+            v = v.reshape(cells, n)
+            x = np.empty_like(v)
+            y = np.empty_like(v)
+            for c, (a, w, volume) in enumerate(upstream):
+                rhs = v[c] + w @ x[a] + volume @ y[a] if len(a) else v[c]
+                x[c] = diagonal[c] @ rhs
+                y[c] = dR[c] @ x[c]
+            return x.ravel()
+
+        return J.solve(b.ravel(), block_size=n, preconditioner=preconditioner).reshape(cells, n)
+
+    def solve(self, tolerance: float=1E-10, max_iterations: int=50, guess=None)-> FlowsheetSolution:
+        """Solves the steady state of the flowsheet
+
+        :param tolerance: The largest residual of a balance relative to the largest feed, defaults to 1E-10
+        :type tolerance: float, optional
+        :param max_iterations: The most Newton iterations, defaults to 50
+        :type max_iterations: int, optional
+        :param guess: The molar flows (cells, species) to start from, defaults to None for the
+            flows without reaction
+        :type guess: np.ndarray, optional
+        :raises ValueError: Raises an error if a unit has no flow through it
+        :raises NotConverged: Raises an error if a linear solve of a large flowsheet does not converge
+        :return: The outlet flows and concentrations (units, species) and volumetric flows (units,)
+            of every unit, the flow of each species leaving the flowsheet, the number of
+            iterations and whether the balances converged
+        :rtype: FlowsheetSolution
+        """
+        n = self.n_species
+        starts, ends, T, W, A, feed, feed_Q = self._assemble()
+        cells = W.shape[0]
+        upstream = self._upstream(W, A)
+
+        # constant density, the volumetric flows only depend on the splits
+        Q = self._linear_solve(W, A, upstream, np.zeros((cells, 1, 1)), feed_Q[:, None])[:, 0]
+        empty = np.flatnonzero(Q[starts] <= 1E-12*feed_Q.sum())
+        if len(empty):
+            raise ValueError(f"The units {empty.tolist()} have no flow through them")
+        nu = self.nu.toarray() if isinstance(self.nu, SparseMatrix) else self.nu
+
+        def residual(F):
+            C = F/Q[:, None]
+            r = np.asarray(self.rate_law(C, T), dtype=float).reshape(cells, -1)
+            return F - W @ F - A @ (r @ self.nu) - feed, C, r
+
+        if guess is None:
+            F = self._linear_solve(W, A, upstream, np.zeros((cells, n, n)), feed)
+        else:
+            F = np.array(guess, dtype=float).reshape(cells, n)
+        scale = max(np.abs(feed).max(initial=0), 1E-300)
+
+        G, C, r = residual(F)
+        norm = np.abs(G).max()
+        converged = norm <= tolerance*scale
+        iterations = 0
+        while not converged and iterations < max_iterations:
+            iterations += 1
+            if self.rate_jacobian is None:
+                dr = _rate_jacobian(self.rate_law, C, T, r)
+            else:
+                dr = np.asarray(self.rate_jacobian(C, T), dtype=float)
+            # the derivatives of the formation rates by the molar flows, (cells, species, species)
+            dR = np.einsum("ri,crj->cij", nu, dr)
+            dR /= Q[:, None, None]
+            step = self._linear_solve(W, A, upstream, dR, -G)
+
+            # backtrack until the residual falls
+            alpha = 1.0
+            for _ in range(30):
+                trial = F + alpha*step
+                G_trial, C_trial, r_trial = residual(trial)
+                norm_trial = np.abs(G_trial).max()
+                if np.isfinite(norm_trial) and norm_trial < (1 - 1E-4*alpha)*norm:
+                    break
+                alpha /= 2
+            F, G, C, r, norm = trial, G_trial, C_trial, r_trial, norm_trial
+            converged = norm <= tolerance*scale
+
+        products = np.zeros(n)
+        for unit, end in enumerate(ends):
+            products += (1 - self.sent.get(unit, 0))*F[end]
+
+        return FlowsheetSolution(MolarFlowRate(F[ends], "mol/s"), Concentration(C[ends], "mol/m^3"),
+                                 VolumetricFlowrate(Q[ends], "m^3/s"), MolarFlowRate(products, "mol/s"),
+                                 iterations, bool(converged))
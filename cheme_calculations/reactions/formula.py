@@ -0,0 +1,266 @@
+from collections import namedtuple
+from functools import lru_cache
+from typing import List
+import numpy as np
+from cheme_calculations.units import MolecularWeight
+
+
+class InvalidParentheses(Exception):
+    pass
+
+class InvalidFormula(Exception):
+    pass
+
+__all__ = ["ELEMENTS", "ELEMENT_INDEX", "ATOMIC_WEIGHTS", "Formula", "parse_formula", "molecular_weight"]
+
+
+ELEMENTS = ("H", "He", "Li", "Be", "B", "C", "N", "O", "F", "Ne", "Na", "Mg", "Al", "Si", "P",
+            "S", "Cl", "Ar", "K", "Ca", "Sc", "Ti", "V", "Cr", "Mn", "Fe", "Co", "Ni", "Cu", "Zn",
+            "Ga", "Ge", "As", "Se", "Br", "Kr", "Rb", "Sr", "Y", "Zr", "Nb", "Mo", "Tc", "Ru", "Rh",
+            "Pd", "Ag", "Cd", "In", "Sn", "Sb", "Te", "I", "Xe", "Cs", "Ba", "La", "Ce", "Pr", "Nd",
+            "Pm", "Sm", "Eu", "Gd", "Tb", "Dy", "Ho", "Er", "Tm", "Yb", "Lu", "Hf", "Ta", "W", "Re",
+            "Os", "Ir", "Pt", "Au", "Hg", "Tl", "Pb", "Bi", "Po", "At", "Rn", "Fr", "Ra", "Ac", "Th",
+            "Pa", "U", "Np", "Pu", "Am", "Cm", "Bk", "Cf", "Es", "Fm", "Md", "No", "Lr", "Rf", "Db",
+            "Sg", "Bh", "Hs", "Mt", "Ds", "Rg", "Cn", "Nh", "Fl", "Mc", "Lv", "Ts", "Og")
+
+ELEMENT_INDEX = {element: i for i, element in enumerate(ELEMENTS)}
+
+# standard atomic weights (g/mol) in the order of ELEMENTS, the mass number of the
+# longest lived isotope for elements without a standard weight
+ATOMIC_WEIGHTS = np.array([
+    1.008, 4.0026, 6.94, 9.0122, 10.81, 12.011, 14.007, 15.999, 18.998, 20.180,
+    22.990, 24.305, 26.982, 28.085, 30.974, 32.06, 35.45, 39.95, 39.098, 40.078,
+    44.956, 47.867, 50.942, 51.996, 54.938, 55.845, 58.933, 58.693, 63.546, 65.38,
+    69.723, 72.630, 74.922, 78.971, 79.904, 83.798, 85.468, 87.62, 88.906, 91.224,
+    92.906, 95.95, 97, 101.07, 102.91, 106.42, 107.87, 112.41, 114.82, 118.71,
+    121.76, 127.60, 126.90, 131.29, 132.91, 137.33, 138.91, 140.12, 140.91, 144.24,
+    145, 150.36, 151.96, 157.25, 158.93, 162.50, 164.93, 167.26, 168.93, 173.05,
+    174.97, 178.49, 180.95, 183.84, 186.21, 190.23, 192.22, 195.08, 196.97, 200.59,
+    204.38, 207.2, 208.98, 209, 210, 222, 223, 226, 227, 232.04,
+    231.04, 238.03, 237, 244, 243, 247, 247, 251, 252, 257,
+    258, 259, 266, 267, 268, 269, 270, 269, 278, 281,
+    282, 285, 286, 289, 290, 293, 294, 294])
+ATOMIC_WEIGHTS.flags.writeable = False
+
+# masses (g/mol) of common labelled isotopes, others are taken as their mass number
+ISOTOPE_MASSES = {("H", 2): 2.014102, ("H", 3): 3.016049, ("C", 13): 13.003355,
+                  ("C", 14): 14.003242, ("N", 15): 15.000109, ("O", 17): 16.999131,
+                  ("O", 18): 17.999160}
+
+# shorthand for the hydrogen isotopes
+ISOTOPE_SYMBOLS = {"D": ("H", 2), "T": ("H", 3)}
+
+HYDRATE_SEPARATORS = "·.*"
+
+Formula = namedtuple(
+    'Formula', ["counts", "charge", "isotopes"]
+)
+
+
+class _FormulaParser:
+    # formula := [count] part {separator [count] part} [charge]
+    # part    := group {group}
+    # group   := (element | isotope | "(" part ")" | "[" part "]") [count]
+    # isotope := "[" count element "]" | "D" | "T"
+    # charge  := "^" [count] sign | sign {sign}
+    def __init__(self, formula: str):
+        self.text = formula.replace(" ", "")
+        self.i = 0
+
+    def peek(self)-> str:
+        return self.text[self.i] if self.i < len(self.text) else ""
+
+    def error(self, message: str):
+        raise InvalidFormula(f"{message} at position {self.i} of the formula {self.text}")
+
+    def count(self)-> int:
+        start = self.i
+        while self.peek().isdigit():
+            self.i += 1
+        return int(self.text[start:self.i]) if self.i > start else 1
+
+    def symbol(self)-> str:
+        if not self.peek().isupper():
+            self.error("Expected an element")
+        start = self.i
+        self.i += 1
+        if self.peek().islower():
+            self.i += 1
+        return self.text[start:self.i]
+
+    def add(self, counts: dict, key, n: int):
+        counts[key] = counts.get(key, 0) + n
+
+    def group(self)-> dict:
+        # element and isotope counts of one group, keys are symbols or (symbol, mass) pairs
+        char = self.peek()
+        if char in "([":
+            close = ")" if char == "(" else "]"
+            self.i += 1
+            if char == "[" and self.peek().isdigit():
+                mass = self.count()
+                element = self.symbol()
+                if element not in ELEMENT_INDEX:
+                    self.error(f"Unknown element {element}")
+                contents = {(element, mass): 1}
+            else:
+                contents = self.part()
+            if self.peek() != close:
+                raise InvalidParentheses(f"The parentheses in the formula {self.text} are invalid")
+            self.i += 1
+        else:
+            element = self.symbol()
+            if element in ISOTOPE_SYMBOLS:
+                contents = {ISOTOPE_SYMBOLS[element]: 1}
+            elif element in ELEMENT_INDEX:
+                contents = {element: 1}
+            else:
+                self.error(f"Unknown element {element}")
+        n = self.count()
+        return {key: value*n for key, value in contents.items()}
+
+    def part(self)-> dict:
+        counts = {}
+        while self.peek() and (self.peek().isupper() or self.peek() in "(["):
+            for key, value in self.group().items():
+                self.add(counts, key, value)
+        if not counts:
+            self.error("Expected an element or a group")
+        return counts
+
+    def charge(self)-> int:
+        if self.peek() == "^":
+            self.i += 1
+            n = self.count()
+            sign = self.peek()
+            if not sign or sign not in "+-":
+                self.error("Expected + or - after the charge")
+            self.i += 1
+            return n if sign == "+" else -n
+        charge = 0
+        while self.peek() and self.peek() in "+-":
+            charge += 1 if self.peek() == "+" else -1
+            self.i += 1
+        return charge
+
+    def parse(self)-> Formula:
+        if not self.text:
+            self.error("Empty formula")
+        total = {}
+        while True:
+            n = self.count()
+            for key, value in self.part().items():
+                self.add(total, key, value*n)
+            if not self.peek() or self.peek() not in HYDRATE_SEPARATORS:
+                break
+            self.i += 1
+        charge = self.charge()
+        if self.peek() and self.peek() in ")]":
+            raise InvalidParentheses(f"The parentheses in the formula {self.text} are invalid")
+        if self.i != len(self.text):
+            self.error(f"Unexpected {self.peek()}")
+
+        counts = np.zeros(len(ELEMENTS), dtype=np.int64)
+        isotopes = []
+        for key, value in total.items():
+            if isinstance(key, tuple):
+                counts[ELEMENT_INDEX[key[0]]] += value
+                isotopes.append((key[0], key[1], value))
+            else:
+                counts[ELEMENT_INDEX[key]] += value
+        counts.flags.writeable = False
+        return Formula(counts, charge, tuple(sorted(isotopes)))
+
+
+@lru_cache(maxsize=8192)
+def parse_formula(formula: str)-> Formula:
+    """Parses a chemical formula into the number of atoms of each element, indexed the
+    same way as :data:`ELEMENTS`. Results are cached so repeated species (ie across the
+    equations of a reaction network) are only parsed once, the count vector is read only
+    so the cached copy can be shared.
+
+    Supports:
+
+    - nested groups with ( ) or [ ] and multi digit counts ie Ca3(PO4)2, K4[Fe(CN)6]
+    - hydrates and adducts with ·, . or * ie CuSO4·5H2O
+    - charges with ^ or trailing signs ie SO4^2-, Fe^3+, NH4+, Fe+++
+    - isotopes in brackets ie [13C]O2, and D and T for deuterium and tritium
+
+    Isotopes are counted under their element in the count vector and listed separately
+    as (element, mass number, count).
+
+    NOTE: Digits right before a trailing sign are read as a count, write Fe^3+ not Fe3+
+
+    :param formula: The chemical formula
+    :type formula: str
+    :raises InvalidParentheses: Raises an error if the parentheses in the formula dont match
+    :raises InvalidFormula: Raises an error if the formula can not be read ie an unknown element
+    :return: The element counts, the charge and the isotopes of the formula
+    :rtype: Formula
+
+    :Example:
+
+    >>> from cheme_calculations.reactions import parse_formula, ELEMENT_INDEX
+    >>> formula = parse_formula("CuSO4·5H2O")
+    >>> print(formula.counts[ELEMENT_INDEX["O"]])
+    >>> 9
+    >>> print(parse_formula("SO4^2-").charge)
+    >>> -2
+    """
+    return _FormulaParser(formula).parse()
+
+
+def _element_matrix(parsed: List[Formula], n_species: int)-> tuple:
+    # the elements present (and "charge" if any species is charged) and their counts (elements, species)
+    counts = np.array([x.counts for x in parsed], dtype=float).reshape(len(parsed), len(ELEMENTS))
+    present = np.flatnonzero(counts.any(axis=0))
+    elements = tuple(ELEMENTS[i] for i in present)
+    matrix = counts[:, present].T.reshape(len(present), n_species)
+    charges = np.array([x.charge for x in parsed], dtype=float)
+    if charges.any():
+        elements += ("charge",)
+        matrix = np.vstack([matrix, charges])
+    return elements, matrix
+
+
+def _isotope_correction(parsed: Formula)-> float:
+    # labelled atoms are counted at the standard weight in the dot product, correct them
+    return sum(count*(ISOTOPE_MASSES.get((element, mass), mass) - ATOMIC_WEIGHTS[ELEMENT_INDEX[element]])
+               for element, mass, count in parsed.isotopes)
+
+
+@lru_cache(maxsize=8192)
+def _formula_weight(formula: str)-> float:
+    parsed = parse_formula(formula)
+    return float(parsed.counts @ ATOMIC_WEIGHTS) + _isotope_correction(parsed)
+
+
+def molecular_weight(formula: str | List[str])-> MolecularWeight:
+    """The molecular weight of a formula from the standard atomic weights, the element
+    counts from :func:`parse_formula` are multiplied by :data:`ATOMIC_WEIGHTS`.
+    Weights are cached per formula, a list of formulas is stacked into one count matrix
+    and gives a MolecularWeight holding an array of their weights. Labelled isotopes ie [13C] or D use the isotope mass.
+
+    :param formula: The chemical formula or a list of formulas
+    :type formula: str | List[str]
+    :raises InvalidParentheses: Raises an error if the parentheses in a formula dont match
+    :raises InvalidFormula: Raises an error if a formula can not be read ie an unknown element
+    :return: The molecular weight(s) in g/mol
+    :rtype: MolecularWeight
+
+    :Example:
+
+    >>> from cheme_calculations.reactions import molecular_weight
+    >>> print(molecular_weight("C3H6O"))
+    >>> 58.08 g / mol
+    >>> print(molecular_weight(["H2O", "CO2"]))
+    >>> [18.015 44.009] g / mol
+    """
+    if isinstance(formula, str):
+        return MolecularWeight(_formula_weight(formula), "g/mol")
+    parsed = [parse_formula(x) for x in formula]
+    counts = np.array([x.counts for x in parsed]).reshape(len(parsed), len(ELEMENTS))
+    weights = counts @ ATOMIC_WEIGHTS
+    labelled = [i for i, x in enumerate(parsed) if x.isotopes]
+    weights[labelled] += [_isotope_correction(parsed[i]) for i in labelled]
+    return MolecularWeight(weights, "g/mol")
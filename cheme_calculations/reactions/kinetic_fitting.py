@@ -0,0 +1,302 @@
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import math
+import os
+from typing import Iterable, List
+import numpy as np
+from .reaction_parameters import GAS_CONSTANT, integral_method, _t_quantile
+
+__all__ = ["fit_kinetics", "fit_kinetics_batch", "fit_arrhenius_kinetics", "KineticFit", "KineticFits",
+           "ArrheniusKineticFit"]
+
+
+KineticFit = namedtuple(
+    'KineticFit', ["order", "k", "c0", "order_error", "k_error", "c0_error", "r_squared",
+                   "residual_sum", "iterations", "converged"]
+)
+
+KineticFits = namedtuple(
+    'KineticFits', KineticFit._fields
+)
+
+ArrheniusKineticFit = namedtuple(
+    'ArrheniusKineticFit', ["order", "A", "Ea", "c0", "order_error", "A_error", "Ea_error",
+                            "c0_error", "r_squared", "residual_sum", "iterations", "converged"]
+)
+
+
+def _levenberg_marquardt(model, p0: np.ndarray, y: np.ndarray, tolerance: float, max_iterations: int)-> tuple:
+    # model(p) returns the prediction and its jacobian, or None if p is outside the
+    # valid region in which case the step is rejected
+    p = np.asarray(p0, dtype=float)
+    prediction, J = model(p)
+    r = y - prediction
+    ssr = r @ r
+    damping = 1E-3
+    converged = False
+    for iteration in range(1, max_iterations + 1):
+        JTJ = J.T @ J
+        gradient = J.T @ r
+        # marquardt's scaling, keeps k and the order on an equal footing
+        scale = np.maximum(np.diag(JTJ), 1E-300)
+        while True:
+            try:
+                step = np.linalg.solve(JTJ + damping*np.diag(scale), gradient)
+            except np.linalg.LinAlgError:
+                step = np.linalg.lstsq(JTJ + damping*np.diag(scale), gradient, rcond=None)[0]
+            trial = model(p + step)
+            if trial is not None:
+                r_trial = y - trial[0]
+                ssr_trial = r_trial @ r_trial
+                if np.isfinite(ssr_trial) and ssr_trial <= ssr:
+                    break
+            damping *= 10
+            if damping > 1E16:
+                return p, J, ssr, iteration, converged
+        p = p + step
+        (prediction, J), r = trial, r_trial
+        small_change = ssr - ssr_trial <= tolerance*max(ssr, 1E-300)
+        ssr = ssr_trial
+        damping = max(damping/10, 1E-12)
+        if np.all(np.abs(step) <= tolerance*(np.abs(p) + tolerance)) or small_change:
+            converged = True
+            break
+    return p, J, ssr, iteration, converged
+
+
+def _integrated_rate_law(t: np.ndarray, c0: float, k: np.ndarray, n: float)-> tuple:
+    # C(t) of an nth order reaction and its derivatives with c0, k and n
+    # C^(1-n) = c0^(1-n) + (n-1)kt, C = c0 exp(-kt) for first order
+    kt = k*t
+    epsilon = 1 - n
+    if abs(epsilon) < 1E-6:
+        c = c0*np.exp(-kt)
+        # limit of dlnC/dn as n -> 1
+        d_ln_c_dn = kt*(kt/2 - np.log(c0))
+    else:
+        u = np.maximum(c0**epsilon - epsilon*kt, 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            c = u**(1/epsilon)
+            d_ln_c_dn = np.log(u)/epsilon**2 + (kt - c0**epsilon*np.log(c0))/(epsilon*u)
+        # reactant used up, n < 1 only
+        d_ln_c_dn = np.where(u > 0, d_ln_c_dn, 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        c_n = np.where(c > 0, c**n, 0)
+    dc_dc0 = c_n/c0**n
+    dc_dk = -t*c_n
+    dc_dn = c*d_ln_c_dn
+    return c, dc_dc0, dc_dk, dc_dn
+
+
+def _initial_guess(t: np.ndarray, c: np.ndarray, order: float)-> tuple:
+    if order is None:
+        order = integral_method(t, c, (0, 3.05, 0.1)).order
+    if abs(order - 1) < 1E-6:
+        slope, intercept = np.polyfit(t, np.log(c), 1)
+        return math.exp(intercept), max(-slope, 1E-12), order
+    slope, intercept = np.polyfit(t, c**(1 - order), 1)
+    c0 = intercept**(1/(1 - order)) if intercept > 0 else c[0]
+    return c0, max(slope/(order - 1), 1E-12), order
+
+
+def _r_squared(y: np.ndarray, ssr: float)-> float:
+    total = ((y - y.mean())**2).sum()
+    return 1 - ssr/total if total > 0 else 1.0
+
+
+def fit_kinetics(time_data: List, concentration_data: List, order: float=None, confidence: float=0.95,
+                 tolerance: float=1E-10, max_iterations: int=200)-> KineticFit:
+    """Fits the order n, the rate constant k and the initial concentration of an nth order
+    reaction of one reactant to concentration-time data, by Levenberg-Marquardt on the
+    integrated rate law with an analytic jacobian. The starting point is the best order of
+    :func:`integral_method` and its linearised fit.
+
+    .. math:: C^{1-n} = C_0^{1-n} + (n-1)kt \\qquad C = C_0e^{-kt} \\quad (n=1)
+
+    The errors are the half widths of the confidence intervals, from the covariance of the
+    fit and the student's t distribution with points - parameters degrees of freedom.
+
+    NOTE: Uses consistent units, k is in concentration^(1-n)/time of the data
+
+    :param time_data: The time data for the reaction
+    :type time_data: List | np.ndarray
+    :param concentration_data: The concentration data for the reactant
+    :type concentration_data: List | np.ndarray
+    :param order: A fixed order to fit k and C0 for, defaults to None to fit the order too
+    :type order: float, optional
+    :param confidence: The confidence level of the intervals, defaults to 0.95
+    :type confidence: float, optional
+    :param tolerance: The relative change in the parameters or the sum of squares to stop at, defaults to 1E-10
+    :type tolerance: float, optional
+    :param max_iterations: The maximum number of iterations, defaults to 200
+    :type max_iterations: int, optional
+    :return: The fitted order, k and C0, their errors, the r squared and sum of squared residuals,
+        the number of iterations and if the fit converged
+    :rtype: KineticFit
+
+    :Example:
+
+    >>> from cheme_calculations.reactions import fit_kinetics
+    >>> time_data = [0, 10, 20, 30, 40]
+    >>> reaction_data = [0.624, 0.446, 0.318, 0.224, 0.164]
+    >>> fit = fit_kinetics(time_data, reaction_data)
+    >>> print(round(fit.order, 2), round(fit.k, 4))
+    >>> 1.01 0.0341
+    """
+    t = np.asarray(time_data, dtype=float)
+    y = np.asarray(concentration_data, dtype=float)
+    fixed = order is not None
+    c0, k, n = _initial_guess(t, y, order)
+
+    def model(p):
+        c0, k = p[0], p[1]
+        n = order if fixed else p[2]
+        if c0 <= 0 or k <= 0:
+            return None
+        c, dc_dc0, dc_dk, dc_dn = _integrated_rate_law(t, c0, k, n)
+        columns = [dc_dc0, dc_dk] if fixed else [dc_dc0, dc_dk, dc_dn]
+        return c, np.column_stack(columns)
+
+    p0 = [c0, k] if fixed else [c0, k, n]
+    p, J, ssr, iterations, converged = _levenberg_marquardt(model, p0, y, tolerance, max_iterations)
+
+    dof = len(y) - len(p)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covariance = np.linalg.pinv(J.T @ J)*(ssr/dof if dof > 0 else np.inf)
+    errors = _t_quantile(confidence, dof)*np.sqrt(np.abs(np.diag(covariance)))
+    return KineticFit(order=float(order if fixed else p[2]), k=float(p[1]), c0=float(p[0]),
+                      order_error=0.0 if fixed else float(errors[2]), k_error=float(errors[1]),
+                      c0_error=float(errors[0]), r_squared=float(_r_squared(y, ssr)),
+                      residual_sum=float(ssr), iterations=iterations, converged=converged)
+
+
+def _fit_chunk(datasets: List[tuple], options: dict)-> List[KineticFit]:
+    return [fit_kinetics(t, c, **options) for t, c in datasets]
+
+
+def fit_kinetics_batch(datasets: Iterable[tuple], order: float=None, confidence: float=0.95,
+                       workers: int=None, chunksize: int=16, **kwargs)-> KineticFits:
+    """Fits many concentration-time datasets with :func:`fit_kinetics` over a pool of
+    processes, returning a table with an array for each field in the order of the datasets.
+
+    NOTE: Under the spawn start method (Windows and macOS) the call must be inside an
+    ``if __name__ == "__main__":`` block
+
+    :param datasets: The (time data, concentration data) of each dataset
+    :type datasets: Iterable[tuple]
+    :param order: A fixed order for every dataset, defaults to None to fit the order too
+    :type order: float, optional
+    :param confidence: The confidence level of the intervals, defaults to 0.95
+    :type confidence: float, optional
+    :param workers: The number of worker processes, 1 fits in this process without a pool,
+        defaults to None for the number of CPUs
+    :type workers: int, optional
+    :param chunksize: The number of datasets sent to a worker at a time, defaults to 16
+    :type chunksize: int, optional
+    :return: The fits of every dataset as arrays
+    :rtype: KineticFits
+
+    :Example:
+
+    >>> from cheme_calculations.reactions import fit_kinetics_batch
+    >>> table = fit_kinetics_batch([(t1, c1), (t2, c2), (t3, c3)], workers=4)
+    >>> print(table.k)
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1 or chunksize < 1:
+        raise ValueError("workers and chunksize must be at least 1")
+
+    options = dict(order=order, confidence=confidence, **kwargs)
+    datasets = list(datasets)
+    chunks = [datasets[i:i + chunksize] for i in range(0, len(datasets), chunksize)]
+    if workers == 1:
+        results = [_fit_chunk(chunk, options) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_fit_chunk, chunks, [options]*len(chunks)))
+    fits = [fit for chunk in results for fit in chunk]
+
+    return KineticFits(*(np.array([getattr(fit, field) for fit in fits]) for field in KineticFit._fields))
+
+
+def fit_arrhenius_kinetics(time_data: List[List], concentration_data: List[List], temperatures: List,
+                           order: float=None, confidence: float=0.95, tolerance: float=1E-10,
+                           max_iterations: int=200)-> ArrheniusKineticFit:
+    """Fits the order, the Arrhenius constant A and the activation energy Ea to datasets
+    measured at different temperatures in one regression, every dataset shares the order
+    and its k follows the Arrhenius equation, each dataset has its own initial concentration.
+    The starting point comes from fitting each dataset with :func:`fit_kinetics`.
+
+    .. math:: k = Ae^{\\frac{-Ea}{RT}}
+
+    NOTE: The temperatures are in K and Ea is in J/mol, A has the units of k
+
+    :param time_data: The time data of each dataset
+    :type time_data: List[List]
+    :param concentration_data: The concentration data of each dataset
+    :type concentration_data: List[List]
+    :param temperatures: The temperature of each dataset in K
+    :type temperatures: List
+    :param order: A fixed order to fit for, defaults to None to fit the order too
+    :type order: float, optional
+    :param confidence: The confidence level of the intervals, defaults to 0.95
+    :type confidence: float, optional
+    :param tolerance: The relative change in the parameters or the sum of squares to stop at, defaults to 1E-10
+    :type tolerance: float, optional
+    :param max_iterations: The maximum number of iterations, defaults to 200
+    :type max_iterations: int, optional
+    :return: The fitted order, A, Ea and C0 of each dataset, their errors, the r squared and sum
+        of squared residuals, the number of iterations and if the fit converged
+    :rtype: ArrheniusKineticFit
+    """
+    times = [np.asarray(x, dtype=float) for x in time_data]
+    values = [np.asarray(x, dtype=float) for x in concentration_data]
+    T = np.asarray(temperatures, dtype=float)
+    fixed = order is not None
+    sizes = [len(x) for x in times]
+    n_sets = len(times)
+    t = np.concatenate(times)
+    y = np.concatenate(values)
+    dataset = np.repeat(np.arange(n_sets), sizes)
+    inverse_RT = 1/(GAS_CONSTANT*T[dataset])
+
+    # start from the separate fits, ln k against 1/T gives A and Ea
+    fits = [fit_kinetics(x, c, order) for x, c in zip(times, values)]
+    n0 = order if fixed else float(np.median([fit.order for fit in fits]))
+    fits = [fit_kinetics(x, c, n0) for x, c in zip(times, values)]
+    if n_sets > 1:
+        slope, intercept = np.polyfit(1/(GAS_CONSTANT*T), np.log([fit.k for fit in fits]), 1)
+    else:
+        slope, intercept = 0.0, math.log(fits[0].k)
+
+    # parameters ln(A), Ea, [n], c0 of each dataset
+    def model(p):
+        ln_A, Ea = p[0], p[1]
+        n = order if fixed else p[2]
+        c0 = p[-n_sets:]
+        if np.any(c0 <= 0):
+            return None
+        k = np.exp(ln_A - Ea*inverse_RT)
+        c, dc_dc0, dc_dk, dc_dn = _integrated_rate_law(t, c0[dataset], k, n)
+        columns = [dc_dk*k, -dc_dk*k*inverse_RT]
+        if not fixed:
+            columns.append(dc_dn)
+        c0_columns = np.zeros((len(t), n_sets))
+        c0_columns[np.arange(len(t)), dataset] = dc_dc0
+        return c, np.column_stack(columns + [c0_columns])
+
+    p0 = [intercept, -slope] + ([] if fixed else [n0]) + [fit.c0 for fit in fits]
+    p, J, ssr, iterations, converged = _levenberg_marquardt(model, p0, y, tolerance, max_iterations)
+
+    dof = len(y) - len(p)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covariance = np.linalg.pinv(J.T @ J)*(ssr/dof if dof > 0 else np.inf)
+    errors = _t_quantile(confidence, dof)*np.sqrt(np.abs(np.diag(covariance)))
+    A = math.exp(p[0])
+    return ArrheniusKineticFit(order=float(order if fixed else p[2]), A=A, Ea=float(p[1]),
+                               c0=p[-n_sets:].copy(), order_error=0.0 if fixed else float(errors[2]),
+                               # the interval of ln(A) carried over to A to first order
+                               A_error=A*float(errors[0]), Ea_error=float(errors[1]),
+                               c0_error=errors[-n_sets:], r_squared=float(_r_squared(y, ssr)),
+                               residual_sum=float(ssr), iterations=iterations, converged=converged)
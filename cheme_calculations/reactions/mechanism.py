@@ -0,0 +1,279 @@
+from collections import namedtuple
+from typing import Callable, List
+import numpy as np
+from cheme_calculations.units import Concentration
+from cheme_calculations.units.reactions import ActivationEnergy
+from cheme_calculations.units.units import Temperature, Time
+from cheme_calculations.utility import unit_value
+from cheme_calculations.utility.ode_solvers import solve_ode
+from .network import DENSE_LIMIT, NotConverged, ReactionNetwork, SparseMatrix, _parse_side
+from .reaction_parameters import GAS_CONSTANT
+
+__all__ = ["Mechanism", "MechanismSolution"]
+
+
+MechanismSolution = namedtuple(
+    'MechanismSolution', ["t", "concentrations", "steps", "success"]
+)
+
+
+class Mechanism:
+    """A detailed mechanism of elementary reactions compiled for fast, vectorised evaluation.
+    The reactions are read into a :class:`ReactionNetwork` for the stoichiometry and the
+    reactant orders are kept as a padded table, so the rates of every reaction in every
+    trajectory come from one product and the rates of formation from one sparse product.
+
+    .. math:: r_i = A_iT^{b_i}e^{\\frac{-Ea_i}{RT}}\\prod_j C_j^{o_{ij}} \\qquad \\frac{dC}{dt} = \\nu^Tr
+
+    The jacobian is analytic and sparse, each reaction only couples its own reactants and
+    species. Mechanisms are usually stiff, :meth:`integrate` uses the Rosenbrock method of
+    :func:`solve_ode` with dense LU for up to :data:`DENSE_LIMIT` species and a sparse
+    iterative solve above that.
+
+    NOTE: Everything is in SI, the concentrations in mol/m^3 and A in (m^3/mol)^(order - 1)/s.
+    The orders default to the reactant coefficients (elementary reactions).
+
+    :param equations: The reactions, written like :class:`ReactionNetwork` ie "2 NO + O2 -> 2 NO2"
+    :type equations: List[str]
+    :param A: The pre exponential factor of each reaction
+    :type A: np.ndarray
+    :param Ea: The activation energy of each reaction, plain numbers are in J/mol, defaults to 0
+    :type Ea: ActivationEnergy | np.ndarray, optional
+    :param b: The temperature exponent of each reaction, defaults to 0
+    :type b: np.ndarray, optional
+    :param orders: The order of each reaction in each species (reactions, species), defaults to None
+        for the reactant coefficients
+    :type orders: np.ndarray, optional
+    :param formulas: Read the species as chemical formulas so the element balance of the
+        network can be checked, defaults to False for any names
+    :type formulas: bool, optional
+
+    :Example:
+
+    >>> from cheme_calculations.reactions import Mechanism
+    >>> # Robertson's stiff problem
+    >>> mechanism = Mechanism(["A -> B", "2 B -> B + C", "B + C -> A + C"], [0.04, 3E7, 1E4])
+    >>> solution = mechanism.integrate([1, 0, 0], Time(40, "s"), 300, t_eval=[0, 40])
+    >>> print(solution.concentrations/Concentration(1, "mol/m^3"))
+    >>> [[1.00000000e+00 0.00000000e+00 0.00000000e+00]
+    >>>  [7.15827074e-01 9.18553471e-06 2.84163740e-01]]
+    """
+    def __init__(self, equations: List[str], A, Ea: ActivationEnergy=0, b=0, orders=None, formulas: bool=False):
+        self.network = ReactionNetwork(equations, formulas)
+        self.species = self.network.species
+        self.nu = self.network.stoichiometry
+        n_reactions, n = self.nu.shape
+
+        self.A = np.broadcast_to(np.asarray(A, dtype=float), (n_reactions,))
+        self.Ea = np.broadcast_to(unit_value(Ea, ActivationEnergy, "J/mol"), (n_reactions,))
+        self.b = np.broadcast_to(np.asarray(b, dtype=float), (n_reactions,))
+
+        if orders is None:
+            rows, cols, data = [], [], []
+            for i, equation in enumerate(self.network.equations):
+                for coefficient, species in _parse_side(equation.split("->")[0]):
+                    rows.append(i)
+                    cols.append(self.network.species_index[species])
+                    data.append(coefficient)
+            orders = SparseMatrix.from_triplets(rows, cols, data, (n_reactions, n))
+        else:
+            orders = np.asarray(orders, dtype=float)
+            rows, cols = np.nonzero(orders)
+            orders = SparseMatrix.from_triplets(rows, cols, orders[rows, cols], (n_reactions, n))
+
+        # the reactants of each reaction padded to the longest, padding has order 0
+        lengths = np.diff(orders.indptr)
+        width = max(int(lengths.max(initial=0)), 1)
+        slot = np.arange(orders.nnz) - np.repeat(orders.indptr[:-1], lengths)
+        reaction = np.repeat(np.arange(n_reactions), lengths)
+        self._reactants = np.zeros((n_reactions, width), dtype=np.int64)
+        self._orders = np.zeros((n_reactions, width))
+        self._reactants[reaction, slot] = orders.indices
+        self._orders[reaction, slot] = orders.data
+
+        # d(nu^T r)_s/dC_j sums nu[i, s]*dr_i/dC_j over the reactions, the terms are gathered
+        # from dr (reactions*width) and summed into the jacobian pattern once per call
+        nu_rows = np.repeat(np.arange(n_reactions), np.diff(self.nu.indptr))
+        counts = lengths[nu_rows]
+        term_nu = np.repeat(np.arange(self.nu.nnz), counts)
+        within = np.arange(len(term_nu)) - np.repeat(np.cumsum(counts) - counts, counts)
+        term_slot = np.repeat(orders.indptr[nu_rows], counts) + within
+        term_rows = self.nu.indices[term_nu]
+        term_cols = orders.indices[term_slot]
+        self._term_nu = self.nu.data[term_nu]
+        self._term_source = reaction[term_slot]*width + slot[term_slot]
+
+        # the pattern includes the diagonal for I - hJ
+        keys = np.concatenate([term_rows*n + term_cols, np.arange(n)*(n + 1)])
+        self._keys, inverse = np.unique(keys, return_inverse=True)
+        self._sum = SparseMatrix.from_triplets(np.arange(len(term_rows)), inverse[:len(term_rows)],
+                                               np.ones(len(term_rows)), (len(term_rows), len(self._keys)))
+        pattern_rows = self._keys//n
+        self._indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pattern_rows, minlength=n), out=self._indptr[1:])
+        self._identity = (pattern_rows == self._keys % n).astype(float)
+
+        self._cache = (None, None)
+
+    def rate_constants(self, T)-> np.ndarray:
+        """The rate constant of every reaction, the last temperatures are cached so they are
+        only evaluated once for an isothermal integration
+
+        :param T: The temperature(s) in K, (trajectories,)
+        :type T: np.ndarray
+        :return: The rate constants (trajectories, reactions)
+        :rtype: np.ndarray
+        """
+        T = np.atleast_1d(np.asarray(T, dtype=float))
+        key = T.tobytes()
+        if self._cache[0] != key:
+            k = self.A*T[:, None]**self.b*np.exp(-self.Ea/(GAS_CONSTANT*T[:, None]))
+            self._cache = (key, k)
+        return self._cache[1]
+
+    def _factors(self, C: np.ndarray)-> np.ndarray:
+        # C_j^o for the reactants of every reaction, (trajectories, reactions, width)
+        return C[:, self._reactants]**self._orders
+
+    def rates(self, C, T)-> np.ndarray:
+        """The rate of every reaction
+
+        :param C: The concentrations in mol/m^3 (trajectories, species)
+        :type C: np.ndarray
+        :param T: The temperature(s) in K, (trajectories,)
+        :type T: np.ndarray
+        :return: The rates in mol/m^3*s (trajectories, reactions)
+        :rtype: np.ndarray
+        """
+        C = np.atleast_2d(np.asarray(C, dtype=float))
+        return self.rate_constants(T)*np.prod(self._factors(C), axis=-1)
+
+    def formation_rates(self, C, T)-> np.ndarray:
+        """The net rate of formation of every species, nu^T r
+
+        :param C: The concentrations in mol/m^3 (trajectories, species)
+        :type C: np.ndarray
+        :param T: The temperature(s) in K, (trajectories,)
+        :type T: np.ndarray
+        :return: dC/dt in mol/m^3*s (trajectories, species)
+        :rtype: np.ndarray
+        """
+        return self.rates(C, T) @ self.nu
+
+    def _jacobian_data(self, C: np.ndarray, T: np.ndarray)-> np.ndarray:
+        # the values of the jacobian on its pattern, (trajectories, pattern)
+        C = np.atleast_2d(np.asarray(C, dtype=float))
+        factors = self._factors(C)
+        # the product of the other reactants, without dividing by a concentration that may be 0
+        ones = np.ones(factors.shape[:-1] + (1,))
+        before = np.cumprod(np.concatenate([ones, factors[..., :-1]], axis=-1), axis=-1)
+        after = np.cumprod(np.concatenate([ones, factors[..., :0:-1]], axis=-1), axis=-1)[..., ::-1]
+        # padded slots have order 0, their power is never computed so tiny concentrations can not overflow
+        reactant_C = C[:, self._reactants]
+        power = np.zeros(reactant_C.shape)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            np.power(reactant_C, self._orders - 1, out=power, where=self._orders > 0)
+        derivative = self._orders*power
+        dr = self.rate_constants(T)[..., None]*before*after*derivative
+        terms = self._term_nu*dr.reshape(len(C), -1)[:, self._term_source]
+        return terms @ self._sum
+
+    def jacobian(self, C, T, sparse: bool=False)-> np.ndarray:
+        """The analytic jacobian of the rates of formation, d(nu^T r)/dC
+
+        :param C: The concentrations in mol/m^3 (trajectories, species)
+        :type C: np.ndarray
+        :param T: The temperature(s) in K, (trajectories,)
+        :type T: np.ndarray
+        :param sparse: Return a SparseMatrix for each trajectory, defaults to False
+        :type sparse: bool, optional
+        :return: The jacobian (trajectories, species, species) or an object array of SparseMatrix (trajectories,)
+        :rtype: np.ndarray
+        """
+        data = self._jacobian_data(C, T)
+        n = len(self.species)
+        if sparse:
+            out = np.empty(len(data), dtype=object)
+            for i, values in enumerate(data):
+                out[i] = SparseMatrix(self._indptr, self._keys % n, values, (n, n))
+            return out
+        J = np.zeros((len(data), n*n))
+        J[:, self._keys] = data
+        return J.reshape(len(data), n, n)
+
+    def _sparse_solver(self, J: np.ndarray, h: np.ndarray)-> Callable:
+        # solves (I - h J) x = rhs for every trajectory with the sparse matrices, a trajectory
+        # whose solve does not converge gets NaN so the integrator rejects the step and shrinks h
+        W = [SparseMatrix(M.indptr, M.indices, self._identity - hi*M.data, M.shape) for M, hi in zip(J, h)]
+
+        def solve(rhs):
+            x = np.full(rhs.shape, np.nan)
+            for i, (M, b) in enumerate(zip(W, rhs)):
+                try:
+                    x[i] = M.solve(b, dense=False)
+                except NotConverged:
+                    pass
+            return x
+        return solve
+
+    def integrate(self, concentrations: Concentration, t_end: Time, temperature: Temperature, t_eval=None,
+                  rtol: float=1E-6, atol: float=1E-12, sparse: bool=None)-> MechanismSolution:
+        """Integrates the mechanism at constant temperature and volume from the initial
+        concentrations. Many trajectories are integrated together by giving the
+        concentrations with one row each and/or an array of temperatures, the rate
+        constants are evaluated once per temperature.
+
+        :param concentrations: The initial concentrations (species,) or (trajectories, species), or a
+            dictionary of the species present, plain numbers are in mol/m^3
+        :type concentrations: Concentration | np.ndarray | dict
+        :param t_end: The reaction time, plain numbers are in s
+        :type t_end: Time | float
+        :param temperature: The temperature(s), plain numbers are in K
+        :type temperature: Temperature | float | np.ndarray
+        :param t_eval: The times in s to return the solution at, defaults to None for 101 evenly spaced times
+        :type t_eval: np.ndarray, optional
+        :param rtol: The relative tolerance, defaults to 1E-6
+        :type rtol: float, optional
+        :param atol: The absolute tolerance in mol/m^3, defaults to 1E-12
+        :type atol: float, optional
+        :param sparse: Solve the linear systems with sparse matrices, defaults to None for more than
+            :data:`DENSE_LIMIT` species
+        :type sparse: bool, optional
+        :raises ValueError: Raises an error if a species in the dictionary is not in the mechanism
+        :return: The times, the concentrations (points, species) or (trajectories, points, species),
+            the accepted steps and whether each integration reached the end
+        :rtype: MechanismSolution
+        """
+        n = len(self.species)
+        if isinstance(concentrations, dict):
+            unknown = set(concentrations) - set(self.species)
+            if unknown:
+                raise ValueError(f"The species {sorted(unknown)} are not in the mechanism")
+            C0 = np.zeros(n)
+            for species, value in concentrations.items():
+                C0[self.network.species_index[species]] = unit_value(value, Concentration, "mol/m^3")
+        else:
+            C0 = unit_value(concentrations, Concentration, "mol/m^3")
+        T = unit_value(temperature, Temperature, "K")
+        t1 = float(unit_value(t_end, Time, "s"))
+
+        shape = np.broadcast_shapes(C0.shape[:-1], T.shape)
+        single = shape == ()
+        m = int(np.prod(shape))
+        C0 = np.broadcast_to(C0, shape + (n,)).reshape(m, n)
+        T = np.broadcast_to(T, shape).reshape(m)
+        sparse = n > DENSE_LIMIT if sparse is None else sparse
+
+        def f(t, y):
+            return self.formation_rates(y, T)
+
+        def jacobian(t, y):
+            return self.jacobian(y, T, sparse)
+
+        solution = solve_ode(f, (0, t1), C0, t_eval, "stiff", rtol, atol, jacobian=jacobian,
+                             linear_solver=self._sparse_solver if sparse else None)
+        if single:
+            return MechanismSolution(Time(solution.t, "s"), Concentration(solution.y[0], "mol/m^3"),
+                                     int(solution.steps[0]), bool(solution.success[0]))
+        return MechanismSolution(Time(solution.t, "s"), Concentration(solution.y, "mol/m^3"), solution.steps,
+                                 solution.success)
@@ -0,0 +1,405 @@
+import re
+from typing import Callable, List
+import numpy as np
+from .balance import SPECIES_SEPARATOR
+from .formula import _element_matrix, parse_formula
+
+class NotConverged(Exception):
+    pass
+
+__all__ = ["ReactionNetwork", "SparseMatrix"]
+
+
+# an optional stoichiometric coefficient separated from the formula by whitespace ie 2 H2O or 0.5 O2,
+# 2H2O without the space is read as a formula
+COEFFICIENT = re.compile(r"^(\d+(?:\.\d*)?|\.\d+)\s+(\S.*)$")
+
+# systems up to this size are solved by dense LU, larger ones by preconditioned GMRES
+DENSE_LIMIT = 1000
+
+
+def _gmres(matvec, b: np.ndarray, preconditioner, tolerance: float, restart: int, max_iterations: int)-> tuple:
+    # right preconditioned restarted GMRES, the least squares problem is kept triangular with Givens rotations
+    x = np.zeros_like(b)
+    target = tolerance*np.linalg.norm(b)
+    iterations = 0
+    while True:
+        r = b - matvec(x)
+        beta = np.linalg.norm(r)
+        if beta <= target or iterations >= max_iterations:
+            return x, beta <= target
+        V = np.zeros((restart + 1, b.size))
+        Z = np.zeros((restart, b.size))
+        H = np.zeros((restart + 1, restart))
+        cs, sn = np.zeros(restart), np.zeros(restart)
+        g = np.zeros(restart + 1)
+        g[0] = beta
+        V[0] = r/beta
+        for j in range(restart):
+            Z[j] = preconditioner(V[j])
+            w = matvec(Z[j])
+            # classical Gram-Schmidt twice is as stable as modified and vectorises
+            h = V[:j + 1] @ w
+            w = w - h @ V[:j + 1]
+            correction = V[:j + 1] @ w
+            w -= correction @ V[:j + 1]
+            H[:j + 1, j] = h + correction
+            H[j + 1, j] = np.linalg.norm(w)
+            if H[j + 1, j] > 0:
+                V[j + 1] = w/H[j + 1, j]
+            for i in range(j):
+                H[i, j], H[i + 1, j] = cs[i]*H[i, j] + sn[i]*H[i + 1, j], cs[i]*H[i + 1, j] - sn[i]*H[i, j]
+            d = np.hypot(H[j, j], H[j + 1, j])
+            cs[j], sn[j] = (H[j, j]/d, H[j + 1, j]/d) if d > 0 else (1.0, 0.0)
+            H[j, j], H[j + 1, j] = d, 0.0
+            g[j + 1] = -sn[j]*g[j]
+            g[j] *= cs[j]
+            iterations += 1
+            if abs(g[j + 1]) <= target or iterations >= max_iterations or d == 0:
+                break
+        k = j + 1
+        y = np.zeros(k)
+        for i in range(k - 1, -1, -1):
+            if H[i, i] != 0:
+                y[i] = (g[i] - H[i, i + 1:k] @ y[i + 1:])/H[i, i]
+        x += y @ Z[:k]
+
+
+class SparseMatrix:
+    """Compressed sparse row matrix, enough for the products of a reaction network.
+    Supports ``A @ x`` and ``x @ A`` for vectors and 2D arrays, the transpose and
+    conversion to a dense array.
+
+    :param indptr: The start of each row in indices and data, length rows + 1
+    :type indptr: np.ndarray
+    :param indices: The column of each stored value
+    :type indices: np.ndarray
+    :param data: The stored values
+    :type data: np.ndarray
+    :param shape: The (rows, columns) of the matrix
+    :type shape: tuple
+    """
+    # let numpy arrays defer to __rmatmul__ for x @ A
+    __array_ufunc__ = None
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray, shape: tuple):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.shape = shape
+        self._transpose = None
+
+    @classmethod
+    def from_triplets(cls, rows, cols, data, shape: tuple)-> "SparseMatrix":
+        """Builds the matrix from (row, column, value) triplets, duplicates are summed and
+        zeros are dropped
+
+        :param rows: The row of each value
+        :type rows: array like
+        :param cols: The column of each value
+        :type cols: array like
+        :param data: The values
+        :type data: array like
+        :param shape: The (rows, columns) of the matrix
+        :type shape: tuple
+        :return: The matrix
+        :rtype: SparseMatrix
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        data = np.asarray(data, dtype=float)
+
+        # sum duplicate entries
+        keys, inverse = np.unique(rows*shape[1] + cols, return_inverse=True)
+        data = np.bincount(inverse, weights=data, minlength=len(keys))
+        keep = data != 0
+        keys, data = keys[keep], data[keep]
+
+        rows, cols = np.divmod(keys, shape[1])
+        indptr = np.zeros(shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=shape[0]), out=indptr[1:])
+        return cls(indptr, cols, data, shape)
+
+    @property
+    def nnz(self)-> int:
+        return len(self.data)
+
+    @property
+    def T(self)-> "SparseMatrix":
+        # built once, x @ A uses it on every call
+        if self._transpose is None:
+            rows = np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+            self._transpose = SparseMatrix.from_triplets(self.indices, rows, self.data, self.shape[::-1])
+            self._transpose._transpose = self
+        return self._transpose
+
+    def toarray(self)-> np.ndarray:
+        dense = np.zeros(self.shape)
+        rows = np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+        dense[rows, self.indices] = self.data
+        return dense
+
+    def dot(self, x)-> np.ndarray:
+        """The product A @ x for a vector (columns,) or an array (columns, k)"""
+        x = np.asarray(x, dtype=float)
+        products = self.data.reshape((-1,) + (1,)*(x.ndim - 1))*x[self.indices]
+        out = np.zeros((self.shape[0],) + x.shape[1:])
+        # reduceat needs the start of every non empty row
+        starts = self.indptr[:-1]
+        filled = starts < self.indptr[1:]
+        if filled.any():
+            out[filled] = np.add.reduceat(products, starts[filled], axis=0)
+        return out
+
+    def diagonal_blocks(self, size: int)-> np.ndarray:
+        """The square blocks on the diagonal, for a matrix made of (size, size) blocks
+
+        :param size: The size of each block, it must divide the number of rows
+        :type size: int
+        :return: The blocks, (rows/size, size, size)
+        :rtype: np.ndarray
+        """
+        rows = np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+        inside = rows//size == self.indices//size
+        blocks = np.zeros((self.shape[0]//size, size, size))
+        blocks[rows[inside]//size, rows[inside] % size, self.indices[inside] % size] = self.data[inside]
+        return blocks
+
+    def solve(self, b, block_size: int=1, tolerance: float=1E-10, dense: bool=None,
+              preconditioner: Callable=None, restart: int=50, max_iterations: int=2000)-> np.ndarray:
+        """Solves A @ x = b for a square matrix. Up to :data:`DENSE_LIMIT` rows the matrix
+        is factored densely, larger systems use restarted GMRES preconditioned with the
+        inverses of the (block_size, block_size) blocks on the diagonal, so only products
+        with the sparse matrix are needed. Put strongly coupled unknowns (ie the species
+        of one reactor) in the same block, or give a better preconditioner.
+
+        :param b: The right hand side, (rows,)
+        :type b: array like
+        :param block_size: The size of the diagonal blocks of the preconditioner, defaults to 1
+        :type block_size: int, optional
+        :param tolerance: The residual of GMRES relative to b, defaults to 1E-10
+        :type tolerance: float, optional
+        :param dense: Force the dense (True) or iterative (False) solve, defaults to None to pick by size
+        :type dense: bool, optional
+        :param preconditioner: Applies an approximate inverse of the matrix to a vector, defaults
+            to None for the inverse of the diagonal blocks
+        :type preconditioner: Callable, optional
+        :param restart: The GMRES iterations between restarts, defaults to 50
+        :type restart: int, optional
+        :param max_iterations: The most GMRES iterations, defaults to 2000
+        :type max_iterations: int, optional
+        :raises NotConverged: Raises an error if GMRES does not reach the tolerance in max_iterations
+        :return: The solution
+        :rtype: np.ndarray
+        """
+        b = np.asarray(b, dtype=float)
+        if dense or (dense is None and self.shape[0] <= DENSE_LIMIT):
+            return np.linalg.solve(self.toarray(), b)
+        if preconditioner is None:
+            blocks = self.diagonal_blocks(block_size)
+            # singular blocks are left out of the preconditioner
+            singular = np.abs(np.linalg.det(blocks)) < 1E-300
+            blocks[singular] = np.eye(block_size)
+            inverse = np.linalg.inv(blocks)
+
+            def preconditioner(v):
+                return (inverse @ v.reshape(-1, block_size, 1)).ravel()
+
+        x, converged = _gmres(self.dot, b, preconditioner, tolerance, restart, max_iterations)
+        if not converged:
+            raise NotConverged(f"GMRES did not reach a relative residual of {tolerance} in {max_iterations} iterations")
+        return x
+
+    def __matmul__(self, x)-> np.ndarray:
+        return self.dot(x)
+
+    def __rmatmul__(self, x)-> np.ndarray:
+        # x @ A = (A.T @ x.T).T
+        return self.T.dot(np.asarray(x, dtype=float).T).T
+
+
+def _parse_side(side: str)-> list:
+    terms = []
+    for term in SPECIES_SEPARATOR.split(side.strip()):
+        term = term.strip()
+        match = COEFFICIENT.match(term)
+        if match:
+            terms.append((float(match.group(1)), match.group(2).strip()))
+        else:
+            terms.append((1.0, term))
+    return terms
+
+
+class ReactionNetwork:
+    """The stoichiometry of a set of reactions, built once from the equations. Holds
+    the stoichiometric matrix (reactions by species, negative for reactants and positive
+    for products) and the element matrix (elements by species) as sparse matrices and
+    answers extent of reaction, atom balance and independence queries with matrix products.
+
+    Each equation is written like :func:`balance_equation` with the coefficients separated
+    from the formula by whitespace ie "2 H2 + O2 -> 2 H2O", so the output of
+    :func:`balance_equation` can be used directly. Species are named by their formula as
+    written and ordered by first appearance. If any species is charged the element
+    matrix has an extra "charge" row. Species can be given any name (ie A, B or OH*) by
+    turning off formulas, there are then no elements to balance.
+
+    :param equations: The equations of the reactions
+    :type equations: List[str]
+    :param formulas: Read the species as chemical formulas for the element matrix, defaults to True
+    :type formulas: bool, optional
+    :raises InvalidParentheses: Raises an error if the parentheses of a formula dont match
+    :raises InvalidFormula: Raises an error if a formula can not be read
+    :raises ValueError: Raises an error if an equation does not have exactly one ->
+
+    :Example:
+
+    >>> from cheme_calculations.reactions import ReactionNetwork
+    >>> network = ReactionNetwork(["2 C + O2 -> 2 CO", "C + O2 -> CO2", "2 CO + O2 -> 2 CO2"])
+    >>> print(network.species)
+    >>> ('C', 'O2', 'CO', 'CO2')
+    >>> print(network.rank)
+    >>> 2
+    >>> print(network.moles([10, 10, 0, 0], [2, 3, 0]))
+    >>> [3. 5. 4. 3.]
+    """
+    def __init__(self, equations: List[str], formulas: bool=True):
+        self.equations = tuple(equations)
+
+        rows, cols, data = [], [], []
+        species_index = {}
+        for i, equation in enumerate(self.equations):
+            sides = equation.split("->")
+            if len(sides) != 2:
+                raise ValueError(f"The equation {equation} must have exactly one ->")
+            for sign, side in zip((-1, 1), sides):
+                for coefficient, species in _parse_side(side):
+                    j = species_index.setdefault(species, len(species_index))
+                    rows.append(i)
+                    cols.append(j)
+                    data.append(sign*coefficient)
+
+        self.species = tuple(species_index)
+        self.species_index = species_index
+        self.stoichiometry = SparseMatrix.from_triplets(rows, cols, data,
+                                                        (len(self.equations), len(self.species)))
+
+        parsed = [parse_formula(x) for x in self.species] if formulas else []
+        self.elements, element_matrix = _element_matrix(parsed, len(self.species))
+        rows, cols = np.nonzero(element_matrix)
+        self.element_matrix = SparseMatrix.from_triplets(rows, cols, element_matrix[rows, cols],
+                                                         element_matrix.shape)
+        self._echelon_cache = {}
+
+    def changes(self, extents)-> np.ndarray:
+        """The change in moles of every species for extents of reaction, the extents
+        can be a vector (reactions,) or an array of many states (states, reactions)
+
+        :param extents: The extent of each reaction
+        :type extents: array like
+        :return: The change in moles of each species, (species,) or (states, species)
+        :rtype: np.ndarray
+        """
+        return np.asarray(extents, dtype=float) @ self.stoichiometry
+
+    def moles(self, initial, extents)-> np.ndarray:
+        """The moles of every species after the reactions proceed by the extents
+
+        :param initial: The initial moles of each species, in the order of species
+        :type initial: array like
+        :param extents: The extent of each reaction, (reactions,) or (states, reactions)
+        :type extents: array like
+        :return: The moles of each species, (species,) or (states, species)
+        :rtype: np.ndarray
+        """
+        return np.asarray(initial, dtype=float) + self.changes(extents)
+
+    def extents(self, initial, final)-> np.ndarray:
+        """The extents of reaction that best explain a change in moles, by least squares.
+        When the reactions are not independent the extents are not unique and the
+        smallest set is returned.
+
+        :param initial: The initial moles of each species, (species,) or (states, species)
+        :type initial: array like
+        :param final: The final moles of each species, (species,) or (states, species)
+        :type final: array like
+        :return: The extent of each reaction, (reactions,) or (states, reactions)
+        :rtype: np.ndarray
+        """
+        change = np.asarray(final, dtype=float) - np.asarray(initial, dtype=float)
+        independent, basis, combinations = self._echelon()
+        if not independent:
+            return np.zeros(change.shape[:-1] + (len(self.equations),))
+        # the independent reactions explain the change, every reaction is a combination
+        # of them so the smallest extents are the minimum norm solution of the combinations
+        y = np.linalg.lstsq(basis, change.T, rcond=None)[0]
+        solution = combinations.T @ np.linalg.solve(combinations @ combinations.T, y)
+        return solution.T
+
+    def atom_balance(self)-> np.ndarray:
+        """The net amount of each element (and charge) created by each reaction, all
+        zero for balanced reactions
+
+        :return: The residuals, (reactions, elements)
+        :rtype: np.ndarray
+        """
+        return (self.element_matrix @ self.stoichiometry.T.toarray()).T
+
+    def unbalanced(self, tolerance: float=1E-9)-> List[int]:
+        """The reactions that do not conserve every element and the charge
+
+        :param tolerance: The largest residual that counts as balanced, defaults to 1E-9
+        :type tolerance: float, optional
+        :return: The index of each unbalanced reaction
+        :rtype: List[int]
+        """
+        residual = self.atom_balance()
+        return np.flatnonzero(np.abs(residual).max(axis=1, initial=0) > tolerance).tolist()
+
+    @property
+    def is_balanced(self)-> bool:
+        return not self.unbalanced()
+
+    def _echelon(self, tolerance: float=1E-9)-> tuple:
+        # gaussian elimination with partial pivoting on the transposed stoichiometry, the
+        # reactions (columns) are taken in order so the pivots are the first independent
+        # set, then each reaction is written as a combination of the independent ones
+        if tolerance in self._echelon_cache:
+            return self._echelon_cache[tolerance]
+        N = self.stoichiometry.T.toarray()
+        A = N.copy()
+        n_species, n_reactions = A.shape
+        scale = np.maximum(np.linalg.norm(A, axis=0), 1)
+        remaining = np.ones(n_species, dtype=bool)
+        independent, pivot_rows = [], []
+        for c in range(n_reactions):
+            if len(independent) == n_species:
+                break
+            column = np.where(remaining, np.abs(A[:, c]), 0)
+            p = int(np.argmax(column))
+            if column[p] <= tolerance*scale[c]:
+                continue
+            remaining[p] = False
+            rows = remaining & (A[:, c] != 0)
+            A[rows, c:] -= np.outer(A[rows, c]/A[p, c], A[p, c:])
+            independent.append(c)
+            pivot_rows.append(p)
+        U = A[pivot_rows]
+        combinations = np.linalg.solve(U[:, independent], U) if independent else U
+        self._echelon_cache[tolerance] = (independent, N[:, independent], combinations)
+        return self._echelon_cache[tolerance]
+
+    @property
+    def rank(self)-> int:
+        """The number of independent reactions"""
+        return len(self._echelon()[0])
+
+    def independent_reactions(self, tolerance: float=1E-9)-> List[int]:
+        """The first set of reactions, in order, that are independent of each other, every
+        other reaction is a combination of these
+
+        :param tolerance: The smallest pivot, relative to the norm of the reaction, of a new direction, defaults to 1E-9
+        :type tolerance: float, optional
+        :return: The index of each independent reaction
+        :rtype: List[int]
+        """
+        return list(self._echelon(tolerance)[0])
@@ -1,12 +1,14 @@
 
 
 from math import exp, log
+import math
+from functools import lru_cache
 from typing import List, Union
 import numpy as np
 from collections import namedtuple
 from cheme_calculations.units.mass_transfer import Concentration
 
-from cheme_calculations.utility import solvable_for
+from cheme_calculations.utility import solvable_for, unit_value
 
 from cheme_calculations.units.reactions import ActivationEnergy, KineticConstant
 from cheme_calculations.units.units import MultiUnit, Temperature, Time
@@ -15,19 +17,35 @@ IntegralResults = namedtuple(
     'IntegralResults', ["order", "r_squared"]
 )
 
-__all__ = ["integral_method", "arrhenius"]
+ArrheniusFit = namedtuple(
+    'ArrheniusFit', ["A", "Ea", "A_error", "Ea_error", "r_squared"]
+)
+
+__all__ = ["integral_method", "arrhenius", "arrhenius_k", "fit_arrhenius", "ArrheniusFit"]
+
+# J/mol*K, for the array functions that take temperatures in K and activation energies in J/mol
+GAS_CONSTANT = 8.314462618
+
 
 def integral_method(time_data: List, reaction_data: List, order_range: tuple)-> IntegralResults:
     """Uses the integral method to determine the reaction order for a particular reactant, 
     evaluates the bets result using r squared correlation.
+    
+    Every order on the grid is tested at once, the concentrations are transformed to the
+    integrated rate law for each order, C^(1-n) or ln(C) for first order, and the r 
+    squared of every transform against time comes from one batched regression. Many 
+    datasets can be fit in one call by passing a 2D array of concentrations, one 
+    dataset per row, with the time data for all of them or one row of times each.
 
     :param time_data: The time data for the reaction 
-    :type time_data: List
-    :param reaction_data: The concentration data for the reactant
-    :type reaction_data: List
-    :param order_range: The range of orders to test for the best fit, (start, stop, step)
-    :type order_range: tuple(int, int, float)
-    :return: The results of the fit (order: float, r_squared: float)
+    :type time_data: List | np.ndarray
+    :param reaction_data: The concentration data for the reactant, or one row per dataset
+    :type reaction_data: List | np.ndarray
+    :param order_range: The range of orders to test for the best fit, (start, stop, step), 
+        or an array of the orders
+    :type order_range: tuple(int, int, float) | np.ndarray
+    :return: The results of the fit (order: float, r_squared: float), arrays with an entry
+        for each dataset if reaction_data is 2D
     :rtype: IntegralResults
     
     :Example: 
@@ -39,30 +57,39 @@ def integral_method(time_data: List, reaction_data: List, order_range: tuple)->
     >>> print(ans)
     >>> IntegralResults(order=1.0, r_squared=0.9997228295541076)
     """
+    if isinstance(order_range, tuple):
+        orders = np.arange(*order_range)
+    else:
+        orders = np.asarray(order_range, dtype=float)
+    
+    c = np.asarray(reaction_data, dtype=float)
+    t = np.asarray(time_data, dtype=float)
+    single = c.ndim == 1
+    c = np.atleast_2d(c)
+    t = np.broadcast_to(t, c.shape)
+    
+    # (datasets, orders, points), the sign and scale of each transform dont change r squared
+    first_order = np.isclose(orders, 1)[:, None]
+    exponent = np.where(first_order, 0, 1 - orders[:, None])
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        transformed = np.where(first_order, np.log(c[:, None, :]), c[:, None, :]**exponent)
     
-    def get_r_squared(list1: List, list2: List):
-        corr_matrix = np.corrcoef(list1, list2)
-        corr = corr_matrix[0, 1]
-        return corr**2
-    
-    best_r_squared = 0
-    order = 0
-    for i in np.arange(*order_range):
-        if i == 1:
-            reaction_data = [log(x) for x in reaction_data]
-        elif i<1 and i>0:
-            # based on power rule derivative 
-            reaction_data = [x**(-i+1)/(-i+1) for x in reaction_data]
-        elif i >= 1:
-            reaction_data = [1/x**(i-1) for x in reaction_data]
-        r = get_r_squared(time_data, reaction_data)
-        if r > best_r_squared:
-            best_r_squared = r
-            order = i
+        t_centered = t - t.mean(axis=-1, keepdims=True)
+        y_centered = transformed - transformed.mean(axis=-1, keepdims=True)
+        covariance = np.einsum("dop,dp->do", y_centered, t_centered)
+        r_squared = covariance**2/((y_centered**2).sum(axis=-1)*(t_centered**2).sum(axis=-1)[:, None])
+    r_squared = np.where(np.isfinite(r_squared), r_squared, 0)
     
+    best = np.argmax(r_squared, axis=-1)
+    order = orders[best]
+    best_r_squared = r_squared[np.arange(len(best)), best]
+    
+    if single:
+        return IntegralResults(float(order[0]), float(best_r_squared[0]))
     return IntegralResults(order, best_r_squared)
 
 
+@lru_cache(maxsize=None)
 def _get_arrhenius_units(order: float):
     if order == 0:
         return "mol/L*s"
@@ -133,4 +160,150 @@ def arrhenius(order: float, A: float, Ea: ActivationEnergy, R: MultiUnit, T: Tem
         
         
         
-    
\ No newline at end of file
+    
+
+def arrhenius_k(T: Temperature, A: float, Ea: ActivationEnergy, order: float=1)-> KineticConstant:
+    """Evaluates the arrhenius equation for k over an array of temperatures at once, the
+    fast path of :func:`arrhenius` for screening many temperatures. The units of k are
+    worked out once for the order (assuming mol/L like :func:`arrhenius`) and the 
+    exponential is evaluated on the whole array.
+    
+    .. math:: k = Ae^{\\frac{-Ea}{RT}}
+
+    :param T: The temperature(s), plain numbers are in K
+    :type T: Temperature | np.ndarray
+    :param A: The Arrhenius constant
+    :type A: float
+    :param Ea: The activation energy, plain numbers are in J/mol
+    :type Ea: ActivationEnergy | float
+    :param order: The order of the reaction, for the units of k, defaults to 1
+    :type order: float, optional
+    :return: The kinetic constant at each temperature
+    :rtype: KineticConstant
+    
+    :Example:
+    
+    >>> from cheme_calculations.reactions import arrhenius_k
+    >>> T = Temperature(np.linspace(300, 400, 5), "K")
+    >>> k = arrhenius_k(T, 1E19, ActivationEnergy(89000, "J/mol"))
+    >>> print(k)
+    >>> [3.19172915e+03 4.96619797e+04 5.22079448e+05 4.01070597e+06 2.38791863e+07] s-¹
+    """
+    T = unit_value(T, Temperature, "K")
+    Ea = unit_value(Ea, ActivationEnergy, "J/mol")
+    k = A*np.exp(-Ea/(GAS_CONSTANT*T))
+    return KineticConstant(k, _get_arrhenius_units(order))
+
+
+def _beta_fraction(a: float, b: float, x: float)-> float:
+    # continued fraction of the incomplete beta function (modified Lentz)
+    tiny = 1E-300
+    c, d = 1.0, 1 - (a + b)*x/(a + 1)
+    d = 1/(d if abs(d) > tiny else tiny)
+    h = d
+    for m in range(1, 300):
+        for numerator in (m*(b - m)*x/((a + 2*m - 1)*(a + 2*m)),
+                          -(a + m)*(a + b + m)*x/((a + 2*m)*(a + 2*m + 1))):
+            d = 1 + numerator*d
+            d = 1/(d if abs(d) > tiny else tiny)
+            c = 1 + numerator/c
+            c = c if abs(c) > tiny else tiny
+            h *= d*c
+        if abs(d*c - 1) < 1E-15:
+            break
+    return h
+
+
+def _t_two_tailed(t: float, dof: float)-> float:
+    # P(|T| > t) = I_x(dof/2, 1/2) with x = dof/(dof + t^2)
+    x = dof/(dof + t*t)
+    a, b = dof/2, 0.5
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a*math.log(x) + b*math.log1p(-x))
+    if x < (a + 1)/(a + b + 2):
+        return front*_beta_fraction(a, b, x)/a
+    return 1 - front*_beta_fraction(b, a, 1 - x)/b
+
+
+@lru_cache(maxsize=256)
+def _t_quantile(confidence: float, dof: float)-> float:
+    # the two sided student's t value for a confidence level, by bisection on the tail probability
+    if dof <= 0:
+        return math.inf
+    alpha = 1 - confidence
+    lo, hi = 0.0, 1.0
+    while _t_two_tailed(hi, dof) > alpha:
+        hi *= 2
+    for _ in range(100):
+        mid = (lo + hi)/2
+        if _t_two_tailed(mid, dof) > alpha:
+            lo = mid
+        else:
+            hi = mid
+    return (lo + hi)/2
+
+
+def fit_arrhenius(T: Temperature, k, confidence: float=0.95)-> ArrheniusFit:
+    """Fits the Arrhenius constant and the activation energy to rate constants measured
+    at several temperatures, by linear regression of ln(k) against 1/T. Many series 
+    measured at the same temperatures can be fit at once by passing k with one series 
+    per row, the results are then arrays.
+    
+    .. math:: \\ln k = \\ln A - \\frac{Ea}{R}\\frac{1}{T}
+    
+    The errors are the half widths of the confidence intervals from the student's t 
+    distribution with points - 2 degrees of freedom, the error of A is carried over from 
+    the error of ln(A) to first order.
+
+    :param T: The temperatures, plain numbers are in K
+    :type T: Temperature | np.ndarray
+    :param k: The kinetic constants at each temperature, or one row per series
+    :type k: KineticConstant | np.ndarray
+    :param confidence: The confidence level of the intervals, defaults to 0.95
+    :type confidence: float, optional
+    :return: A (in the units of k), Ea, their errors and the r squared of the fit
+    :rtype: ArrheniusFit
+    
+    :Example:
+    
+    >>> from cheme_calculations.reactions import fit_arrhenius
+    >>> T = Temperature(np.array([300, 320, 340, 360]), "K")
+    >>> k = KineticConstant(np.array([1.1E-3, 6.8E-3, 3.5E-2, 0.152]), "s^-1")
+    >>> fit = fit_arrhenius(T, k)
+    >>> print(fit.Ea)
+    >>> 73770.40468782523 J / mol
+    """
+    x = 1/unit_value(T, Temperature, "K")
+    if isinstance(k, MultiUnit):
+        y = np.log(np.asarray(k._value, dtype=float))
+    else:
+        y = np.log(np.asarray(k, dtype=float))
+    
+    n = x.shape[-1]
+    x_mean = x.mean()
+    Sxx = ((x - x_mean)**2).sum()
+    y_mean = y.mean(axis=-1)
+    slope = ((y - y_mean[..., None]) @ (x - x_mean))/Sxx
+    intercept = y_mean - slope*x_mean
+    
+    residuals = y - (intercept[..., None] + slope[..., None]*x)
+    ssr = (residuals**2).sum(axis=-1)
+    sst = ((y - y_mean[..., None])**2).sum(axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s2 = ssr/(n - 2) if n > 2 else np.full_like(ssr, np.inf)
+        r_squared = np.where(sst > 0, 1 - ssr/sst, 1.0)
+    t = _t_quantile(confidence, n - 2)
+    slope_error = t*np.sqrt(s2/Sxx)
+    intercept_error = t*np.sqrt(s2*(1/n + x_mean**2/Sxx))
+    
+    A = np.exp(intercept)
+    A_error = A*intercept_error
+    Ea = -slope*GAS_CONSTANT
+    Ea_error = slope_error*GAS_CONSTANT
+    if y.ndim == 1:
+        A, A_error, Ea, Ea_error, r_squared = (float(v) for v in (A, A_error, Ea, Ea_error, r_squared))
+    # A keeps the units of k
+    if isinstance(k, MultiUnit):
+        A = type(k)(A, top_half=k._top_half, bottom_half=k._bottom_half)
+        A_error = type(k)(A_error, top_half=k._top_half, bottom_half=k._bottom_half)
+    
+    return ArrheniusFit(A, ActivationEnergy(Ea, "J/mol"), A_error, ActivationEnergy(Ea_error, "J/mol"), r_squared)
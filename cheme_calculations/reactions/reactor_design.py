@@ -1,13 +1,21 @@
 
+from collections import namedtuple
+import numpy as np
 from cheme_calculations.units.reactions import MolarFlowRate, ReactionRate
 from cheme_calculations.units.units import Volume
+from cheme_calculations.utility import unit_value
 
-__all__ = ["cstr_volume"]
+CSTRSeries = namedtuple(
+    'CSTRSeries', ["conversions", "volumes", "total_volume"]
+)
+
+__all__ = ["cstr_volume", "levenspiel_curve", "cstr_volume_from_data", "pfr_volume_from_data",
+           "optimal_cstr_series", "CSTRSeries"]
 
 def cstr_volume(Fa0: MolarFlowRate, Fa: MolarFlowRate, ra: ReactionRate)-> Volume:
     """Gets the volume for a CSTR reactor. Assumes steady state and perfect mixing 
     
-    .. math:: V = \frac{F_{A0} - F_A}{-r_a}
+    .. math:: V = \\frac{F_{A0} - F_A}{-r_a}
 
     :param Fa0: Initial molar flow rate
     :type Fa0: MolarFlowRate
@@ -22,4 +30,244 @@ def cstr_volume(Fa0: MolarFlowRate, Fa: MolarFlowRate, ra: ReactionRate)-> Volum
     
     >>> 
     """
-    return (Fa0 - Fa) / -ra
\ No newline at end of file
+    return (Fa0 - Fa) / -ra
+
+
+def _levenspiel_data(Fa0, conversion, rate)-> tuple:
+    # the conversions and Fa0/-rA in m^3, sorted by conversion
+    Fa0 = float(unit_value(Fa0, MolarFlowRate, "mol/s"))
+    X = np.asarray(conversion, dtype=float)
+    rate = unit_value(rate, ReactionRate, "mol/m^3*s")
+    order = np.argsort(X, kind="stable")
+    X = X[order]
+    curve = Fa0/np.abs(np.broadcast_to(rate, X.shape)[order])
+    if np.any(np.diff(X) <= 0):
+        raise ValueError("The conversions must be distinct")
+    return X, curve
+
+
+def _check_range(X: np.ndarray, *conversions):
+    for x in conversions:
+        if np.any(x < X[0] - 1E-12) or np.any(x > X[-1] + 1E-12):
+            raise ValueError(f"The conversions must be within the data, {X[0]} to {X[-1]}")
+
+
+def _check_order(X_in, X_out):
+    if np.any(X_in > X_out):
+        raise ValueError("The inlet conversion can not be above the outlet conversion")
+
+
+def levenspiel_curve(Fa0: MolarFlowRate, conversion, rate: ReactionRate)-> Volume:
+    """The Levenspiel curve Fa0/(-rA) of tabulated rate data, the area under it is the
+    PFR volume and the rectangle to its value at the outlet is the CSTR volume.
+
+    :param Fa0: The inlet molar flow of the limiting reactant, plain numbers are in mol/s
+    :type Fa0: MolarFlowRate | float
+    :param conversion: The conversions the rates were measured at
+    :type conversion: np.ndarray
+    :param rate: The rate of consumption -rA at each conversion, plain numbers are in mol/m^3*s
+    :type rate: ReactionRate | np.ndarray
+    :return: Fa0/(-rA) at each conversion, in order of conversion
+    :rtype: Volume
+    """
+    _, curve = _levenspiel_data(Fa0, conversion, rate)
+    return Volume(curve, "m^3")
+
+
+def cstr_volume_from_data(Fa0: MolarFlowRate, conversion, rate: ReactionRate, conversion_out,
+                          conversion_in=0.0)-> Volume:
+    """The CSTR volume from tabulated rate data, the rate at the outlet conversion is
+    interpolated linearly from the data. Every outlet conversion in an array is sized at once.
+
+    .. math:: V = \\frac{F_{A0}(X_{out} - X_{in})}{-r_A(X_{out})}
+
+    :param Fa0: The inlet molar flow of the limiting reactant, plain numbers are in mol/s
+    :type Fa0: MolarFlowRate | float
+    :param conversion: The conversions the rates were measured at
+    :type conversion: np.ndarray
+    :param rate: The rate of consumption -rA at each conversion, plain numbers are in mol/m^3*s
+    :type rate: ReactionRate | np.ndarray
+    :param conversion_out: The outlet conversion(s)
+    :type conversion_out: float | np.ndarray
+    :param conversion_in: The inlet conversion(s), defaults to 0.0
+    :type conversion_in: float | np.ndarray, optional
+    :raises ValueError: Raises an error if a conversion is outside of the data or the inlet is above the outlet
+    :return: The volume for each outlet conversion
+    :rtype: Volume
+
+    :Example:
+
+    >>> from cheme_calculations.reactions import cstr_volume_from_data
+    >>> X = [0, 0.2, 0.4, 0.6, 0.8]
+    >>> rate = ReactionRate(np.array([10, 8, 6, 4, 2]), "mol/m^3*s")
+    >>> print(cstr_volume_from_data(MolarFlowRate(5, "mol/s"), X, rate, 0.6))
+    >>> 0.75 m³
+    """
+    X, curve = _levenspiel_data(Fa0, conversion, rate)
+    X_out = np.asarray(conversion_out, dtype=float)
+    X_in = np.asarray(conversion_in, dtype=float)
+    _check_range(X, X_out, X_in)
+    _check_order(X_in, X_out)
+    return Volume(np.interp(X_out, X, curve)*(X_out - X_in), "m^3")
+
+
+# the degree of the local polynomial each method integrates
+QUADRATURE_DEGREES = {"trapezoid": 1, "simpson": 2, "gauss": 3}
+
+
+def _piece_integrals(X: np.ndarray, curve: np.ndarray, i: np.ndarray, lower: np.ndarray,
+                     upper: np.ndarray, degree: int)-> np.ndarray:
+    # the integral over [lower, upper] inside interval i of the polynomial through the
+    # degree + 1 data points around it, by Gauss-Legendre with enough points to be exact
+    degree = min(degree, len(X) - 1)
+    start = np.clip(i - (degree - 1)//2, 0, len(X) - 1 - degree)
+    stencil = start[..., None] + np.arange(degree + 1)
+    P, F = X[stencil], curve[stencil]
+    nodes, weights = np.polynomial.legendre.leggauss(degree//2 + 1)
+    half = (upper - lower)/2
+    t = ((upper + lower)/2)[..., None] + half[..., None]*nodes
+
+    # lagrange form of the polynomial at the nodes
+    value = 0
+    for a in range(degree + 1):
+        basis = F[..., None, a]
+        for b in range(degree + 1):
+            if b != a:
+                basis = basis*(t - P[..., None, b])/(P[..., None, a] - P[..., None, b])
+        value = value + basis
+    return half*(value @ weights)
+
+
+def _cumulative_integral(X: np.ndarray, curve: np.ndarray, degree: int)-> np.ndarray:
+    # the integral of the curve from X[0] to every X[i]
+    pieces = _piece_integrals(X, curve, np.arange(len(X) - 1), X[:-1], X[1:], degree)
+    return np.concatenate([[0.0], np.cumsum(pieces)])
+
+
+def _integral_to(X: np.ndarray, curve: np.ndarray, cumulative: np.ndarray, x: np.ndarray,
+                 degree: int)-> np.ndarray:
+    # the cumulative integral at each data point plus the same polynomial over the part interval up to x
+    i = np.clip(np.searchsorted(X, x, side="right") - 1, 0, len(X) - 2)
+    return cumulative[i] + _piece_integrals(X, curve, i, X[i], x, degree)
+
+
+def pfr_volume_from_data(Fa0: MolarFlowRate, conversion, rate: ReactionRate, conversion_out,
+                         conversion_in=0.0, method: str="trapezoid")-> Volume:
+    """The PFR volume from tabulated rate data, the area under the Levenspiel curve
+    Fa0/(-rA) between the inlet and outlet conversions. Every outlet conversion in an
+    array is sized at once from one cumulative integral of the data.
+
+    .. math:: V = F_{A0}\\int_{X_{in}}^{X_{out}} \\frac{dX}{-r_A}
+
+    Methods:
+
+    - "trapezoid": exact for the curve joined by straight lines
+    - "simpson": a quadratic through each set of three neighbouring points, for uneven spacing too
+    - "gauss": Gauss-Legendre quadrature of the cubic through the four points around each interval, exact for cubic curves
+
+    Part intervals at the inlet and outlet use the same polynomial as the whole interval.
+
+    :param Fa0: The inlet molar flow of the limiting reactant, plain numbers are in mol/s
+    :type Fa0: MolarFlowRate | float
+    :param conversion: The conversions the rates were measured at
+    :type conversion: np.ndarray
+    :param rate: The rate of consumption -rA at each conversion, plain numbers are in mol/m^3*s
+    :type rate: ReactionRate | np.ndarray
+    :param conversion_out: The outlet conversion(s)
+    :type conversion_out: float | np.ndarray
+    :param conversion_in: The inlet conversion(s), defaults to 0.0
+    :type conversion_in: float | np.ndarray, optional
+    :param method: "trapezoid", "simpson" or "gauss", defaults to "trapezoid"
+    :type method: str, optional
+    :raises ValueError: Raises an error if a conversion is outside of the data, the inlet is above
+        the outlet or the method is unknown
+    :return: The volume for each outlet conversion
+    :rtype: Volume
+
+    :Example:
+
+    >>> from cheme_calculations.reactions import pfr_volume_from_data
+    >>> X = [0, 0.2, 0.4, 0.6, 0.8]
+    >>> rate = ReactionRate(np.array([10, 8, 6, 4, 2]), "mol/m^3*s")
+    >>> print(pfr_volume_from_data(MolarFlowRate(5, "mol/s"), X, rate, 0.6, method="simpson"))
+    >>> 0.44791666666666663 m³
+    """
+    if method not in QUADRATURE_DEGREES:
+        raise ValueError(f"Unknown method {method}, use trapezoid, simpson or gauss")
+    degree = QUADRATURE_DEGREES[method]
+    X, curve = _levenspiel_data(Fa0, conversion, rate)
+    X_out = np.asarray(conversion_out, dtype=float)
+    X_in = np.asarray(conversion_in, dtype=float)
+    _check_range(X, X_out, X_in)
+    _check_order(X_in, X_out)
+
+    cumulative = _cumulative_integral(X, curve, degree)
+    return Volume(_integral_to(X, curve, cumulative, X_out, degree)
+                  - _integral_to(X, curve, cumulative, X_in, degree), "m^3")
+
+
+def optimal_cstr_series(Fa0: MolarFlowRate, conversion, rate: ReactionRate, conversion_out: float,
+                        n_reactors: int, grid: int=1001)-> CSTRSeries:
+    """Sizes a series of CSTRs reaching an outlet conversion with the smallest total volume,
+    from tabulated rate data. The intermediate conversions are chosen by dynamic programming
+    over a grid of conversions between the start of the data and the outlet, every stage is
+    checked against every earlier grid point at once.
+
+    .. math:: V_{total} = \\sum_k \\frac{F_{A0}(X_k - X_{k-1})}{-r_A(X_k)}
+
+    :param Fa0: The inlet molar flow of the limiting reactant, plain numbers are in mol/s
+    :type Fa0: MolarFlowRate | float
+    :param conversion: The conversions the rates were measured at
+    :type conversion: np.ndarray
+    :param rate: The rate of consumption -rA at each conversion, plain numbers are in mol/m^3*s
+    :type rate: ReactionRate | np.ndarray
+    :param conversion_out: The conversion leaving the last reactor
+    :type conversion_out: float
+    :param n_reactors: The number of reactors in series
+    :type n_reactors: int
+    :param grid: The number of conversions the intermediate stages are chosen from, defaults to 1001
+    :type grid: int, optional
+    :raises ValueError: Raises an error if the outlet conversion is outside of the data
+    :return: The conversion leaving each reactor, the volume of each reactor and the total volume
+    :rtype: CSTRSeries
+
+    :Example:
+
+    >>> from cheme_calculations.reactions import optimal_cstr_series
+    >>> X = np.linspace(0, 0.95, 100000)
+    >>> rate = 0.1*2000*(1 - X) # first order, k = 0.1 1/s and CA0 = 2000 mol/m^3
+    >>> series = optimal_cstr_series(20, X, rate, 0.9, 2)
+    >>> print(series.conversions)
+    >>> [0.684 0.9  ]
+    """
+    X, curve = _levenspiel_data(Fa0, conversion, rate)
+    _check_range(X, conversion_out)
+    if n_reactors < 1:
+        raise ValueError("There must be at least one reactor")
+
+    # candidate conversions, the grid always ends on the outlet
+    x = np.linspace(X[0], conversion_out, grid)
+    g = np.interp(x, X, curve)
+
+    # volume[j] is the least total volume reaching x[j] with the stages so far
+    volume = (x - x[0])*g
+    choices = []
+    earlier = np.tril(np.ones((grid, grid), dtype=bool))
+    for _ in range(n_reactors - 1):
+        # candidate[j, i]: stages up to x[i] then one reactor from x[i] to x[j]
+        candidate = volume[None, :] + (x[:, None] - x[None, :])*g[:, None]
+        candidate = np.where(earlier, candidate, np.inf)
+        best = np.argmin(candidate, axis=1)
+        choices.append(best)
+        volume = candidate[np.arange(grid), best]
+
+    # walk back from the outlet through the chosen stages
+    stages = [grid - 1]
+    for best in reversed(choices):
+        stages.append(best[stages[-1]])
+    stages = np.array(stages[::-1])
+    conversions = x[stages]
+    volumes = np.diff(np.concatenate([[x[0]], conversions]))*g[stages]
+
+    return CSTRSeries(conversions, Volume(volumes, "m^3"), Volume(float(volumes.sum()), "m^3"))
+
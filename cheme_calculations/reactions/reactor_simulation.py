@@ -0,0 +1,353 @@
+from collections import namedtuple
+from typing import Callable
+import numpy as np
+from cheme_calculations.units import Concentration, VolumetricFlowrate
+from cheme_calculations.units.reactions import MolarFlowRate, ReactionRate
+from cheme_calculations.units.units import Amount, Temperature, Time, Volume
+from cheme_calculations.utility import unit_value
+from cheme_calculations.utility.ode_solvers import solve_ode
+
+__all__ = ["batch_reactor", "pfr", "semibatch_reactor", "BatchReactorSolution", "PFRSolution",
+           "SemiBatchReactorSolution"]
+
+
+BatchReactorSolution = namedtuple(
+    'BatchReactorSolution', ["t", "concentrations", "temperature", "success"]
+)
+
+PFRSolution = namedtuple(
+    'PFRSolution', ["volume", "flow_rates", "concentrations", "temperature", "success"]
+)
+
+SemiBatchReactorSolution = namedtuple(
+    'SemiBatchReactorSolution', ["t", "moles", "concentrations", "volume", "temperature", "success"]
+)
+
+
+def _stoichiometry(stoichiometry):
+    # a ReactionNetwork keeps its sparse matrix, anything else is a dense (reactions, species) array
+    if hasattr(stoichiometry, "stoichiometry"):
+        return stoichiometry.stoichiometry
+    return np.asarray(stoichiometry, dtype=float)
+
+
+class _Balances:
+    # the rate law, stoichiometry and optional energy balance shared by the reactor models,
+    # every parameter has a leading axis of one entry per trajectory
+    def __init__(self, rate_law: Callable, stoichiometry, n_trajectories: int, heat_of_reaction,
+                 heat_capacity, heat_transfer, coolant_temperature):
+        self.rate_law = rate_law
+        self.nu = _stoichiometry(stoichiometry)
+        self.energy = heat_of_reaction is not None
+        if self.energy:
+            if heat_capacity is None:
+                raise ValueError("The heat capacity of every species is needed for the energy balance")
+            self.dH = np.broadcast_to(np.asarray(heat_of_reaction, dtype=float), (n_trajectories, self.nu.shape[0]))
+            self.cp = np.broadcast_to(np.asarray(heat_capacity, dtype=float), (n_trajectories, self.nu.shape[1]))
+            self.ua = np.broadcast_to(np.asarray(heat_transfer, dtype=float), (n_trajectories,))
+            self.coolant = None if coolant_temperature is None else np.broadcast_to(
+                unit_value(coolant_temperature, Temperature, "K"), (n_trajectories,))
+
+    def rates(self, C: np.ndarray, T: np.ndarray)-> tuple:
+        # reaction rates and the net rate of formation of each species
+        r = unit_value(self.rate_law(C, T), ReactionRate, "mol/m^3*s")
+        return r, r @ self.nu
+
+    def heat(self, r: np.ndarray, T: np.ndarray)-> np.ndarray:
+        # heat released by the reactions plus the heat exchanged, per unit volume
+        q = np.sum(-self.dH*r, axis=-1)
+        if self.coolant is not None:
+            q = q + self.ua*(self.coolant - T)
+        return q
+
+
+def _prepare(species_arrays: list, values: list)-> tuple:
+    # broadcast the species arrays (..., n) and the values of each trajectory (...) to m trajectories
+    species_arrays = [np.asarray(x, dtype=float) for x in species_arrays]
+    values = [np.asarray(x, dtype=float) for x in values]
+    shape = np.broadcast_shapes(*(x.shape[:-1] for x in species_arrays), *(x.shape for x in values))
+    m = int(np.prod(shape))
+    species_arrays = [np.broadcast_to(x, shape + x.shape[-1:]).reshape(m, -1) for x in species_arrays]
+    values = [np.broadcast_to(x, shape).reshape(m) for x in values]
+    return shape == (), m, species_arrays, values
+
+
+def batch_reactor(rate_law: Callable, stoichiometry, concentrations: Concentration, t_end: Time,
+                  temperature: Temperature, heat_of_reaction=None, heat_capacity=None,
+                  heat_transfer: float=0, coolant_temperature: Temperature=None, t_eval=None,
+                  method: str="rk45", rtol: float=1E-6, atol: float=1E-9)-> BatchReactorSolution:
+    """Integrates the mole balances of a constant volume batch reactor with any rate law,
+    and the energy balance if the heats of reaction are given (isothermal otherwise).
+
+    .. math:: \\frac{dC_j}{dt} = \\sum_i \\nu_{ij}r_i \\qquad \\frac{dT}{dt} = \\frac{\\sum_i (-\\Delta H_i)r_i + Ua(T_a - T)}{\\sum_j C_jCp_j}
+
+    Many reactors can be integrated at once for design sweeps, give the initial concentrations
+    with one row per reactor and/or arrays for the temperature and energy balance parameters,
+    they are broadcast together. The rate law is then called with every reactor at once.
+
+    NOTE: The rate law works in SI, it is called as rate_law(C, T) with the concentrations in
+    mol/m^3 (reactors, species) and the temperatures in K (reactors,) and returns the rate of
+    each reaction in mol/m^3*s (reactors, reactions), or a ReactionRate in any units. Plain
+    numbers given for the other arguments are taken as SI too.
+
+    :param rate_law: The rates of the reactions, rate_law(C, T)
+    :type rate_law: Callable
+    :param stoichiometry: The stoichiometric coefficients (reactions, species), negative for reactants
+    :type stoichiometry: ReactionNetwork | np.ndarray
+    :param concentrations: The initial concentration of each species
+    :type concentrations: Concentration | np.ndarray
+    :param t_end: The reaction time
+    :type t_end: Time | float
+    :param temperature: The initial (or constant) temperature
+    :type temperature: Temperature | float | np.ndarray
+    :param heat_of_reaction: The heat of each reaction in J/mol, defaults to None for isothermal
+    :type heat_of_reaction: np.ndarray, optional
+    :param heat_capacity: The heat capacity of each species in J/mol*K, needed with heat_of_reaction
+    :type heat_capacity: np.ndarray, optional
+    :param heat_transfer: Ua, the heat transfer coefficient times the area per volume in W/m^3*K, defaults to 0
+    :type heat_transfer: float, optional
+    :param coolant_temperature: The temperature of the coolant, defaults to None for adiabatic
+    :type coolant_temperature: Temperature, optional
+    :param t_eval: The times in s to return the solution at, defaults to None for 101 evenly spaced times
+    :type t_eval: np.ndarray, optional
+    :param method: The integrator "rk45" or "stiff", see :func:`solve_ode`, defaults to "rk45"
+    :type method: str, optional
+    :param rtol: The relative tolerance, defaults to 1E-6
+    :type rtol: float, optional
+    :param atol: The absolute tolerance, defaults to 1E-9
+    :type atol: float, optional
+    :return: The times, the concentrations (points, species) or (reactors, points, species), the
+        temperatures and whether each integration reached the end
+    :rtype: BatchReactorSolution
+
+    :Example:
+
+    >>> from cheme_calculations.reactions import batch_reactor
+    >>> # A -> B -> C
+    >>> nu = [[-1, 1, 0], [0, -1, 1]]
+    >>> def rates(C, T):
+    ...     return np.column_stack([0.1*C[:, 0], 0.05*C[:, 1]])
+    >>> solution = batch_reactor(rates, nu, Concentration(np.array([1000, 0, 0]), "mol/m^3"), Time(1, "min"),
+    ...                          Temperature(300, "K"))
+    >>> C = solution.concentrations/Concentration(1, "mol/m^3")
+    >>> print(C[-1])
+    >>> [  2.47875728  94.6166248  902.90461792]
+    """
+    C0 = unit_value(concentrations, Concentration, "mol/m^3")
+    T0 = unit_value(temperature, Temperature, "K")
+    t1 = float(unit_value(t_end, Time, "s"))
+    single, m, (C0,), (T0,) = _prepare([C0], [T0])
+    n = C0.shape[1]
+    balances = _Balances(rate_law, stoichiometry, m, heat_of_reaction, heat_capacity, heat_transfer,
+                         coolant_temperature)
+
+    def f(t, y):
+        C = y[:, :n]
+        T = y[:, n] if balances.energy else T0
+        r, dC = balances.rates(C, T)
+        if not balances.energy:
+            return dC
+        dT = balances.heat(r, T)/np.sum(C*balances.cp, axis=-1)
+        return np.column_stack([dC, dT])
+
+    y0 = np.column_stack([C0, T0]) if balances.energy else C0
+    solution = solve_ode(f, (0, t1), y0, t_eval, method, rtol, atol)
+    y = solution.y
+    T = y[..., n] if balances.energy else np.broadcast_to(T0[:, None], y.shape[:-1])
+    if single:
+        y, T, success = y[0], T[0], bool(solution.success[0])
+    else:
+        success = solution.success
+
+    return BatchReactorSolution(Time(solution.t, "s"), Concentration(y[..., :n], "mol/m^3"),
+                                Temperature(T, "K"), success)
+
+
+def pfr(rate_law: Callable, stoichiometry, flow_rates: MolarFlowRate, volumetric_flow: VolumetricFlowrate,
+        volume: Volume, temperature: Temperature, gas_phase: bool=False, heat_of_reaction=None,
+        heat_capacity=None, heat_transfer: float=0, coolant_temperature: Temperature=None,
+        volume_eval=None, method: str="rk45", rtol: float=1E-6, atol: float=1E-9)-> PFRSolution:
+    """Integrates the mole balances of a plug flow reactor along its volume with any rate
+    law, and the energy balance if the heats of reaction are given (isothermal otherwise).
+    For a gas the volumetric flow changes with the total moles and the temperature at
+    constant pressure, for a liquid it is constant.
+
+    .. math:: \\frac{dF_j}{dV} = \\sum_i \\nu_{ij}r_i \\qquad \\frac{dT}{dV} = \\frac{\\sum_i (-\\Delta H_i)r_i + Ua(T_a - T)}{\\sum_j F_jCp_j}
+
+    Many reactors can be integrated at once like :func:`batch_reactor`, the rate law is
+    called in SI the same way.
+
+    :param rate_law: The rates of the reactions, rate_law(C, T)
+    :type rate_law: Callable
+    :param stoichiometry: The stoichiometric coefficients (reactions, species), negative for reactants
+    :type stoichiometry: ReactionNetwork | np.ndarray
+    :param flow_rates: The inlet molar flow rate of each species
+    :type flow_rates: MolarFlowRate | np.ndarray
+    :param volumetric_flow: The inlet volumetric flow rate
+    :type volumetric_flow: VolumetricFlowrate | float
+    :param volume: The reactor volume
+    :type volume: Volume | float
+    :param temperature: The inlet (or constant) temperature
+    :type temperature: Temperature | float | np.ndarray
+    :param gas_phase: Whether the volumetric flow follows the ideal gas law, defaults to False
+    :type gas_phase: bool, optional
+    :param heat_of_reaction: The heat of each reaction in J/mol, defaults to None for isothermal
+    :type heat_of_reaction: np.ndarray, optional
+    :param heat_capacity: The heat capacity of each species in J/mol*K, needed with heat_of_reaction
+    :type heat_capacity: np.ndarray, optional
+    :param heat_transfer: Ua, the heat transfer coefficient times the area per volume in W/m^3*K, defaults to 0
+    :type heat_transfer: float, optional
+    :param coolant_temperature: The temperature of the coolant, defaults to None for adiabatic
+    :type coolant_temperature: Temperature, optional
+    :param volume_eval: The volumes in m^3 to return the solution at, defaults to None for 101 evenly spaced volumes
+    :type volume_eval: np.ndarray, optional
+    :param method: The integrator "rk45" or "stiff", see :func:`solve_ode`, defaults to "rk45"
+    :type method: str, optional
+    :param rtol: The relative tolerance, defaults to 1E-6
+    :type rtol: float, optional
+    :param atol: The absolute tolerance, defaults to 1E-9
+    :type atol: float, optional
+    :return: The volumes, the flow rates and concentrations (points, species) or (reactors, points, species),
+        the temperatures and whether each integration reached the end
+    :rtype: PFRSolution
+
+    :Example:
+
+    >>> from cheme_calculations.reactions import pfr
+    >>> # A -> B, first order
+    >>> def rates(C, T):
+    ...     return 0.1*C[:, :1]
+    >>> solution = pfr(rates, [[-1, 1]], MolarFlowRate(np.array([1, 0]), "mol/s"), VolumetricFlowrate(0.01, "m^3/s"),
+    ...                Volume(0.2, "m^3"), Temperature(300, "K"))
+    >>> F = solution.flow_rates/MolarFlowRate(1, "mol/s")
+    >>> print(F[-1])
+    >>> [0.13533534 0.86466466]
+    """
+    F0 = unit_value(flow_rates, MolarFlowRate, "mol/s")
+    Q0 = unit_value(volumetric_flow, VolumetricFlowrate, "m^3/s")
+    T0 = unit_value(temperature, Temperature, "K")
+    V1 = float(unit_value(volume, Volume, "m^3"))
+    single, m, (F0,), (Q0, T0) = _prepare([F0], [Q0, T0])
+    n = F0.shape[1]
+    FT0 = F0.sum(axis=-1)
+    balances = _Balances(rate_law, stoichiometry, m, heat_of_reaction, heat_capacity, heat_transfer,
+                         coolant_temperature)
+
+    def concentrations(F, T, Q0, FT0, T0):
+        Q = Q0*F.sum(axis=-1)/FT0*T/T0 if gas_phase else Q0
+        return F/Q[..., None]
+
+    def f(V, y):
+        F = y[:, :n]
+        T = y[:, n] if balances.energy else T0
+        r, dF = balances.rates(concentrations(F, T, Q0, FT0, T0), T)
+        if not balances.energy:
+            return dF
+        dT = balances.heat(r, T)/np.sum(F*balances.cp, axis=-1)
+        return np.column_stack([dF, dT])
+
+    y0 = np.column_stack([F0, T0]) if balances.energy else F0
+    solution = solve_ode(f, (0, V1), y0, volume_eval, method, rtol, atol)
+    y = solution.y
+    F = y[..., :n]
+    T = y[..., n] if balances.energy else np.broadcast_to(T0[:, None], y.shape[:-1])
+    C = concentrations(F, T, Q0[:, None], FT0[:, None], T0[:, None])
+    if single:
+        F, C, T, success = F[0], C[0], T[0], bool(solution.success[0])
+    else:
+        success = solution.success
+
+    return PFRSolution(Volume(solution.t, "m^3"), MolarFlowRate(F, "mol/s"), Concentration(C, "mol/m^3"),
+                       Temperature(T, "K"), success)
+
+
+def semibatch_reactor(rate_law: Callable, stoichiometry, moles, volume: Volume, feed_rate: VolumetricFlowrate,
+                      feed_concentrations: Concentration, t_end: Time, temperature: Temperature,
+                      feed_temperature: Temperature=None, heat_of_reaction=None, heat_capacity=None,
+                      heat_transfer: float=0, coolant_temperature: Temperature=None, t_eval=None,
+                      method: str="rk45", rtol: float=1E-6, atol: float=1E-9)-> SemiBatchReactorSolution:
+    """Integrates the mole balances of a semi-batch reactor, a well mixed tank that is fed
+    continuously without an outlet so its volume grows, with any rate law, and the energy
+    balance if the heats of reaction are given (isothermal otherwise).
+
+    .. math:: \\frac{dN_j}{dt} = v_0C_{j0} + V\\sum_i \\nu_{ij}r_i \\qquad \\frac{dV}{dt} = v_0
+
+    .. math:: \\frac{dT}{dt} = \\frac{v_0\\sum_j C_{j0}Cp_j(T_0 - T) + V\\sum_i (-\\Delta H_i)r_i + UaV(T_a - T)}{\\sum_j N_jCp_j}
+
+    Many reactors can be integrated at once like :func:`batch_reactor`, the rate law is
+    called in SI the same way.
+
+    :param rate_law: The rates of the reactions, rate_law(C, T)
+    :type rate_law: Callable
+    :param stoichiometry: The stoichiometric coefficients (reactions, species), negative for reactants
+    :type stoichiometry: ReactionNetwork | np.ndarray
+    :param moles: The initial moles of each species in the tank
+    :type moles: Amount | np.ndarray
+    :param volume: The initial volume in the tank
+    :type volume: Volume | float
+    :param feed_rate: The volumetric flow of the feed
+    :type feed_rate: VolumetricFlowrate | float
+    :param feed_concentrations: The concentration of each species in the feed
+    :type feed_concentrations: Concentration | np.ndarray
+    :param t_end: The reaction time
+    :type t_end: Time | float
+    :param temperature: The initial (or constant) temperature
+    :type temperature: Temperature | float | np.ndarray
+    :param feed_temperature: The temperature of the feed, defaults to None for the initial temperature
+    :type feed_temperature: Temperature, optional
+    :param heat_of_reaction: The heat of each reaction in J/mol, defaults to None for isothermal
+    :type heat_of_reaction: np.ndarray, optional
+    :param heat_capacity: The heat capacity of each species in J/mol*K, needed with heat_of_reaction
+    :type heat_capacity: np.ndarray, optional
+    :param heat_transfer: Ua, the heat transfer coefficient times the area per volume in W/m^3*K, defaults to 0
+    :type heat_transfer: float, optional
+    :param coolant_temperature: The temperature of the coolant, defaults to None for adiabatic
+    :type coolant_temperature: Temperature, optional
+    :param t_eval: The times in s to return the solution at, defaults to None for 101 evenly spaced times
+    :type t_eval: np.ndarray, optional
+    :param method: The integrator "rk45" or "stiff", see :func:`solve_ode`, defaults to "rk45"
+    :type method: str, optional
+    :param rtol: The relative tolerance, defaults to 1E-6
+    :type rtol: float, optional
+    :param atol: The absolute tolerance, defaults to 1E-9
+    :type atol: float, optional
+    :return: The times, the moles and concentrations (points, species) or (reactors, points, species),
+        the volumes, the temperatures and whether each integration reached the end
+    :rtype: SemiBatchReactorSolution
+    """
+    N0 = unit_value(moles, Amount, "mol")
+    V0 = unit_value(volume, Volume, "m^3")
+    v0 = unit_value(feed_rate, VolumetricFlowrate, "m^3/s")
+    C_feed = unit_value(feed_concentrations, Concentration, "mol/m^3")
+    T0 = unit_value(temperature, Temperature, "K")
+    T_feed = T0 if feed_temperature is None else unit_value(feed_temperature, Temperature, "K")
+    t1 = float(unit_value(t_end, Time, "s"))
+    single, m, (N0, C_feed), (V0, v0, T0, T_feed) = _prepare([N0, C_feed], [V0, v0, T0, T_feed])
+    n = N0.shape[1]
+    balances = _Balances(rate_law, stoichiometry, m, heat_of_reaction, heat_capacity, heat_transfer,
+                         coolant_temperature)
+
+    def f(t, y):
+        N, V = y[:, :n], y[:, n]
+        T = y[:, n + 1] if balances.energy else T0
+        r, dC = balances.rates(N/V[:, None], T)
+        dN = v0[:, None]*C_feed + V[:, None]*dC
+        if not balances.energy:
+            return np.column_stack([dN, v0])
+        sensible = v0*np.sum(C_feed*balances.cp, axis=-1)*(T_feed - T)
+        dT = (sensible + V*balances.heat(r, T))/np.sum(N*balances.cp, axis=-1)
+        return np.column_stack([dN, v0, dT])
+
+    y0 = np.column_stack([N0, V0, T0]) if balances.energy else np.column_stack([N0, V0])
+    solution = solve_ode(f, (0, t1), y0, t_eval, method, rtol, atol)
+    y = solution.y
+    N, V = y[..., :n], y[..., n]
+    T = y[..., n + 1] if balances.energy else np.broadcast_to(T0[:, None], y.shape[:-1])
+    C = N/V[..., None]
+    if single:
+        N, C, V, T, success = N[0], C[0], V[0], T[0], bool(solution.success[0])
+    else:
+        success = solution.success
+
+    return SemiBatchReactorSolution(Time(solution.t, "s"), Amount(N, "mol"), Concentration(C, "mol/m^3"),
+                                    Volume(V, "m^3"), Temperature(T, "K"), success)
@@ -1,3 +1,7 @@
 from .cubic_equations import *
+from .saturation import *
+from .flash import *
+from .lee_kesler import *
+from .phase_boundaries import *
 
 __all__ = [s for s in dir()]
\ No newline at end of file
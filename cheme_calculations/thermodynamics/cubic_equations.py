@@ -1,11 +1,464 @@
 
+from collections import namedtuple
 from typing import Literal
+import numpy as np
 from cheme_calculations.units import Temperature, Pressure
+from cheme_calculations.utility import unit_value
 
 
     
 __all__ = ["rendlich_kwong", "van_der_waals", "soave_rendlich_kwong", 
-           "peng_robinson"]  
+           "peng_robinson", "cubic_z", "cubic_z_iterative", "cubic_properties", "CUBIC_EOS", 
+           "ZResult", "EOSProperties", "CubicEquation", "VanDerWaals", "RendlichKwong", 
+           "SoaveRendlichKwong", "PengRobinson"]  
+
+
+# generic cubic in the form of Smith, Van Ness and Abbott 
+# Z = 1 + beta - q*beta*(Z - beta)/((Z + epsilon*beta)(Z + sigma*beta))
+# d_ln_alpha is dln(alpha)/dln(Tr), used by the departure functions
+CubicEOS = namedtuple(
+    'CubicEOS', ["sigma", "epsilon", "omega", "psi", "alpha", "d_ln_alpha"]
+)
+
+ZResult = namedtuple(
+    'ZResult', ["z", "iterations", "residual", "converged"]
+)
+
+EOSProperties = namedtuple(
+    'EOSProperties', ["z", "ln_phi", "h_residual", "s_residual"]
+)
+
+
+def _soave_kappa(w):
+    return .480 + 1.574*w - 0.176*w**2
+
+
+def _pr_kappa(w):
+    return .37464 + 1.54226*w - 0.26992*w**2
+
+
+CUBIC_EOS = {
+    "vdw": CubicEOS(0, 0, 1/8, 27/64, 
+                    lambda Tr, w: np.ones_like(Tr),
+                    lambda Tr, w: np.zeros_like(Tr)),
+    "rk": CubicEOS(1, 0, .08664, .42748, 
+                   lambda Tr, w: Tr**(-1/2),
+                   lambda Tr, w: np.full_like(Tr, -1/2)),
+    "srk": CubicEOS(1, 0, .08664, .42748, 
+                    lambda Tr, w: (1 + _soave_kappa(w)*(1 - Tr**(1/2)))**2,
+                    lambda Tr, w: -_soave_kappa(w)*Tr**(1/2)/(1 + _soave_kappa(w)*(1 - Tr**(1/2)))),
+    "pr": CubicEOS(1 + 2**(1/2), 1 - 2**(1/2), .07780, .45724,
+                   lambda Tr, w: (1 + _pr_kappa(w)*(1 - Tr**(1/2)))**2,
+                   lambda Tr, w: -_pr_kappa(w)*Tr**(1/2)/(1 + _pr_kappa(w)*(1 - Tr**(1/2)))),
+}
+
+
+def _vapor_mask(phase, shape: tuple)-> np.ndarray:
+    if isinstance(phase, str):
+        if phase not in ("vapor", "liquid"):
+            raise ValueError(f"The state {phase} is not vapor or liquid")
+        return np.full(shape, phase == "vapor")
+    return np.broadcast_to(np.asarray(phase, dtype=bool), shape)
+
+
+def _cubic_coefficients(eos: CubicEOS, A: np.ndarray, B: np.ndarray)-> tuple:
+    # Z^3 + c2 Z^2 + c1 Z + c0 = 0 with A = q*beta and B = beta
+    u = eos.sigma + eos.epsilon
+    w = eos.sigma*eos.epsilon
+    c2 = -(1 + B - u*B)
+    c1 = A + w*B**2 - u*B - u*B**2
+    c0 = -(A*B + w*B**2 + w*B**3)
+    return c2, c1, c0
+
+
+def _cubic_roots(eos: CubicEOS, A: np.ndarray, B: np.ndarray, vapor: np.ndarray)-> np.ndarray:
+    c2, c1, c0 = _cubic_coefficients(eos, A, B)
+    
+    # depressed cubic t^3 + p t + q = 0 with Z = t - c2/3
+    p = c1 - c2**2/3
+    q = 2*c2**3/27 - c2*c1/3 + c0
+    discriminant = (q/2)**2 + (p/3)**3
+    
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # one real root (Cardano)
+        sqrt_d = np.sqrt(np.maximum(discriminant, 0))
+        single = np.cbrt(-q/2 + sqrt_d) + np.cbrt(-q/2 - sqrt_d) - c2/3
+        
+        # three real roots (trigonometric form), k = 0 is the largest
+        m = 2*np.sqrt(np.maximum(-p/3, 0))
+        phi = np.arccos(np.clip(3*q/(p*m), -1, 1))
+        roots = [m*np.cos(phi/3 - 2*np.pi*k/3) - c2/3 for k in range(3)]
+    
+    # the liquid root is the smallest one above B, roots below B are not physical
+    # (ie the extra negative roots of peng robinson above the critical temperature)
+    largest = roots[0]
+    smallest = np.minimum(np.where(roots[1] > B, roots[1], largest), 
+                          np.where(roots[2] > B, roots[2], largest))
+    
+    three_roots = (discriminant < 0) & (p < 0)
+    z = np.where(three_roots, np.where(vapor, largest, smallest), single)
+    
+    # one newton step on the polynomial to clean up round off from the closed form
+    f = ((z + c2)*z + c1)*z + c0
+    df = (3*z + 2*c2)*z + c1
+    with np.errstate(invalid="ignore", divide="ignore"):
+        step = np.where(df != 0, f/df, 0)
+    return z - step
+
+
+def _log_term(eos: CubicEOS, z: np.ndarray, B: np.ndarray)-> np.ndarray:
+    # I = ln((Z + sigma*B)/(Z + epsilon*B))/(sigma - epsilon), which tends to B/Z for van der waals
+    if eos.sigma == eos.epsilon:
+        return B/(z + eos.epsilon*B)
+    return np.log((z + eos.sigma*B)/(z + eos.epsilon*B))/(eos.sigma - eos.epsilon)
+
+
+def _reduced_AB(eos: CubicEOS, t_reduced, p_reduced, omega_lower)-> tuple:
+    Tr, Pr, omega = np.broadcast_arrays(np.asarray(t_reduced, dtype=float), 
+                                        np.asarray(p_reduced, dtype=float),
+                                        np.asarray(omega_lower, dtype=float))
+    alpha = eos.alpha(Tr, omega)
+    B = eos.omega*(Pr/Tr)
+    A = eos.psi*alpha*Pr/Tr**2
+    return A, B
+
+
+def cubic_z(eos: Literal["vdw", "rk", "srk", "pr"], t_reduced, p_reduced,
+            phase: Literal["vapor", "liquid"] | np.ndarray="vapor", omega_lower=0.0)-> float | np.ndarray:
+    """Solves a cubic equation of state for Z analytically for any number of states at
+    once. Where the cubic has three real roots the largest is the vapor root and the
+    smallest the liquid root, where it has one real root both phases return it.
+    
+    .. math:: Z = 1 + \\beta - q\\beta\\dfrac{Z - \\beta}{(Z + \\epsilon\\beta)(Z + \\sigma\\beta)}
+    
+    :param eos: The equation of state, van der waals, rendlich kwong, soave rendlich kwong or peng robinson
+    :type eos: Literal["vdw", "rk", "srk", "pr"]
+    :param t_reduced: Reduced temperature(s) T/Tc
+    :type t_reduced: float | np.ndarray
+    :param p_reduced: Reduced pressure(s) P/Pc
+    :type p_reduced: float | np.ndarray
+    :param phase: The root to return, either for every state or as a boolean mask that is True for vapor, defaults to "vapor"
+    :type phase: Literal["vapor", "liquid"] | np.ndarray, optional
+    :param omega_lower: The accentric factor(s), only used by srk and pr, defaults to 0.0
+    :type omega_lower: float | np.ndarray, optional
+    :return: The correction factor Z for every state
+    :rtype: float | np.ndarray
+    
+    :Example:
+    
+    >>> from cheme_calculations.thermodynamics import cubic_z
+    >>> Tr = np.linspace(0.7, 2, 100000)
+    >>> Pr = np.full(100000, 0.5)
+    >>> z = cubic_z("pr", Tr, Pr, Tr > 0.9, 0.152)
+    >>> print(z[[0, -1]])
+    >>> [0.07413142 0.98874455]
+    """
+    params = CUBIC_EOS[eos]
+    A, B = _reduced_AB(params, t_reduced, p_reduced, omega_lower)
+    
+    z = _cubic_roots(params, A, B, _vapor_mask(phase, A.shape))
+    
+    if z.ndim == 0:
+        return float(z)
+    return z
+
+
+def cubic_z_iterative(eos: Literal["vdw", "rk", "srk", "pr"], t_reduced, p_reduced,
+                      phase: Literal["vapor", "liquid"] | np.ndarray="vapor", omega_lower=0.0,
+                      method: Literal["newton", "halley"]="halley", tolerance: float=1E-10,
+                      max_iterations: int=50)-> ZResult:
+    """Solves a cubic equation of state for Z by Newton or Halley iteration on the cubic
+    residual, stopping each state as soon as its step is below the tolerance. States 
+    that have converged are dropped from later iterations so they stop costing work.
+    
+    Vapor states start from Z = 1 + B and liquid states from Z = B, which bracket the 
+    physical roots, and steps that would leave the bracket fall back to bisection. The 
+    result reports how many iterations each state took, its final residual and whether 
+    it converged within max_iterations. :func:`cubic_z` is faster when every root is wanted, this is useful 
+    when a convergence record is needed or a good starting guess is cheap.
+    
+    :param eos: The equation of state, van der waals, rendlich kwong, soave rendlich kwong or peng robinson
+    :type eos: Literal["vdw", "rk", "srk", "pr"]
+    :param t_reduced: Reduced temperature(s) T/Tc
+    :type t_reduced: float | np.ndarray
+    :param p_reduced: Reduced pressure(s) P/Pc
+    :type p_reduced: float | np.ndarray
+    :param phase: The root to find, either for every state or as a boolean mask that is True for vapor, defaults to "vapor"
+    :type phase: Literal["vapor", "liquid"] | np.ndarray, optional
+    :param omega_lower: The accentric factor(s), only used by srk and pr, defaults to 0.0
+    :type omega_lower: float | np.ndarray, optional
+    :param method: Newton (second order) or Halley (third order) steps, defaults to "halley"
+    :type method: Literal["newton", "halley"], optional
+    :param tolerance: Size of the step in Z below which a state has converged, defaults to 1E-10
+    :type tolerance: float, optional
+    :param max_iterations: The most iterations any state can take, defaults to 50
+    :type max_iterations: int, optional
+    :return: Z, iterations, residual and converged for every state
+    :rtype: ZResult
+    
+    :Example:
+    
+    >>> from cheme_calculations.thermodynamics import cubic_z_iterative
+    >>> result = cubic_z_iterative("srk", [1.5, 0.8], [0.5, 0.3], np.array([True, False]), 0.152)
+    >>> print(result.z)
+    >>> [0.96347369 0.04994107]
+    >>> print(result.iterations)
+    >>> [4 4]
+    """
+    if method not in ("newton", "halley"):
+        raise ValueError(f"The method {method} is not newton or halley")
+    
+    params = CUBIC_EOS[eos]
+    A, B = _reduced_AB(params, t_reduced, p_reduced, omega_lower)
+    shape = A.shape
+    A, B = A.ravel(), B.ravel()
+    c2, c1, c0 = _cubic_coefficients(params, A, B)
+    vapor = _vapor_mask(phase, shape).ravel()
+    
+    # f(B) < 0 < f(1 + B) for every one of these equations so the physical roots are 
+    # bracketed, steps that leave the bracket are replaced by bisection
+    lower = B.astype(float)
+    upper = 1 + B
+    z = np.where(vapor, upper, lower)
+    iterations = np.zeros(A.shape, dtype=int)
+    active = np.ones(A.shape, dtype=bool)
+    
+    for _ in range(max_iterations):
+        za, c2a, c1a, c0a = z[active], c2[active], c1[active], c0[active]
+        lo, hi = lower[active], upper[active]
+        
+        f = ((za + c2a)*za + c1a)*za + c0a
+        df = (3*za + 2*c2a)*za + c1a
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if method == "newton":
+                z_new = za - f/df
+            else:
+                d2f = 6*za + 2*c2a
+                z_new = za - 2*f*df/(2*df**2 - f*d2f)
+        
+        # shrink the bracket with the sign of the residual
+        lo = np.where(f < 0, za, lo)
+        hi = np.where(f > 0, za, hi)
+        outside = ~((z_new >= lo) & (z_new <= hi))
+        z_new = np.where(outside, (lo + hi)/2, z_new)
+        
+        step = z_new - za
+        z[active] = z_new
+        lower[active] = lo
+        upper[active] = hi
+        iterations[active] += 1
+        active[active] = (np.abs(step) > tolerance) & (f != 0)
+        if not active.any():
+            break
+    
+    residual = ((z + c2)*z + c1)*z + c0
+    
+    if not shape:
+        return ZResult(float(z[0]), int(iterations[0]), float(residual[0]), bool(~active[0]))
+    return ZResult(z.reshape(shape), iterations.reshape(shape), residual.reshape(shape), 
+                   ~active.reshape(shape))
+
+
+def cubic_properties(eos: Literal["vdw", "rk", "srk", "pr"], t_reduced, p_reduced,
+                     phase: Literal["vapor", "liquid"] | np.ndarray="vapor", 
+                     omega_lower=0.0)-> EOSProperties:
+    """Solves a cubic equation of state for Z and evaluates the fugacity coefficient and 
+    the residual enthalpy and entropy from the same reduced quantities, for any number 
+    of states at once. Saves recomputing beta, q and alpha in a second pass in energy 
+    balance loops.
+    
+    .. math:: \\ln \\phi = Z - 1 - \\ln(Z - \\beta) - qI
+    
+    .. math:: \\dfrac{H^R}{RT} = Z - 1 + \\left(\\dfrac{d \\ln \\alpha}{d \\ln T_r} - 1\\right)qI
+    
+    .. math:: \\dfrac{S^R}{R} = \\ln(Z - \\beta) + \\dfrac{d \\ln \\alpha}{d \\ln T_r}qI
+    
+    .. math:: I = \\dfrac{1}{\\sigma - \\epsilon}\\ln\\dfrac{Z + \\sigma\\beta}{Z + \\epsilon\\beta}
+    
+    :param eos: The equation of state, van der waals, rendlich kwong, soave rendlich kwong or peng robinson
+    :type eos: Literal["vdw", "rk", "srk", "pr"]
+    :param t_reduced: Reduced temperature(s) T/Tc
+    :type t_reduced: float | np.ndarray
+    :param p_reduced: Reduced pressure(s) P/Pc
+    :type p_reduced: float | np.ndarray
+    :param phase: The root to use, either for every state or as a boolean mask that is True for vapor, defaults to "vapor"
+    :type phase: Literal["vapor", "liquid"] | np.ndarray, optional
+    :param omega_lower: The accentric factor(s), only used by srk and pr, defaults to 0.0
+    :type omega_lower: float | np.ndarray, optional
+    :return: Z, ln(phi), H^R/RT and S^R/R for every state
+    :rtype: EOSProperties
+    
+    :Example:
+    
+    >>> from cheme_calculations.thermodynamics import cubic_properties
+    >>> props = cubic_properties("pr", 300/369.83, 1E6/4.248E6, "vapor", 0.152)
+    >>> print(props.z)
+    >>> 0.8146260144999642
+    >>> print(props.h_residual)
+    >>> -0.517457422809463
+    
+    :Reference:
+    
+    Smith, J. M., Van Ness, H. C., & Abbott, M. M. (2005). Introduction to Chemical 
+    Engineering Thermodynamics, 7th ed. McGraw-Hill.
+    """
+    params = CUBIC_EOS[eos]
+    Tr, Pr, omega = np.broadcast_arrays(np.asarray(t_reduced, dtype=float), 
+                                        np.asarray(p_reduced, dtype=float),
+                                        np.asarray(omega_lower, dtype=float))
+    A, B = _reduced_AB(params, Tr, Pr, omega)
+    
+    return _eos_properties(params, A, B, params.d_ln_alpha(Tr, omega), _vapor_mask(phase, A.shape))
+
+
+def _eos_properties(eos: CubicEOS, A: np.ndarray, B: np.ndarray, d_ln_alpha: np.ndarray, 
+                    vapor: np.ndarray)-> EOSProperties:
+    z = _cubic_roots(eos, A, B, vapor)
+    qI = A/B*_log_term(eos, z, B)
+    ln_z_b = np.log(z - B)
+    
+    ln_phi = z - 1 - ln_z_b - qI
+    h_residual = z - 1 + (d_ln_alpha - 1)*qI
+    s_residual = ln_z_b + d_ln_alpha*qI
+    
+    if z.ndim == 0:
+        return EOSProperties(float(z), float(ln_phi), float(h_residual), float(s_residual))
+    return EOSProperties(z, ln_phi, h_residual, s_residual)
+
+
+class CubicEquation:
+    """Base class for a cubic equation of state bound to one fluid, or to an array of 
+    fluids. The per component constants (the critical point terms of A and B and the 
+    alpha function parameters) are worked out once when the object is made and stored 
+    as plain floats or arrays, so sweeping temperature and pressure only does the 
+    arithmetic that actually changes. Temperatures and pressures broadcast against the 
+    component arrays.
+    
+    Use one of :class:`VanDerWaals`, :class:`RendlichKwong`, 
+    :class:`SoaveRendlichKwong` or :class:`PengRobinson`.
+    
+    :param Tc: Critical temperature, a Temperature or a value (or array) in Kelvin
+    :type Tc: Temperature | float | np.ndarray
+    :param Pc: Critical pressure, a Pressure or a value (or array) in Pa
+    :type Pc: Pressure | float | np.ndarray
+    :param omega_lower: The accentric factor(s), only used by srk and pr, defaults to 0.0
+    :type omega_lower: float | np.ndarray, optional
+    """
+    eos = None
+    
+    def __init__(self, Tc: Temperature | float | np.ndarray, Pc: Pressure | float | np.ndarray, 
+                 omega_lower: float | np.ndarray=0.0):
+        self.params = CUBIC_EOS[self.eos]
+        self.Tc = unit_value(Tc, Temperature, "K")
+        self.Pc = unit_value(Pc, Pressure, "Pa")
+        self.omega_lower = np.asarray(omega_lower, dtype=float)
+        
+        # A = a_factor*alpha*P/T^2 and B = b_factor*P/T
+        self._a_factor = self.params.psi*self.Tc**2/self.Pc
+        self._b_factor = self.params.omega*self.Tc/self.Pc
+        self._inverse_sqrt_Tc = 1/np.sqrt(self.Tc)
+        
+    def _alpha(self, T: np.ndarray)-> tuple:
+        # alpha and dln(alpha)/dln(Tr)
+        Tr = T/self.Tc
+        return self.params.alpha(Tr, self.omega_lower), self.params.d_ln_alpha(Tr, self.omega_lower)
+        
+    def _AB(self, T: np.ndarray, P: np.ndarray)-> tuple:
+        alpha, d_ln_alpha = self._alpha(T)
+        A = self._a_factor*alpha*P/T**2
+        B = self._b_factor*P/T
+        A, B, d_ln_alpha = np.broadcast_arrays(A, B, d_ln_alpha)
+        return A, B, d_ln_alpha
+    
+    def z(self, temperature, pressure, 
+          phase: Literal["vapor", "liquid"] | np.ndarray="vapor")-> float | np.ndarray:
+        """Correction factor Z, see :func:`cubic_z`
+
+        :param temperature: Temperature(s) in Kelvin
+        :type temperature: float | np.ndarray
+        :param pressure: Pressure(s) in Pa
+        :type pressure: float | np.ndarray
+        :param phase: The root to return, either for every state or as a boolean mask that is True for vapor, defaults to "vapor"
+        :type phase: Literal["vapor", "liquid"] | np.ndarray, optional
+        :return: The correction factor Z for every state
+        :rtype: float | np.ndarray
+        """
+        A, B, _ = self._AB(np.asarray(temperature, dtype=float), np.asarray(pressure, dtype=float))
+        z = _cubic_roots(self.params, A, B, _vapor_mask(phase, A.shape))
+        
+        if z.ndim == 0:
+            return float(z)
+        return z
+    
+    def properties(self, temperature, pressure, 
+                   phase: Literal["vapor", "liquid"] | np.ndarray="vapor")-> EOSProperties:
+        """Z, ln(phi), H^R/RT and S^R/R in one pass, see :func:`cubic_properties`
+
+        :param temperature: Temperature(s) in Kelvin
+        :type temperature: float | np.ndarray
+        :param pressure: Pressure(s) in Pa
+        :type pressure: float | np.ndarray
+        :param phase: The root to use, either for every state or as a boolean mask that is True for vapor, defaults to "vapor"
+        :type phase: Literal["vapor", "liquid"] | np.ndarray, optional
+        :return: Z, ln(phi), H^R/RT and S^R/R for every state
+        :rtype: EOSProperties
+        """
+        A, B, d_ln_alpha = self._AB(np.asarray(temperature, dtype=float), np.asarray(pressure, dtype=float))
+        return _eos_properties(self.params, A, B, d_ln_alpha, _vapor_mask(phase, A.shape))
+
+
+class VanDerWaals(CubicEquation):
+    """The van der waals equation of state bound to a fluid, see :class:`CubicEquation`
+    """
+    eos = "vdw"
+    
+    def _alpha(self, T: np.ndarray)-> tuple:
+        return 1.0, 0.0
+
+
+class RendlichKwong(CubicEquation):
+    """The rendlich kwong equation of state bound to a fluid, see :class:`CubicEquation`
+    """
+    eos = "rk"
+    
+    def _alpha(self, T: np.ndarray)-> tuple:
+        return 1/(np.sqrt(T)*self._inverse_sqrt_Tc), -0.5
+
+
+class SoaveRendlichKwong(CubicEquation):
+    """The soave rendlich kwong equation of state bound to a fluid, see :class:`CubicEquation`
+    """
+    eos = "srk"
+    
+    def __init__(self, Tc: Temperature | float | np.ndarray, Pc: Pressure | float | np.ndarray, 
+                 omega_lower: float | np.ndarray=0.0):
+        super().__init__(Tc, Pc, omega_lower)
+        self._kappa = _soave_kappa(self.omega_lower)
+    
+    def _alpha(self, T: np.ndarray)-> tuple:
+        sqrt_Tr = np.sqrt(T)*self._inverse_sqrt_Tc
+        root_alpha = 1 + self._kappa*(1 - sqrt_Tr)
+        return root_alpha**2, -self._kappa*sqrt_Tr/root_alpha
+
+
+class PengRobinson(SoaveRendlichKwong):
+    """The peng robinson equation of state bound to a fluid, see :class:`CubicEquation`
+    
+    :Example:
+    
+    >>> from cheme_calculations.thermodynamics import PengRobinson
+    >>> propane = PengRobinson(Temperature(369.83, "K"), Pressure(42.48, "bar"), 0.152)
+    >>> T = np.linspace(250, 400, 10000)
+    >>> z = propane.z(T, 1E6, T > 300)
+    >>> print(z[[0, -1]])
+    >>> [0.03550995 0.92740954]
+    """
+    eos = "pr"
+    
+    def __init__(self, Tc: Temperature | float | np.ndarray, Pc: Pressure | float | np.ndarray, 
+                 omega_lower: float | np.ndarray=0.0):
+        CubicEquation.__init__(self, Tc, Pc, omega_lower)
+        self._kappa = _pr_kappa(self.omega_lower)
 
 
 def rendlich_kwong(temperature: Temperature, pressure: Pressure,
@@ -23,7 +476,7 @@ def rendlich_kwong(temperature: Temperature, pressure: Pressure,
         :type Pcrit: class: Pressure
         :param state: state of the material
         :type state: Literal["vapor", "liquid"]
-        :param iterations: Number of iterations used to find the solution
+        :param iterations: Not used, Z is solved analytically with :func:`cubic_z`. Kept so existing calls still work
         :type iterations: int
         :return: The correction factor Z
         :rtype: float
@@ -35,35 +488,14 @@ def rendlich_kwong(temperature: Temperature, pressure: Pressure,
         >>> P = Pressure(350, "kPa")
         >>> Pcrit = Pressure(350, "kPa")
         >>> z = rendlich_kwong(T, P, Tcrit, Pcrit,"vapor", 6)
-        >>> 0.47750
+        >>> 0.32723
         
         """
         
         p_reduced = pressure/Pcrit
         t_reduced = temperature/Tcrit
 
-        omega = .08664
-        psi = .42748        
-        alpha = t_reduced**(-1/2)
-        beta = omega*(p_reduced/t_reduced)
-        q = (psi*alpha)/(omega*t_reduced)
-        
-        if state == 'vapor':
-            z_in = 1
-            z_iter = 1 + beta - q*beta*((z_in-beta)/(z_in*(z_in+beta)))
-            for i in range(iterations):
-                z_in = z_iter 
-                z_iter = 1 + beta - q*beta*((z_in-beta)/(z_in*(z_in+beta)))
-                
-                
-        if state == 'liquid':
-            z_in = beta 
-            z_iter = beta + z_in*(z_in + beta)*((1+beta-z_in)/(q*beta))
-            for i in range(iterations):
-                z_in = z_iter
-                z_iter = z_iter = beta + z_in*(z_in + beta)*((1+beta-z_in)/(q*beta))
-        
-        return z_iter
+        return cubic_z("rk", t_reduced, p_reduced, state)
         
         
 
@@ -86,7 +518,7 @@ def van_der_waals(temperature: Temperature, pressure: Pressure,
     :type Pcrit: class: Pressure
     :param state: state of the material
     :type state: Literal["vapor", "liquid"]
-    :param iterations: Number of iterations used to find the solution
+    :param iterations: Not used, Z is solved analytically with :func:`cubic_z`. Kept so existing calls still work
     :type iterations: int
     :return: The correction factor Z
     :rtype: float
@@ -98,34 +530,14 @@ def van_der_waals(temperature: Temperature, pressure: Pressure,
     >>> P = Pressure(350, "kPa")
     >>> Pcrit = Pressure(350, "kPa")
     >>> z = van_der_waals(T, P, Tcrit, Pcrit,"vapor", 6)
-    >>> 0.70816
+    >>> 0.375
     
     """
     
     p_reduced = pressure/Pcrit
     t_reduced = temperature/Tcrit
     
-    omega = 1/8
-    psi = 27/64      
-    alpha = 1
-    beta = omega*(p_reduced/t_reduced)
-    q = (psi*alpha)/(omega*t_reduced)
-    
-    if state == 'vapor':
-        z_in = 1
-        z_iter = 1 + beta - q*beta*((z_in-beta)/(z_in*(z_in+beta)))
-        for i in range(iterations):
-            z_in = z_iter 
-            z_iter = 1 + beta - q*beta*((z_in-beta)/(z_in*(z_in+beta)))
-            
-    if state == 'liquid':
-        z_in = beta 
-        z_iter = beta + z_in*(z_in + beta)*((1+beta-z_in)/(q*beta))
-        for i in range(iterations):
-            z_in = z_iter
-            z_iter = z_iter = beta + z_in*(z_in + beta)*((1+beta-z_in)/(q*beta))
-            
-    return z_iter
+    return cubic_z("vdw", t_reduced, p_reduced, state)
 
 
 def soave_rendlich_kwong(temperature: Temperature, pressure: Pressure,
@@ -149,7 +561,7 @@ def soave_rendlich_kwong(temperature: Temperature, pressure: Pressure,
     :type state: Literal["vapor", "liquid"]
     :param omega_lower: The accentric factor for the material
     :type omega_lower: float
-    :param iterations: Number of iterations used to find the solution
+    :param iterations: Not used, Z is solved analytically with :func:`cubic_z`. Kept so existing calls still work
     :type iterations: int
     :return: The correction factor Z
     :rtype: float
@@ -161,32 +573,12 @@ def soave_rendlich_kwong(temperature: Temperature, pressure: Pressure,
     >>> P = Pressure(350, "kPa")
     >>> Pcrit = Pressure(350, "kPa")
     >>> z = soave_rendlich_kwong(T, P, Tcrit, Pcrit,"vapor",0.224,  6)
-    >>> 0.4775
+    >>> 0.32723
     """
     p_reduced = pressure/Pcrit
     t_reduced = temperature/Tcrit
     
-    omega = .08664
-    psi = .42748
-    alpha = (1 + (.480 + 1.574*omega_lower-0.176*omega_lower**2)*(1-t_reduced**(1/2)))**2
-    beta = omega*(p_reduced/t_reduced)
-    q = (psi*alpha)/(omega*t_reduced)
-    
-    if state == 'vapor':
-        z_in = 1
-        z_iter = 1 + beta - q*beta*((z_in-beta)/(z_in*(z_in+beta)))
-        for i in range(iterations):
-            z_in = z_iter 
-            z_iter = 1 + beta - q*beta*((z_in-beta)/(z_in*(z_in+beta)))
-            
-    if state == 'liquid':
-        z_in = beta 
-        z_iter = beta + z_in*(z_in + beta)*((1+beta-z_in)/(q*beta))
-        for i in range(iterations):
-            z_in = z_iter
-            z_iter = z_iter = beta + z_in*(z_in + beta)*((1+beta-z_in)/(q*beta))
-            
-    return z_iter
+    return cubic_z("srk", t_reduced, p_reduced, state, omega_lower)
             
             
     
@@ -207,7 +599,7 @@ def peng_robinson(temperature: Temperature, pressure: Pressure,
     :type state: Literal["vapor", "Liquid"]
     :param omega_lower: The accentric factor of the given material
     :type omega_lower: float
-    :param iterations: The number of iterations used for the calculation
+    :param iterations: Not used, Z is solved analytically with :func:`cubic_z`. Kept so existing calls still work
     :type iterations: int
     :return: The Z correction factor
     :rtype: float
@@ -219,34 +611,12 @@ def peng_robinson(temperature: Temperature, pressure: Pressure,
     >>> P = Pressure(350, "kPa")
     >>> Pcrit = Pressure(350, "kPa")
     >>> z = peng_robinson(T, P, Tcrit, Pcrit,"vapor",0.224, 6)
-    >>> 0.2351
+    >>> 0.32138
     """
     p_reduced = pressure/Pcrit
     t_reduced = temperature/Tcrit
     
-    sigma = 1 + 2**(1/2)
-    epsilon = 1 - 2**(1/2)
-    omega = .07780
-    psi = .45724
-    alpha = (1 + (.37464 + 1.54226*omega_lower-0.26992*omega_lower**2)*(1-t_reduced**(1/2)))**2
-    beta = omega*(p_reduced/t_reduced)
-    q = (psi*alpha)/(omega*t_reduced)
-    
-    if state == 'vapor':
-        z_in = 1
-        z_iter = beta + (z_in+epsilon*beta)*(z_in + sigma*beta)*((1+beta-z_in)/(q*beta))
-        for i in range(iterations):
-            z_in = z_iter 
-            z_iter = 1 + beta - q*beta*((z_in-beta)/(z_in*(z_in+beta)))
-            
-    if state == 'liquid':
-        z_in = beta 
-        z_iter = beta + (z_in+epsilon*beta)*(z_in + sigma*beta)*((1+beta-z_in)/(q*beta))
-        for i in range(iterations):
-            z_in = z_iter
-            z_iter = z_iter = beta + z_in*(z_in + beta)*((1+beta-z_in)/(q*beta))
-            
-    return z_iter
+    return cubic_z("pr", t_reduced, p_reduced, state, omega_lower)
 
 
     
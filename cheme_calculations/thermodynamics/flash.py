@@ -0,0 +1,425 @@
+from collections import namedtuple
+from typing import List, Literal
+import numpy as np
+from cheme_calculations.utility.components import get_components
+from .cubic_equations import CUBIC_EOS, _cubic_roots, _log_term, _reduced_AB
+
+__all__ = ["rachford_rice", "CubicMixture", "FlashResult", "StabilityResult"]
+
+
+# Every calculation here is done for many states at once. Compositions are arrays of
+# shape (states x components), temperatures and pressures have one value per state,
+# a single state can be passed as a 1D composition with scalar T and P.
+
+FlashResult = namedtuple(
+    'FlashResult', ["vapor_fraction", "x", "y", "K", "z_liquid", "z_vapor", "iterations", "converged"]
+)
+
+StabilityResult = namedtuple(
+    'StabilityResult', ["stable", "K"]
+)
+
+
+def rachford_rice(z, K, tolerance: float=1E-12, max_iterations: int=100)-> float | np.ndarray:
+    """Solves the Rachford-Rice equation for the vapor fraction of every state at once
+    using Newton steps safeguarded by bisection. Feeds that are below their bubble point
+    return 0 and feeds above their dew point return 1.
+
+    .. math:: \\sum_i \\dfrac{z_i (K_i - 1)}{1 + \\beta (K_i - 1)} = 0
+
+    :param z: Feed mole fractions, (states x components)
+    :type z: np.ndarray
+    :param K: Equilibrium ratios y/x, (states x components)
+    :type K: np.ndarray
+    :param tolerance: Convergence tolerance on the vapor fraction, defaults to 1E-12
+    :type tolerance: float, optional
+    :param max_iterations: Maximum Newton steps, defaults to 100
+    :type max_iterations: int, optional
+    :return: The vapor fraction of every state
+    :rtype: float | np.ndarray
+
+    :Example:
+
+    >>> from cheme_calculations.thermodynamics import rachford_rice
+    >>> print(rachford_rice([0.5, 0.3, 0.2], [3.0, 1.2, 0.2]))
+    >>> 0.7936689466121839
+    """
+    z, K = np.broadcast_arrays(np.asarray(z, dtype=float), np.asarray(K, dtype=float))
+    shape = z.shape[:-1]
+    z = z.reshape(-1, z.shape[-1])
+    K = K.reshape(-1, K.shape[-1])
+
+    def residual(beta, z, K):
+        d = z*(K - 1)/(1 + beta[:, None]*(K - 1))
+        return d.sum(axis=-1), -(d**2/z).sum(axis=-1)
+
+    # the residual falls monotonically with beta so the ends of [0, 1] decide single phase states
+    f0, _ = residual(np.zeros(len(z)), z, K)
+    f1, _ = residual(np.ones(len(z)), z, K)
+    beta = np.where(f0 <= 0, 0.0, 1.0)
+    active = (f0 > 0) & (f1 < 0)
+
+    lower = np.zeros(len(z))
+    upper = np.ones(len(z))
+    beta[active] = 0.5
+    for _ in range(max_iterations):
+        if not active.any():
+            break
+        b, lo, hi = beta[active], lower[active], upper[active]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            f, df = residual(b, z[active], K[active])
+            b_new = b - f/df
+
+        lo = np.where(f > 0, b, lo)
+        hi = np.where(f < 0, b, hi)
+        outside = ~((b_new > lo) & (b_new < hi))
+        b_new = np.where(outside, (lo + hi)/2, b_new)
+
+        beta[active] = b_new
+        lower[active] = lo
+        upper[active] = hi
+        active[active] = np.abs(b_new - b) > tolerance
+
+    beta = beta.reshape(shape)
+    if beta.ndim == 0:
+        return float(beta)
+    return beta
+
+
+class CubicMixture:
+    """A multicomponent mixture described by a cubic equation of state with the van der
+    Waals one fluid mixing rules and binary interaction parameters.
+
+    .. math:: a = \\sum_i \\sum_j x_i x_j \\sqrt{a_i a_j}(1 - k_{ij}) \\quad b = \\sum_i x_i b_i
+
+    Gives fugacity coefficients, the tangent plane stability test and the isothermal
+    (PT) flash for thousands of states in one call, so it can sit in the inner loop of
+    a separator model. States are iterated together and each one is dropped from the
+    iteration as soon as it has converged.
+
+    :param eos: The equation of state, rendlich kwong, soave rendlich kwong or peng robinson
+    :type eos: Literal["rk", "srk", "pr"]
+    :param Tc: Critical temperature of each component in Kelvin
+    :type Tc: np.ndarray
+    :param Pc: Critical pressure of each component in Pa
+    :type Pc: np.ndarray
+    :param omega: Acentric factor of each component
+    :type omega: np.ndarray
+    :param kij: Symmetric binary interaction parameters (components x components), defaults to all zeros
+    :type kij: np.ndarray, optional
+
+    :Example:
+
+    >>> from cheme_calculations.thermodynamics import CubicMixture
+    >>> mixture = CubicMixture.from_components("pr", ["methane", "propane", "n-pentane"])
+    >>> result = mixture.flash([0.5, 0.3, 0.2], 300, 3E6)
+    >>> print(result.vapor_fraction)
+    >>> 0.5591478216821317
+    >>> print(result.x)
+    >>> [0.14232658 0.43437385 0.42329956]
+
+    :Reference:
+
+    Michelsen, M. L., & Mollerup, J. M. (2007). Thermodynamic Models: Fundamentals and
+    Computational Aspects, 2nd ed. Tie-Line Publications.
+    """
+    def __init__(self, eos: Literal["rk", "srk", "pr"], Tc: np.ndarray, Pc: np.ndarray,
+                 omega: np.ndarray, kij: np.ndarray=None):
+        if eos not in ("rk", "srk", "pr"):
+            raise ValueError(f"The equation of state {eos} is not rk, srk or pr")
+
+        self.eos = eos
+        self.Tc = np.asarray(Tc, dtype=float)
+        self.Pc = np.asarray(Pc, dtype=float)
+        self.omega = np.asarray(omega, dtype=float)
+        if kij is None:
+            kij = np.zeros((len(self.Tc), len(self.Tc)))
+        self.kij = np.asarray(kij, dtype=float)
+        if self.kij.shape != (len(self.Tc), len(self.Tc)):
+            raise ValueError("kij must be a square matrix with one row per component")
+
+    @classmethod
+    def from_components(cls, eos: Literal["rk", "srk", "pr"], identifiers: List[str], kij: np.ndarray=None):
+        """Builds a mixture from components in the bundled component database
+
+        :param eos: The equation of state, rendlich kwong, soave rendlich kwong or peng robinson
+        :type eos: Literal["rk", "srk", "pr"]
+        :param identifiers: Names, formulas or CAS numbers of the components
+        :type identifiers: List[str]
+        :param kij: Binary interaction parameters, defaults to all zeros
+        :type kij: np.ndarray, optional
+        :return: The mixture
+        :rtype: CubicMixture
+        """
+        c = get_components(identifiers)
+        # bar to Pa
+        return cls(eos, c.Tc, c.Pc*1E5, c.omega, kij)
+
+    def _states(self, z, temperature, pressure)-> tuple:
+        z = np.asarray(z, dtype=float)
+        single = z.ndim == 1
+        z = np.atleast_2d(z)
+        T = np.broadcast_to(np.asarray(temperature, dtype=float), z.shape[:1])
+        P = np.broadcast_to(np.asarray(pressure, dtype=float), z.shape[:1])
+        return z/z.sum(axis=-1, keepdims=True), T, P, single
+
+    def _parameters(self, T: np.ndarray, P: np.ndarray)-> tuple:
+        # per component A_i, B_i for every state and the cross terms A_ij
+        Ai, Bi = _reduced_AB(CUBIC_EOS[self.eos], T[:, None]/self.Tc, P[:, None]/self.Pc, self.omega)
+        Aij = np.sqrt(Ai[:, :, None]*Ai[:, None, :])*(1 - self.kij)
+        return Aij, Bi
+
+    def _ln_phi(self, x: np.ndarray, Aij: np.ndarray, Bi: np.ndarray, vapor)-> tuple:
+        eos = CUBIC_EOS[self.eos]
+        sum_j = np.einsum("sij,sj->si", Aij, x)
+        A = (x*sum_j).sum(axis=-1)
+        B = (x*Bi).sum(axis=-1)
+
+        if vapor is None:
+            # the root with the lowest gibbs energy
+            ln_phi_v, z_v = self._ln_phi(x, Aij, Bi, True)
+            ln_phi_l, z_l = self._ln_phi(x, Aij, Bi, False)
+            use_vapor = (x*ln_phi_v).sum(axis=-1) <= (x*ln_phi_l).sum(axis=-1)
+            return np.where(use_vapor[:, None], ln_phi_v, ln_phi_l), np.where(use_vapor, z_v, z_l)
+
+        z = _cubic_roots(eos, A, B, np.broadcast_to(vapor, A.shape))
+        I = _log_term(eos, z, B)
+        ln_phi = (Bi/B[:, None]*(z - 1)[:, None] - np.log(z - B)[:, None]
+                  - (A/B*I)[:, None]*(2*sum_j/A[:, None] - Bi/B[:, None]))
+        return ln_phi, z
+
+    def ln_phi(self, x, temperature, pressure,
+               phase: Literal["vapor", "liquid"] | None="vapor")-> np.ndarray:
+        """Natural log of the fugacity coefficient of each component
+
+        .. math:: \\ln \\hat{\\phi}_i = \\dfrac{b_i}{b}(Z - 1) - \\ln(Z - \\beta) - qI\\left(\\dfrac{2\\sum_j x_j a_{ij}}{a} - \\dfrac{b_i}{b}\\right)
+
+        :param x: Mole fractions, (states x components)
+        :type x: np.ndarray
+        :param temperature: Temperature of each state in Kelvin
+        :type temperature: float | np.ndarray
+        :param pressure: Pressure of each state in Pa
+        :type pressure: float | np.ndarray
+        :param phase: The root to use, None picks the root with the lowest gibbs energy, defaults to "vapor"
+        :type phase: Literal["vapor", "liquid"] | None, optional
+        :return: ln(phi) of each component, (states x components)
+        :rtype: np.ndarray
+        """
+        x, T, P, single = self._states(x, temperature, pressure)
+        if phase not in ("vapor", "liquid", None):
+            raise ValueError(f"The state {phase} is not vapor or liquid")
+
+        Aij, Bi = self._parameters(T, P)
+        ln_phi, _ = self._ln_phi(x, Aij, Bi, None if phase is None else phase == "vapor")
+        return ln_phi[0] if single else ln_phi
+
+    def ln_K(self, x, y, temperature, pressure)-> np.ndarray:
+        """Natural log of the equilibrium ratios K = y/x = phi_liquid/phi_vapor for a
+        liquid of composition x in contact with a vapor of composition y
+
+        :param x: Liquid mole fractions, (states x components)
+        :type x: np.ndarray
+        :param y: Vapor mole fractions, (states x components)
+        :type y: np.ndarray
+        :param temperature: Temperature of each state in Kelvin
+        :type temperature: float | np.ndarray
+        :param pressure: Pressure of each state in Pa
+        :type pressure: float | np.ndarray
+        :return: ln(K) of each component, (states x components)
+        :rtype: np.ndarray
+        """
+        return (self.ln_phi(x, temperature, pressure, "liquid")
+                - self.ln_phi(y, temperature, pressure, "vapor"))
+
+    def _wilson_K(self, T: np.ndarray, P: np.ndarray)-> np.ndarray:
+        return self.Pc/P[:, None]*np.exp(5.373*(1 + self.omega)*(1 - self.Tc/T[:, None]))
+
+    def _stability(self, z: np.ndarray, Aij: np.ndarray, Bi: np.ndarray, K: np.ndarray,
+                   tolerance: float, max_iterations: int)-> tuple:
+        d = np.log(z) + self._ln_phi(z, Aij, Bi, None)[0]
+
+        trials = []
+        for W, vapor in ((z*K, True), (z/K, False)):
+            ln_W = np.log(W)
+            active = np.ones(len(z), dtype=bool)
+            for _ in range(max_iterations):
+                if not active.any():
+                    break
+                w = np.exp(ln_W[active])
+                ln_phi, _ = self._ln_phi(w/w.sum(axis=-1, keepdims=True), Aij[active], Bi[active], vapor)
+                ln_W_new = d[active] - ln_phi
+                step = np.abs(ln_W_new - ln_W[active]).max(axis=-1)
+                ln_W[active] = ln_W_new
+                # stop on convergence or when the trial is collapsing onto the feed
+                trivial = ((ln_W_new - np.log(z[active]))**2).sum(axis=-1) < 1E-4
+                active[active] = (step > tolerance) & ~trivial
+
+            W = np.exp(ln_W)
+            trivial = ((ln_W - np.log(z))**2).sum(axis=-1) < 1E-4
+            # a negative tangent plane distance (sum of W above one) means a second phase
+            unstable = (W.sum(axis=-1) > 1 + 1E-8) & ~trivial
+            trials.append((W/W.sum(axis=-1, keepdims=True), unstable))
+
+        (y, vapor_unstable), (x, liquid_unstable) = trials
+        K = np.where((vapor_unstable & liquid_unstable)[:, None], y/x,
+                     np.where(vapor_unstable[:, None], y/z, z/x))
+        return ~(vapor_unstable | liquid_unstable), K
+
+    def stability(self, z, temperature, pressure, tolerance: float=1E-8,
+                  max_iterations: int=100)-> StabilityResult:
+        """Michelsen's tangent plane stability test. A vapor like and a liquid like trial
+        phase are started from Wilson K values and converged by successive substitution,
+        the feed is unstable if either trial has a negative tangent plane distance.
+
+        :param z: Feed mole fractions, (states x components)
+        :type z: np.ndarray
+        :param temperature: Temperature of each state in Kelvin
+        :type temperature: float | np.ndarray
+        :param pressure: Pressure of each state in Pa
+        :type pressure: float | np.ndarray
+        :param tolerance: Convergence tolerance on ln(W), defaults to 1E-8
+        :type tolerance: float, optional
+        :param max_iterations: Maximum substitution steps for each trial, defaults to 100
+        :type max_iterations: int, optional
+        :return: Whether each feed is stable and K values estimated from the trial phases
+        :rtype: StabilityResult
+
+        :Reference:
+
+        Michelsen, M. L. (1982). The isothermal flash problem. Part I. Stability.
+        Fluid Phase Equilibria, 9(1), 1-19.
+        """
+        z, T, P, single = self._states(z, temperature, pressure)
+        Aij, Bi = self._parameters(T, P)
+        stable, K = self._stability(z, Aij, Bi, self._wilson_K(T, P), tolerance, max_iterations)
+        if single:
+            return StabilityResult(bool(stable[0]), K[0])
+        return StabilityResult(stable, K)
+
+    def _flash_residual(self, z: np.ndarray, ln_K: np.ndarray, Aij: np.ndarray, Bi: np.ndarray)-> tuple:
+        K = np.exp(ln_K)
+        beta = rachford_rice(z, K)
+        x = z/(1 + beta[:, None]*(K - 1))
+        y = K*x
+        x = x/x.sum(axis=-1, keepdims=True)
+        y = y/y.sum(axis=-1, keepdims=True)
+        ln_phi_l, z_l = self._ln_phi(x, Aij, Bi, False)
+        ln_phi_v, z_v = self._ln_phi(y, Aij, Bi, True)
+        return ln_phi_l - ln_phi_v, beta, x, y, z_l, z_v
+
+    def flash(self, z, temperature, pressure, method: Literal["gdem", "newton"]="gdem",
+              tolerance: float=1E-10, max_iterations: int=200)-> FlashResult:
+        """Isothermal flash at fixed temperature and pressure. Each feed is first checked
+        with the stability test, stable feeds are returned as a single phase and the rest
+        are converged by successive substitution on ln K, starting from the K values of
+        the stability test.
+
+        Substitution is accelerated either by the general dominant eigenvalue method
+        (GDEM, every fifth step) or by switching to Newton steps on ln K once the
+        substitution is close, with the Jacobian found by finite differences.
+
+        Single phase feeds have x = y = z and K = 1, the vapor fraction is 1 for vapor
+        and 0 for liquid, judged from Wilson's K values.
+
+        :param z: Feed mole fractions, (states x components)
+        :type z: np.ndarray
+        :param temperature: Temperature of each state in Kelvin
+        :type temperature: float | np.ndarray
+        :param pressure: Pressure of each state in Pa
+        :type pressure: float | np.ndarray
+        :param method: Acceleration of the successive substitution, defaults to "gdem"
+        :type method: Literal["gdem", "newton"], optional
+        :param tolerance: Convergence tolerance on ln K, defaults to 1E-10
+        :type tolerance: float, optional
+        :param max_iterations: Maximum iterations for each state, defaults to 200
+        :type max_iterations: int, optional
+        :return: Vapor fraction, x, y, K, liquid and vapor Z, iterations and converged for every state
+        :rtype: FlashResult
+
+        :Reference:
+
+        Michelsen, M. L. (1982). The isothermal flash problem. Part II. Phase-split
+        calculation. Fluid Phase Equilibria, 9(1), 21-40.
+        """
+        if method not in ("gdem", "newton"):
+            raise ValueError(f"The method {method} is not gdem or newton")
+
+        z, T, P, single = self._states(z, temperature, pressure)
+        n_states, n_components = z.shape
+        Aij, Bi = self._parameters(T, P)
+        K_wilson = self._wilson_K(T, P)
+        stable, K = self._stability(z, Aij, Bi, K_wilson, 1E-8, 100)
+
+        ln_K = np.log(K)
+        previous_step = np.zeros_like(ln_K)
+        iterations = np.zeros(n_states, dtype=int)
+        active = ~stable
+        for _ in range(max_iterations):
+            if not active.any():
+                break
+            za, A_a, B_a = z[active], Aij[active], Bi[active]
+            g, *_ = self._flash_residual(za, ln_K[active], A_a, B_a)
+            step = g - ln_K[active]
+
+            if method == "newton":
+                newton = np.abs(step).max(axis=-1) < 1E-2
+                if newton.any():
+                    step[newton] = self._newton_step(za[newton], ln_K[active][newton], step[newton],
+                                                     A_a[newton], B_a[newton])
+            else:
+                # every fifth step extrapolate along the dominant eigenvector
+                gdem = (iterations[active] % 5 == 4)
+                if gdem.any():
+                    with np.errstate(invalid="ignore", divide="ignore"):
+                        eig = ((step*step).sum(axis=-1)/(step*previous_step[active]).sum(axis=-1))
+                    gdem &= (eig > 0) & (eig < 1)
+                    step[gdem] *= (1/(1 - eig[gdem]))[:, None]
+
+            ln_K[active] += step
+            previous_step[active] = step
+            iterations[active] += 1
+            # two identical phases means the feed is single phase after all
+            trivial = np.abs(ln_K[active]).max(axis=-1) < 1E-4
+            active[active] = (np.abs(step).max(axis=-1) > tolerance) & ~trivial
+
+        converged = ~active
+        K = np.exp(ln_K)
+        _, beta, x, y, z_l, z_v = self._flash_residual(z, ln_K, Aij, Bi)
+
+        single_phase = stable | (beta <= 0) | (beta >= 1) | (np.abs(ln_K).max(axis=-1) < 1E-4)
+        vapor = np.where(stable, rachford_rice(z, K_wilson) >= 0.5, beta >= 0.5)
+        beta = np.where(single_phase, vapor.astype(float), beta)
+        x = np.where(single_phase[:, None], z, x)
+        y = np.where(single_phase[:, None], z, y)
+        K = np.where(single_phase[:, None], 1.0, K)
+        if single_phase.any():
+            _, z_single = self._ln_phi(z, Aij, Bi, None)
+            z_l = np.where(single_phase, z_single, z_l)
+            z_v = np.where(single_phase, z_single, z_v)
+
+        if single:
+            return FlashResult(float(beta[0]), x[0], y[0], K[0], float(z_l[0]), float(z_v[0]),
+                               int(iterations[0]), bool(converged[0]))
+        return FlashResult(beta, x, y, K, z_l, z_v, iterations, converged)
+
+    def _newton_step(self, z: np.ndarray, ln_K: np.ndarray, step: np.ndarray,
+                     Aij: np.ndarray, Bi: np.ndarray)-> np.ndarray:
+        # newton on F(ln K) = ln K - (ln phi_l - ln phi_v) with a forward difference jacobian
+        n_components = z.shape[1]
+        F = -step
+        jacobian = np.empty(z.shape + (n_components,))
+        h = 1E-7
+        for j in range(n_components):
+            shifted = ln_K.copy()
+            shifted[:, j] += h
+            g, *_ = self._flash_residual(z, shifted, Aij, Bi)
+            jacobian[:, :, j] = ((shifted - g) - F)/h
+
+        with np.errstate(invalid="ignore"):
+            try:
+                newton = -np.linalg.solve(jacobian, F[:, :, None])[:, :, 0]
+            except np.linalg.LinAlgError:
+                return step
+        # fall back to substitution where the jacobian is singular or the step is wild
+        bad = ~np.isfinite(newton).all(axis=-1) | (np.abs(newton).max(axis=-1) > 1)
+        return np.where(bad[:, None], step, newton)
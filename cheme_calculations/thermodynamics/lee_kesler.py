@@ -0,0 +1,220 @@
+import os
+from functools import lru_cache
+import numpy as np
+from cheme_calculations.utility.surrogate import SurrogateTable
+from .saturation import _lee_kesler_ln_pr
+
+__all__ = ["lee_kesler_z", "lee_kesler_z_exact"]
+
+
+# modified Benedict-Webb-Rubin constants of the simple (omega = 0) and reference
+# (n-octane, omega = 0.3978) fluids
+# b1, b2, b3, b4, c1, c2, c3, c4, d1, d2, beta, gamma
+LEE_KESLER_CONSTANTS = {
+    "simple": (0.1181193, 0.265728, 0.154790, 0.030323, 0.0236744, 0.0186984, 0.0,
+               0.042724, 0.155488E-4, 0.623689E-4, 0.65392, 0.060167),
+    "reference": (0.2026579, 0.331511, 0.027655, 0.203488, 0.0313385, 0.0503618, 0.016901,
+                  0.041577, 0.48736E-4, 0.0740336E-4, 1.226, 0.03754),
+}
+
+LEE_KESLER_OMEGA = {"simple": 0.0, "reference": 0.3978}
+
+# the tables are generated from the equation and shipped with the package, they are only
+# read, a table whose grid no longer matches the one below is built in memory instead,
+# regenerate them with _build_lee_kesler_tables() after changing the grid or the equation
+LEE_KESLER_TABLE_PATHS = {fluid: os.path.join(os.path.dirname(__file__), f"lee_kesler_{fluid}.npz")
+                          for fluid in LEE_KESLER_CONSTANTS}
+
+# the range of the published tables, with closer points around the critical point
+LEE_KESLER_TR_GRID = np.unique(np.concatenate([np.linspace(0.3, 0.9, 61), np.linspace(0.9, 1.2, 121),
+                                               np.linspace(1.2, 4, 113)]))
+LEE_KESLER_PR_GRID = np.unique(np.concatenate([np.geomspace(0.01, 0.5, 60), np.linspace(0.5, 2, 121),
+                                               np.linspace(2, 10, 65)]))
+
+# Z is too steep next to the critical point for the tables, states in this (Tr, Pr) window
+# are solved directly, outside of it interpolation errors stay below 1E-3
+LEE_KESLER_CRITICAL_WINDOW = ((0.98, 1.03), (0.85, 1.2))
+
+
+def _mbwr_residual(Vr: np.ndarray, Tr: np.ndarray, Pr: np.ndarray, constants: tuple)-> np.ndarray:
+    # Pr*Vr/Tr minus the right hand side of the equation, Vr is the ideal reduced volume Pc*V/(R*Tc)
+    b1, b2, b3, b4, c1, c2, c3, c4, d1, d2, beta, gamma = constants
+    B = b1 - b2/Tr - b3/Tr**2 - b4/Tr**3
+    C = c1 - c2/Tr + c3/Tr**3
+    D = d1 + d2/Tr
+    E = c4/(Tr**3*Vr**2)*(beta + gamma/Vr**2)*np.exp(-gamma/Vr**2)
+    return Pr*Vr/Tr - (1 + B/Vr + C/Vr**2 + D/Vr**5 + E)
+
+
+def _fluid_z(fluid: str, Tr: np.ndarray, Pr: np.ndarray, chunk_size: int=4096)-> np.ndarray:
+    # the scan holds (states, scan_points) arrays, so large batches are solved a chunk at a time
+    Tr, Pr = np.broadcast_arrays(np.asarray(Tr, dtype=float), np.asarray(Pr, dtype=float))
+    Tr_flat, Pr_flat = Tr.ravel(), Pr.ravel()
+    z = np.empty(Tr_flat.shape)
+    for start in range(0, len(z), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        z[chunk] = _fluid_z_chunk(fluid, Tr_flat[chunk], Pr_flat[chunk])
+    return z.reshape(Tr.shape)
+
+
+def _fluid_z_chunk(fluid: str, Tr: np.ndarray, Pr: np.ndarray, scan_points: int=300,
+                   bisections: int=60, expansions: int=20)-> np.ndarray:
+    constants = LEE_KESLER_CONSTANTS[fluid]
+
+    # the residual is negative at very small volumes and positive at large ones, widen
+    # the bracket until it is (compressed liquids have Vr below 0.03), then scan ln(Vr)
+    # for its sign changes, the first is the liquid root and the last the vapor root
+    ln_lower = np.full(Tr.shape, np.log(0.03))
+    with np.errstate(divide="ignore", over="ignore", invalid="ignore"):
+        ln_upper = np.log(4*Tr/Pr)
+        for _ in range(expansions):
+            low = ~(_mbwr_residual(np.exp(ln_lower), Tr, Pr, constants) < 0)
+            high = ~(_mbwr_residual(np.exp(ln_upper), Tr, Pr, constants) > 0)
+            if not (low | high).any():
+                break
+            ln_lower = np.where(low, ln_lower - 1, ln_lower)
+            ln_upper = np.where(high, ln_upper + 1, ln_upper)
+    t = np.linspace(0, 1, scan_points)
+    ln_Vr = ln_lower[..., None] + (ln_upper - ln_lower)[..., None]*t
+    with np.errstate(over="ignore", invalid="ignore"):
+        f = _mbwr_residual(np.exp(ln_Vr), Tr[..., None], Pr[..., None], constants)
+    crossing = (f[..., :-1] < 0) & (f[..., 1:] >= 0)
+    first = np.argmax(crossing, axis=-1)
+    last = scan_points - 2 - np.argmax(crossing[..., ::-1], axis=-1)
+
+    # the stable phase from the Lee-Kesler vapor pressure of the same fluid
+    with np.errstate(divide="ignore", over="ignore"):
+        vapor = (Tr >= 1) | (Pr <= np.exp(_lee_kesler_ln_pr(Tr, LEE_KESLER_OMEGA[fluid])))
+    index = np.where(vapor, last, first)[..., None]
+    lo = np.take_along_axis(ln_Vr, index, axis=-1)[..., 0]
+    hi = np.take_along_axis(ln_Vr, index + 1, axis=-1)[..., 0]
+
+    for _ in range(bisections):
+        mid = (lo + hi)/2
+        negative = _mbwr_residual(np.exp(mid), Tr, Pr, constants) < 0
+        lo = np.where(negative, mid, lo)
+        hi = np.where(negative, hi, mid)
+
+    # states without a root in the widened bracket have no solution
+    return np.where(crossing.any(axis=-1), Pr*np.exp((lo + hi)/2)/Tr, np.nan)
+
+
+def lee_kesler_z_exact(t_reduced, p_reduced, omega_lower=0.0)-> float | np.ndarray:
+    """Generalised correction factor from the Lee-Kesler equations, solved directly for
+    every state. Each state is solved for the simple and the reference fluid and the
+    two are combined linearly in the acentric factor. The phase of each fluid is taken
+    from its Lee-Kesler vapor pressure, liquid above it and vapor below it.
+
+    .. math:: Z = Z^{(0)} + \\dfrac{\\omega}{\\omega^{(r)}}(Z^{(r)} - Z^{(0)})
+
+    :param t_reduced: Reduced temperature(s) T/Tc
+    :type t_reduced: float | np.ndarray
+    :param p_reduced: Reduced pressure(s) P/Pc
+    :type p_reduced: float | np.ndarray
+    :param omega_lower: The accentric factor(s), defaults to 0.0
+    :type omega_lower: float | np.ndarray, optional
+    :return: The correction factor Z for every state, NaN where the equations have no root
+    :rtype: float | np.ndarray
+
+    :Reference:
+
+    Lee, B. I., & Kesler, M. G. (1975). A generalized thermodynamic correlation based
+    on three-parameter corresponding states. AIChE Journal, 21(3), 510-527.
+    """
+    Tr, Pr, omega = np.broadcast_arrays(np.asarray(t_reduced, dtype=float),
+                                        np.asarray(p_reduced, dtype=float),
+                                        np.asarray(omega_lower, dtype=float))
+    z0 = _fluid_z("simple", Tr, Pr)
+    zr = _fluid_z("reference", Tr, Pr)
+    z = z0 + omega/LEE_KESLER_OMEGA["reference"]*(zr - z0)
+
+    if z.ndim == 0:
+        return float(z)
+    return z
+
+
+def _build_lee_kesler_tables(paths: dict=LEE_KESLER_TABLE_PATHS):
+    for fluid, path in paths.items():
+        table = SurrogateTable(lambda Tr, Pr, fluid=fluid: _fluid_z(fluid, Tr, Pr), LEE_KESLER_TR_GRID,
+                               LEE_KESLER_PR_GRID, vectorized=True)
+        table.save(path)
+
+
+@lru_cache(maxsize=None)
+def _get_lee_kesler_table(fluid: str)-> SurrogateTable:
+    table = SurrogateTable(lambda Tr, Pr: _fluid_z(fluid, Tr, Pr), LEE_KESLER_TR_GRID,
+                           LEE_KESLER_PR_GRID, LEE_KESLER_TABLE_PATHS[fluid], vectorized=True,
+                           read_only=True)
+    table.build()
+    return table
+
+
+def _interpolated_fluid_z(fluid: str, Tr: np.ndarray, Pr: np.ndarray)-> np.ndarray:
+    table = _get_lee_kesler_table(fluid)
+    omega = LEE_KESLER_OMEGA[fluid]
+    x_grid, y_grid = table.x_grid, table.y_grid
+
+    # cells the saturation line passes through hold both liquid and vapor values, so
+    # states in them are solved directly instead of interpolated
+    i = np.clip(np.searchsorted(x_grid, Tr, side="right") - 1, 0, len(x_grid) - 2)
+    j = np.clip(np.searchsorted(y_grid, Pr, side="right") - 1, 0, len(y_grid) - 2)
+    with np.errstate(divide="ignore", over="ignore"):
+        pr_sat_low = np.exp(_lee_kesler_ln_pr(x_grid[i], omega))
+        pr_sat_high = np.exp(_lee_kesler_ln_pr(np.minimum(x_grid[i+1], 1), omega))
+    two_phase_cell = (x_grid[i] < 1) & (pr_sat_low <= y_grid[j+1]) & (pr_sat_high >= y_grid[j])
+    (tr_low, tr_high), (pr_low, pr_high) = LEE_KESLER_CRITICAL_WINDOW
+    near_critical = (Tr >= tr_low) & (Tr <= tr_high) & (Pr >= pr_low) & (Pr <= pr_high)
+    direct = two_phase_cell | near_critical
+
+    z = np.empty(Tr.shape)
+    z[~direct] = table(Tr[~direct], Pr[~direct])
+    if direct.any():
+        z[direct] = _fluid_z(fluid, Tr[direct], Pr[direct])
+    return z
+
+
+def lee_kesler_z(t_reduced, p_reduced, omega_lower=0.0)-> float | np.ndarray:
+    """Generalised correction factor from tables of the Lee-Kesler simple and reference
+    fluids, for quick screening of large arrays of states without solving an equation
+    of state for each one.
+
+    The tables cover 0.3 <= Tr <= 4 and 0.01 <= Pr <= 10, like the published tables, on
+    a finer grid. They are generated from the Lee-Kesler equations and shipped with this
+    module (they are built in memory on first use if missing), lookups are bilinear interpolation
+    and agree with the direct solution to within about 1E-3 in Z, the largest errors being
+    around the critical point.
+    States near the saturation line, where the tables jump between liquid and vapor, states
+    next to the critical point (0.98 <= Tr <= 1.03 and 0.85 <= Pr <= 1.2), where Z is too steep
+    to interpolate and the tables are off by up to 4E-2, and states outside of the tables are
+    solved directly with :func:`lee_kesler_z_exact`.
+
+    .. math:: Z = Z^{(0)} + \\omega Z^{(1)}
+
+    :param t_reduced: Reduced temperature(s) T/Tc
+    :type t_reduced: float | np.ndarray
+    :param p_reduced: Reduced pressure(s) P/Pc
+    :type p_reduced: float | np.ndarray
+    :param omega_lower: The accentric factor(s), defaults to 0.0
+    :type omega_lower: float | np.ndarray, optional
+    :return: The correction factor Z for every state
+    :rtype: float | np.ndarray
+
+    :Example:
+
+    >>> from cheme_calculations.thermodynamics import lee_kesler_z
+    >>> Tr = np.random.uniform(1.05, 3, 1000000)
+    >>> Pr = np.random.uniform(0.1, 5, 1000000)
+    >>> z = lee_kesler_z(Tr, Pr, 0.152)
+    >>> print(lee_kesler_z(1.5, 2, 0.152))
+    >>> 0.8602185075508514
+    """
+    Tr, Pr, omega = np.broadcast_arrays(np.asarray(t_reduced, dtype=float),
+                                        np.asarray(p_reduced, dtype=float),
+                                        np.asarray(omega_lower, dtype=float))
+    z0 = _interpolated_fluid_z("simple", Tr, Pr)
+    zr = _interpolated_fluid_z("reference", Tr, Pr)
+    z = z0 + omega/LEE_KESLER_OMEGA["reference"]*(zr - z0)
+
+    if z.ndim == 0:
+        return float(z)
+    return z
@@ -0,0 +1,357 @@
+from collections import namedtuple
+import numpy as np
+from cheme_calculations.units import Temperature, Pressure
+from cheme_calculations.utility import unit_value
+from .flash import CubicMixture
+from .saturation import antoine_psat, antoine_tsat
+
+__all__ = ["RaoultsLaw", "BoundaryResult", "bubble_pressure", "dew_pressure",
+           "bubble_temperature", "dew_temperature"]
+
+
+# Compositions are arrays of shape (states x components) with one temperature or
+# pressure per state, a single state can be passed as a 1D composition. Temperatures
+# and pressures can be given as Temperature and Pressure objects or as values in
+# Kelvin and Pa, results are in Kelvin and Pa.
+
+BoundaryResult = namedtuple(
+    'BoundaryResult', ["temperature", "pressure", "composition", "iterations", "converged"]
+)
+
+
+class RaoultsLaw:
+    """Raoult's law with Antoine vapor pressures, K = Psat/P, for use with the bubble
+    and dew point solvers. The coefficients can be in any temperature and pressure
+    units, they are converted at the boundary.
+
+    :param A: Antoine A coefficient of each component
+    :type A: np.ndarray
+    :param B: Antoine B coefficient of each component
+    :type B: np.ndarray
+    :param C: Antoine C coefficient of each component
+    :type C: np.ndarray
+    :param temperature_unit: The temperature unit the coefficients were fit in, defaults to "K"
+    :type temperature_unit: str, optional
+    :param pressure_unit: The pressure unit the coefficients were fit in, defaults to "Pa"
+    :type pressure_unit: str, optional
+
+    :Example:
+
+    >>> from cheme_calculations.thermodynamics import RaoultsLaw
+    >>> # benzene and toluene, bar and K
+    >>> model = RaoultsLaw([4.01814, 4.07827], [1203.835, 1343.943], [-53.226, -53.773], "K", "bar")
+    >>> print(model.psat(350))
+    >>> [91566.54149956 34785.74546751]
+    """
+    def __init__(self, A: np.ndarray, B: np.ndarray, C: np.ndarray,
+                 temperature_unit: str="K", pressure_unit: str="Pa"):
+        self.A = np.asarray(A, dtype=float)
+        self.B = np.asarray(B, dtype=float)
+        self.C = np.asarray(C, dtype=float)
+        self.temperature_unit = temperature_unit
+        self.pressure_unit = pressure_unit
+
+    def psat(self, temperature)-> np.ndarray:
+        """Vapor pressure of each component
+
+        :param temperature: Temperature(s) in Kelvin, pass a column ie ``T[:, None]`` for several
+        :type temperature: float | np.ndarray
+        :return: The vapor pressures in Pa
+        :rtype: np.ndarray
+        """
+        T = unit_value(Temperature(np.asarray(temperature, dtype=float), "K"), Temperature, self.temperature_unit)
+        return unit_value(Pressure(antoine_psat(T, self.A, self.B, self.C), self.pressure_unit), Pressure, "Pa")
+
+    def tsat(self, pressure)-> np.ndarray:
+        """Boiling temperature of each component
+
+        :param pressure: Pressure(s) in Pa, pass a column ie ``P[:, None]`` for several
+        :type pressure: float | np.ndarray
+        :return: The boiling temperatures in Kelvin
+        :rtype: np.ndarray
+        """
+        P = unit_value(Pressure(np.asarray(pressure, dtype=float), "Pa"), Pressure, self.pressure_unit)
+        return unit_value(Temperature(antoine_tsat(P, self.A, self.B, self.C), self.temperature_unit), Temperature, "K")
+
+    def ln_K(self, x, y, temperature, pressure)-> np.ndarray:
+        """Natural log of the equilibrium ratios, independent of the compositions
+
+        :param x: Liquid mole fractions, (states x components)
+        :type x: np.ndarray
+        :param y: Vapor mole fractions, (states x components)
+        :type y: np.ndarray
+        :param temperature: Temperature of each state in Kelvin
+        :type temperature: float | np.ndarray
+        :param pressure: Pressure of each state in Pa
+        :type pressure: float | np.ndarray
+        :return: ln(K) of each component, (states x components)
+        :rtype: np.ndarray
+        """
+        T = np.asarray(temperature, dtype=float)
+        P = np.asarray(pressure, dtype=float)
+        return np.log(self.psat(T[..., None])) - np.log(P[..., None])
+
+
+class _WilsonLaw(RaoultsLaw):
+    # Wilson's K values as pseudo vapor pressures, the starting point for the cubic
+    # equations of state
+    def __init__(self, mixture: CubicMixture):
+        self.Tc = mixture.Tc
+        self.Pc = mixture.Pc
+        self.slope = 5.373*(1 + mixture.omega)
+
+    def psat(self, temperature)-> np.ndarray:
+        return self.Pc*np.exp(self.slope*(1 - self.Tc/np.asarray(temperature, dtype=float)))
+
+    def tsat(self, pressure)-> np.ndarray:
+        return self.Tc/(1 - np.log(np.asarray(pressure, dtype=float)/self.Pc)/self.slope)
+
+
+# a boundary whose largest |ln K| is below this has collapsed onto the feed, the trivial solution
+TRIVIAL_LN_K = 1E-4
+# trivial and unconverged states are restarted from a stability scan over this many values of ln P or 1/T
+BRACKET_POINTS = 60
+
+
+def _bracket(model: CubicMixture, feed: np.ndarray, fixed: np.ndarray, states: np.ndarray, bubble: bool,
+             solve_for: str, s: np.ndarray, low: np.ndarray, high: np.ndarray, incipient: np.ndarray):
+    # scans the stability of each feed, the boundary lies between the last unstable and the
+    # first stable point, at the highest ln P or 1/T for a bubble point and the lowest for a
+    # dew point. The start, its bracket and the incipient phase are updated in place, states
+    # that never split are left unbracketed
+    if solve_for == "pressure":
+        grid = np.linspace(np.log(1E3), np.log(10*model.Pc.max()), BRACKET_POINTS)
+    else:
+        grid = 1/np.linspace(1.5*model.Tc.max(), 0.3*model.Tc.min(), BRACKET_POINTS)
+    z = np.repeat(feed[states], BRACKET_POINTS, axis=0)
+    fixed_grid = np.repeat(fixed[states], BRACKET_POINTS)
+    scan = np.tile(grid, len(states))
+    T, P = (fixed_grid, np.exp(scan)) if solve_for == "pressure" else (1/scan, fixed_grid)
+    with np.errstate(invalid="ignore", over="ignore", divide="ignore"):
+        stable, K = model.stability(z, T, P)
+    unstable = ~stable.reshape(len(states), BRACKET_POINTS)
+    K = K.reshape(len(states), BRACKET_POINTS, -1)
+
+    if bubble:
+        j = BRACKET_POINTS - 1 - np.argmax(unstable[:, ::-1], axis=1)
+        found = unstable.any(axis=1) & (j < BRACKET_POINTS - 1)
+        neighbour = j + 1
+    else:
+        j = np.argmax(unstable, axis=1)
+        found = unstable.any(axis=1) & (j > 0)
+        neighbour = j - 1
+    K, j, neighbour = K[found, j[found]], j[found], neighbour[found]
+    states = states[found]
+    s[states] = grid[j]
+    low[states] = np.minimum(grid[j], grid[neighbour])
+    high[states] = np.maximum(grid[j], grid[neighbour])
+    trial = feed[states]*K if bubble else feed[states]/K
+    incipient[states] = trial/trial.sum(axis=-1, keepdims=True)
+
+
+def _boundary(feed, temperature, pressure, model, bubble: bool, solve_for: str,
+              tolerance: float, max_iterations: int)-> BoundaryResult:
+    feed = np.asarray(feed, dtype=float)
+    single = feed.ndim == 1
+    feed = np.atleast_2d(feed)
+    feed = feed/feed.sum(axis=-1, keepdims=True)
+    n_states = len(feed)
+
+    if solve_for == "pressure":
+        T = np.broadcast_to(unit_value(temperature, Temperature, "K"), n_states).copy()
+    else:
+        P = np.broadcast_to(unit_value(pressure, Pressure, "Pa"), n_states).copy()
+
+    if isinstance(model, CubicMixture):
+        # start from the ideal solution with Wilson's K values
+        start = _boundary(feed, T if solve_for == "pressure" else None, P if solve_for == "temperature" else None,
+                          _WilsonLaw(model), bubble, solve_for, tolerance, max_iterations)
+        T, P, incipient = start.temperature, start.pressure, start.composition
+    else:
+        if solve_for == "pressure":
+            psat = model.psat(T[:, None])
+            P = (feed*psat).sum(axis=-1) if bubble else 1/(feed/psat).sum(axis=-1)
+        else:
+            T = (feed*model.tsat(P[:, None])).sum(axis=-1)
+        incipient = feed.copy()
+
+    # newton on g = ln(sum(feed*K)) (bubble) or ln(sum(feed/K)) (dew) in s = ln P or s = 1/T,
+    # the incipient phase is updated by substitution every step
+    sign = 1 if bubble else -1
+    to_s = np.log if solve_for == "pressure" else np.reciprocal
+    from_s = np.exp if solve_for == "pressure" else np.reciprocal
+    s = to_s(P if solve_for == "pressure" else T)
+    h = 1E-6
+
+    def residual(s, feed, incipient, fixed):
+        T, P = (fixed, from_s(s)) if solve_for == "pressure" else (from_s(s), fixed)
+        x, y = (feed, incipient) if bubble else (incipient, feed)
+        ln_K = model.ln_K(x, y, T, P)
+        terms = feed*np.exp(sign*ln_K)
+        total = terms.sum(axis=-1)
+        return np.log(total), terms/total[:, None], ln_K
+
+    fixed = T if solve_for == "pressure" else P
+    # restarted states are kept within the bracket of their boundary
+    low = np.full(n_states, -np.inf)
+    high = np.full(n_states, np.inf)
+    iterations = np.zeros(n_states, dtype=int)
+    converged = np.zeros(n_states, dtype=bool)
+
+    def newton(states):
+        active = np.zeros(n_states, dtype=bool)
+        active[states] = True
+        for _ in range(max_iterations):
+            if not active.any():
+                break
+            s_a, feed_a, incipient_a, fixed_a = s[active], feed[active], incipient[active], fixed[active]
+            g, new_incipient, _ = residual(s_a, feed_a, incipient_a, fixed_a)
+            g_h, _, _ = residual(s_a + h*np.abs(s_a), feed_a, incipient_a, fixed_a)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                step = -g*h*np.abs(s_a)/(g_h - g)
+            # keep the steps to within 20 % of ln P or 1/T
+            step = np.clip(np.nan_to_num(step), -0.2*np.abs(s_a), 0.2*np.abs(s_a))
+
+            # a state held at the edge of its bracket keeps its full step and does not converge
+            s[active] = np.clip(s_a + step, low[active], high[active])
+            incipient[active] = new_incipient
+            iterations[active] += 1
+            active[active] = ((np.abs(step/s_a) > tolerance)
+                              | (np.abs(new_incipient - incipient_a).max(axis=-1) > tolerance))
+        converged[states] = ~active[states]
+
+    def trivial():
+        # the incipient phase has collapsed onto the feed, every K is one
+        with np.errstate(invalid="ignore", over="ignore", divide="ignore"):
+            ln_K = residual(s, feed, incipient, fixed)[2]
+        return ~(np.abs(ln_K).max(axis=-1) >= TRIVIAL_LN_K)
+
+    newton(np.arange(n_states))
+    if isinstance(model, CubicMixture):
+        restart = np.flatnonzero(~converged | trivial())
+        if len(restart):
+            _bracket(model, feed, fixed, restart, bubble, solve_for, s, low, high, incipient)
+            newton(restart[np.isfinite(low[restart])])
+        converged &= ~trivial()
+
+    if solve_for == "pressure":
+        P = from_s(s)
+    else:
+        T = from_s(s)
+
+    if single:
+        return BoundaryResult(float(T[0]), float(P[0]), incipient[0], int(iterations[0]), bool(converged[0]))
+    return BoundaryResult(T, P, incipient, iterations, converged)
+
+
+def bubble_pressure(x, temperature: Temperature | float | np.ndarray, model: RaoultsLaw | CubicMixture,
+                    tolerance: float=1E-10, max_iterations: int=100)-> BoundaryResult:
+    """Bubble point pressure of every liquid composition, with the composition of the
+    first bubble of vapor. Raoult's law is solved directly, the cubic equations of state
+    (phi-phi) are solved by Newton steps in ln P from the ideal Wilson K value solution,
+    for all rows at once with each row dropped as it converges. Rows that do not converge
+    or fall onto the trivial solution, a vapor identical to the liquid, are restarted from a
+    scan of :meth:`CubicMixture.stability` with their steps kept within the bracket it finds,
+    rows that still have no bubble point are returned with converged False.
+
+    .. math:: \\sum_i x_i K_i = 1
+
+    :param x: Liquid mole fractions, (states x components)
+    :type x: np.ndarray
+    :param temperature: Temperature of each state, in Kelvin if not a Temperature
+    :type temperature: Temperature | float | np.ndarray
+    :param model: Raoult's law or a cubic equation of state mixture
+    :type model: RaoultsLaw | CubicMixture
+    :param tolerance: Convergence tolerance on ln P and the vapor composition, defaults to 1E-10
+    :type tolerance: float, optional
+    :param max_iterations: Maximum Newton steps, defaults to 100
+    :type max_iterations: int, optional
+    :return: Temperature (K), bubble pressure (Pa), vapor composition, iterations and converged of every state
+    :rtype: BoundaryResult
+
+    :Example:
+
+    >>> from cheme_calculations.thermodynamics import RaoultsLaw, bubble_pressure
+    >>> model = RaoultsLaw([4.01814, 4.07827], [1203.835, 1343.943], [-53.226, -53.773], "K", "bar")
+    >>> result = bubble_pressure([0.5, 0.5], Temperature(80, "C"), model)
+    >>> print(result.pressure)
+    >>> 69915.81384489758
+    >>> print(result.composition)
+    >>> [0.72232796 0.27767204]
+    """
+    return _boundary(x, temperature, None, model, True, "pressure", tolerance, max_iterations)
+
+
+def dew_pressure(y, temperature: Temperature | float | np.ndarray, model: RaoultsLaw | CubicMixture,
+                 tolerance: float=1E-10, max_iterations: int=100)-> BoundaryResult:
+    """Dew point pressure of every vapor composition, with the composition of the first
+    drop of liquid, solved the same way as :func:`bubble_pressure`
+
+    .. math:: \\sum_i \\dfrac{y_i}{K_i} = 1
+
+    :param y: Vapor mole fractions, (states x components)
+    :type y: np.ndarray
+    :param temperature: Temperature of each state, in Kelvin if not a Temperature
+    :type temperature: Temperature | float | np.ndarray
+    :param model: Raoult's law or a cubic equation of state mixture
+    :type model: RaoultsLaw | CubicMixture
+    :param tolerance: Convergence tolerance on ln P and the liquid composition, defaults to 1E-10
+    :type tolerance: float, optional
+    :param max_iterations: Maximum Newton steps, defaults to 100
+    :type max_iterations: int, optional
+    :return: Temperature (K), dew pressure (Pa), liquid composition, iterations and converged of every state
+    :rtype: BoundaryResult
+    """
+    return _boundary(y, temperature, None, model, False, "pressure", tolerance, max_iterations)
+
+
+def bubble_temperature(x, pressure: Pressure | float | np.ndarray, model: RaoultsLaw | CubicMixture,
+                       tolerance: float=1E-10, max_iterations: int=100)-> BoundaryResult:
+    """Bubble point temperature of every liquid composition, with the composition of the
+    first bubble of vapor. Solved by Newton steps in 1/T for all rows at once, starting
+    from the mole fraction average of the component boiling points.
+
+    :param x: Liquid mole fractions, (states x components)
+    :type x: np.ndarray
+    :param pressure: Pressure of each state, in Pa if not a Pressure
+    :type pressure: Pressure | float | np.ndarray
+    :param model: Raoult's law or a cubic equation of state mixture
+    :type model: RaoultsLaw | CubicMixture
+    :param tolerance: Convergence tolerance on 1/T and the vapor composition, defaults to 1E-10
+    :type tolerance: float, optional
+    :param max_iterations: Maximum Newton steps, defaults to 100
+    :type max_iterations: int, optional
+    :return: Bubble temperature (K), pressure (Pa), vapor composition, iterations and converged of every state
+    :rtype: BoundaryResult
+
+    :Example:
+
+    >>> from cheme_calculations.thermodynamics import CubicMixture, bubble_temperature
+    >>> mixture = CubicMixture.from_components("pr", ["propane", "n-butane"])
+    >>> x = np.linspace(0, 1, 1001)
+    >>> result = bubble_temperature(np.column_stack([x, 1 - x]), Pressure(10, "bar"), mixture)
+    >>> print(result.temperature[[0, 500, -1]])
+    >>> [352.4862254  320.6919392  300.07329661]
+    """
+    return _boundary(x, None, pressure, model, True, "temperature", tolerance, max_iterations)
+
+
+def dew_temperature(y, pressure: Pressure | float | np.ndarray, model: RaoultsLaw | CubicMixture,
+                    tolerance: float=1E-10, max_iterations: int=100)-> BoundaryResult:
+    """Dew point temperature of every vapor composition, with the composition of the
+    first drop of liquid, solved the same way as :func:`bubble_temperature`
+
+    :param y: Vapor mole fractions, (states x components)
+    :type y: np.ndarray
+    :param pressure: Pressure of each state, in Pa if not a Pressure
+    :type pressure: Pressure | float | np.ndarray
+    :param model: Raoult's law or a cubic equation of state mixture
+    :type model: RaoultsLaw | CubicMixture
+    :param tolerance: Convergence tolerance on 1/T and the liquid composition, defaults to 1E-10
+    :type tolerance: float, optional
+    :param max_iterations: Maximum Newton steps, defaults to 100
+    :type max_iterations: int, optional
+    :return: Dew temperature (K), pressure (Pa), liquid composition, iterations and converged of every state
+    :rtype: BoundaryResult
+    """
+    return _boundary(y, None, pressure, model, False, "temperature", tolerance, max_iterations)
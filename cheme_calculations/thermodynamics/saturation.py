@@ -0,0 +1,327 @@
+from typing import List
+import numpy as np
+from cheme_calculations.utility.components import get_components
+from cheme_calculations.utility.equation_solving import UnsolvableEquation
+from cheme_calculations.utility.get_chemical_properties import OutOfRangeProperty
+
+__all__ = ["water_psat", "water_tsat", "water_hvap", "antoine_psat", "antoine_tsat",
+           "SaturationCurve"]
+
+
+GAS_CONSTANT = 8.314462618
+
+# IAPWS-IF97 region 4 (saturation line) coefficients n1 to n10
+IF97_N = np.array([0.11670521452767E4, -0.72421316703206E6, -0.17073846940092E2,
+                   0.12020824702470E5, -0.32325550322333E7, 0.14915108613530E2,
+                   -0.48232657361591E4, 0.40511340542057E6, -0.23855557567849,
+                   0.65017534844798E3])
+
+WATER_TC = 647.096
+WATER_PC = 22.064E6
+WATER_MW = 18.015
+
+# DIPPR equation 106 coefficients for the heat of vaporization of water (J/kmol)
+WATER_HVAP_COEFFICIENTS = (5.2053E7, 0.3199, -0.212, 0.25795)
+
+
+def _as_output(x: np.ndarray):
+    if x.ndim == 0:
+        return float(x)
+    return x
+
+
+def water_psat(temperature)-> float | np.ndarray:
+    """Saturation pressure of water from the IAPWS-IF97 region 4 equation, valid from
+    273.15 K to the critical point (647.096 K). Evaluates a whole array of temperatures
+    in one call.
+
+    :param temperature: Temperature in Kelvin, a single value or an array of values
+    :type temperature: float | np.ndarray
+    :raises OutOfRangeProperty: Raises an error if a temperature is outside of 273.15 to 647.096 K
+    :return: The saturation pressure in Pa
+    :rtype: float | np.ndarray
+
+    :Example:
+
+    >>> from cheme_calculations.thermodynamics import water_psat
+    >>> print(water_psat(373.15))
+    >>> 101417.97792131013
+
+    :Reference:
+
+    Wagner, W., et al. (2000). The IAPWS Industrial Formulation 1997 for the Thermodynamic
+    Properties of Water and Steam. J. Eng. Gas Turbines Power, 122(1), 150-184.
+    """
+    T = np.asarray(temperature, dtype=float)
+    if np.any((T < 273.15) | (T > WATER_TC)):
+        raise OutOfRangeProperty("Please enter a temperature between 273.15 and 647.096 K")
+
+    n = IF97_N
+    theta = T + n[8]/(T - n[9])
+    A = theta**2 + n[0]*theta + n[1]
+    B = n[2]*theta**2 + n[3]*theta + n[4]
+    C = n[5]*theta**2 + n[6]*theta + n[7]
+
+    # MPa to Pa
+    return _as_output(1E6*(2*C/(-B + np.sqrt(B**2 - 4*A*C)))**4)
+
+
+def water_tsat(pressure)-> float | np.ndarray:
+    """Saturation temperature of water from the backwards IAPWS-IF97 region 4 equation,
+    valid from the triple point (611.213 Pa) to the critical point (22.064 MPa). This
+    is closed form so no iteration is needed.
+
+    :param pressure: Pressure in Pa, a single value or an array of values
+    :type pressure: float | np.ndarray
+    :raises OutOfRangeProperty: Raises an error if a pressure is outside of 611.213 Pa to 22.064 MPa
+    :return: The saturation temperature in Kelvin
+    :rtype: float | np.ndarray
+
+    :Example:
+
+    >>> from cheme_calculations.thermodynamics import water_tsat
+    >>> print(water_tsat(101325))
+    >>> 373.12430000048056
+    """
+    P = np.asarray(pressure, dtype=float)
+    if np.any((P < 611.213) | (P > WATER_PC)):
+        raise OutOfRangeProperty("Please enter a pressure between 611.213 Pa and 22.064 MPa")
+
+    n = IF97_N
+    beta = (P/1E6)**0.25
+    E = beta**2 + n[2]*beta + n[5]
+    F = n[0]*beta**2 + n[3]*beta + n[6]
+    G = n[1]*beta**2 + n[4]*beta + n[7]
+    D = 2*G/(-F - np.sqrt(F**2 - 4*E*G))
+
+    return _as_output((n[9] + D - np.sqrt((n[9] + D)**2 - 4*(n[8] + n[9]*D)))/2)
+
+
+def water_hvap(temperature)-> float | np.ndarray:
+    """Heat of vaporization of water along the saturation curve from the DIPPR 106
+    correlation, within about 1 % of steam table values from 273.15 K to the critical point.
+
+    .. math:: \\Delta H_{vap} = A(1-T_r)^{B + CT_r + DT_r^2}
+
+    :param temperature: Temperature in Kelvin, a single value or an array of values
+    :type temperature: float | np.ndarray
+    :raises OutOfRangeProperty: Raises an error if a temperature is outside of 273.15 to 647.096 K
+    :return: The heat of vaporization in kJ/kg
+    :rtype: float | np.ndarray
+
+    :Example:
+
+    >>> from cheme_calculations.thermodynamics import water_hvap
+    >>> print(water_hvap(373.15))
+    >>> 2264.68471412752
+
+    :Reference:
+
+    Perry, R. H., & Green, D. W. (2008). Perry's Chemical Engineers' Handbook, 8th ed. McGraw-Hill.
+    """
+    T = np.asarray(temperature, dtype=float)
+    if np.any((T < 273.15) | (T > WATER_TC)):
+        raise OutOfRangeProperty("Please enter a temperature between 273.15 and 647.096 K")
+
+    A, B, C, D = WATER_HVAP_COEFFICIENTS
+    Tr = T/WATER_TC
+    # J/kmol to kJ/kg
+    return _as_output(A*(1 - Tr)**(B + C*Tr + D*Tr**2)/(1000*WATER_MW))
+
+
+def antoine_psat(temperature, A, B, C)-> float | np.ndarray:
+    """Saturation pressure from the Antoine equation. The coefficients can be arrays
+    (one entry per component) and are broadcast against the temperatures, so pass
+    temperatures as a column ie ``T[:, None]`` to evaluate every component at every
+    temperature.
+
+    .. math:: log_{10}(P^{sat}) = A - \\dfrac{B}{T + C}
+
+    NOTE: The units of the answer are whatever the coefficients were fit in
+
+    :param temperature: Temperature in the units of the coefficients
+    :type temperature: float | np.ndarray
+    :param A: Antoine A coefficient(s)
+    :type A: float | np.ndarray
+    :param B: Antoine B coefficient(s)
+    :type B: float | np.ndarray
+    :param C: Antoine C coefficient(s)
+    :type C: float | np.ndarray
+    :return: The saturation pressure
+    :rtype: float | np.ndarray
+
+    :Example:
+
+    >>> from cheme_calculations.thermodynamics import antoine_psat
+    >>> # benzene and toluene, bar and K
+    >>> A = np.array([4.01814, 4.07827])
+    >>> B = np.array([1203.835, 1343.943])
+    >>> C = np.array([-53.226, -53.773])
+    >>> print(antoine_psat(np.array([[350], [370]]), A, B, C))
+    >>> [[0.91566541 0.34785745]
+         [1.6513681  0.67350183]]
+    """
+    T = np.asarray(temperature, dtype=float)
+    return _as_output(10**(np.asarray(A) - np.asarray(B)/(T + np.asarray(C))))
+
+
+def antoine_tsat(pressure, A, B, C)-> float | np.ndarray:
+    """Saturation temperature from the Antoine equation, broadcast the same way
+    as :func:`antoine_psat`.
+
+    .. math:: T^{sat} = \\dfrac{B}{A - log_{10}(P)} - C
+
+    :param pressure: Pressure in the units of the coefficients
+    :type pressure: float | np.ndarray
+    :param A: Antoine A coefficient(s)
+    :type A: float | np.ndarray
+    :param B: Antoine B coefficient(s)
+    :type B: float | np.ndarray
+    :param C: Antoine C coefficient(s)
+    :type C: float | np.ndarray
+    :return: The saturation temperature
+    :rtype: float | np.ndarray
+
+    :Example:
+
+    >>> from cheme_calculations.thermodynamics import antoine_tsat
+    >>> print(antoine_tsat(1.01325, 4.01814, 1203.835, -53.226))
+    >>> 353.2529123454054
+    """
+    P = np.asarray(pressure, dtype=float)
+    return _as_output(np.asarray(B)/(np.asarray(A) - np.log10(P)) - np.asarray(C))
+
+
+def _lee_kesler_ln_pr(Tr: np.ndarray, omega: np.ndarray)-> np.ndarray:
+    f0 = 5.92714 - 6.09648/Tr - 1.28862*np.log(Tr) + 0.169347*Tr**6
+    f1 = 15.2518 - 15.6875/Tr - 13.4721*np.log(Tr) + 0.43577*Tr**6
+    return f0 + omega*f1
+
+
+def _lee_kesler_d_ln_pr(Tr: np.ndarray, omega: np.ndarray)-> np.ndarray:
+    df0 = 6.09648/Tr**2 - 1.28862/Tr + 6*0.169347*Tr**5
+    df1 = 15.6875/Tr**2 - 13.4721/Tr + 6*0.43577*Tr**5
+    return df0 + omega*df1
+
+
+class SaturationCurve:
+    """Saturation properties for a set of components from their critical constants
+    and acentric factors. The per-component constants are stored as arrays when the
+    curve is created so every evaluation is a single vectorised expression.
+
+    - Psat and Tsat use the Lee-Kesler vapor pressure correlation
+    - Hvap uses the Pitzer acentric factor correlation
+
+    Inputs are broadcast against the component axis (the last axis), so a scalar gives
+    one value per component and a column ``T[:, None]`` gives a (temperatures x components)
+    array.
+
+    :param Tc: Critical temperatures in Kelvin
+    :type Tc: np.ndarray
+    :param Pc: Critical pressures in Pa
+    :type Pc: np.ndarray
+    :param omega: Acentric factors
+    :type omega: np.ndarray
+
+    :Example:
+
+    >>> from cheme_calculations.thermodynamics import SaturationCurve
+    >>> curve = SaturationCurve.from_components(["propane", "n-butane"])
+    >>> print(curve.psat(300))
+    >>> [1002089.88650678  258309.66144333]
+    >>> print(curve.tsat(101325))
+    >>> [231.28121398 272.90535234]
+
+    :Reference:
+
+    Poling, B. E., Prausnitz, J. M., & O'Connell, J. P. (2001). The Properties of Gases
+    and Liquids, 5th ed. McGraw-Hill.
+    """
+    def __init__(self, Tc: np.ndarray, Pc: np.ndarray, omega: np.ndarray):
+        self.Tc = np.asarray(Tc, dtype=float)
+        self.Pc = np.asarray(Pc, dtype=float)
+        self.omega = np.asarray(omega, dtype=float)
+
+    @classmethod
+    def from_components(cls, identifiers: List[str]):
+        """Builds a saturation curve from components in the bundled component database
+
+        :param identifiers: Names, formulas or CAS numbers of the components
+        :type identifiers: List[str]
+        :return: The saturation curve for the components
+        :rtype: SaturationCurve
+        """
+        c = get_components(identifiers)
+        # bar to Pa
+        return cls(c.Tc, c.Pc*1E5, c.omega)
+
+    def psat(self, temperature)-> np.ndarray:
+        """Saturation pressure of each component
+
+        :param temperature: Temperature in Kelvin
+        :type temperature: float | np.ndarray
+        :raises OutOfRangeProperty: Raises an error if a temperature is above a critical temperature
+        :return: The saturation pressures in Pa
+        :rtype: np.ndarray
+        """
+        Tr = np.asarray(temperature, dtype=float)/self.Tc
+        if np.any(Tr > 1):
+            raise OutOfRangeProperty("Saturation pressures only exist below the critical temperature")
+
+        return self.Pc*np.exp(_lee_kesler_ln_pr(Tr, self.omega))
+
+    def tsat(self, pressure, tolerance: float=1E-10, max_iterations: int=50)-> np.ndarray:
+        """Saturation temperature of each component, found with a vectorised Newton
+        iteration on the Lee-Kesler correlation. Elements stop iterating once they
+        have converged.
+
+        :param pressure: Pressure in Pa
+        :type pressure: float | np.ndarray
+        :param tolerance: Convergence tolerance on the reduced temperature, defaults to 1E-10
+        :type tolerance: float, optional
+        :param max_iterations: Maximum Newton steps, defaults to 50
+        :type max_iterations: int, optional
+        :raises OutOfRangeProperty: Raises an error if a pressure is above a critical pressure
+        :raises UnsolvableEquation: Raises an error if a temperature has not converged after max_iterations
+        :return: The saturation temperatures in Kelvin
+        :rtype: np.ndarray
+        """
+        Pr = np.asarray(pressure, dtype=float)/self.Pc
+        if np.any(Pr > 1):
+            raise OutOfRangeProperty("Saturation temperatures only exist below the critical pressure")
+
+        ln_pr = np.log(Pr)
+        ln_pr, omega = np.broadcast_arrays(ln_pr, self.omega)
+        # Edmister estimate as the starting point
+        Tr = 1/(1 - ln_pr/(5.373*(1 + omega)))
+
+        active = np.ones(Tr.shape, dtype=bool)
+        for _ in range(max_iterations):
+            Tr_a, omega_a = Tr[active], omega[active]
+            step = (_lee_kesler_ln_pr(Tr_a, omega_a) - ln_pr[active])/_lee_kesler_d_ln_pr(Tr_a, omega_a)
+            Tr[active] -= step
+            # a step that is not finite keeps the element active
+            active[active] = ~(np.abs(step) <= tolerance)
+            if not active.any():
+                break
+        else:
+            raise UnsolvableEquation(f"The saturation temperature did not converge in {max_iterations} iterations")
+
+        return Tr*self.Tc
+
+    def hvap(self, temperature)-> np.ndarray:
+        """Heat of vaporization of each component
+
+        .. math:: \\dfrac{\\Delta H_{vap}}{RT_c} = 7.08(1-T_r)^{0.354} + 10.95\\omega(1-T_r)^{0.456}
+
+        :param temperature: Temperature in Kelvin
+        :type temperature: float | np.ndarray
+        :raises OutOfRangeProperty: Raises an error if a temperature is above a critical temperature
+        :return: The heat of vaporization in J/mol
+        :rtype: np.ndarray
+        """
+        Tr = np.asarray(temperature, dtype=float)/self.Tc
+        if np.any(Tr > 1):
+            raise OutOfRangeProperty("Heats of vaporization only exist below the critical temperature")
+
+        return GAS_CONSTANT*self.Tc*(7.08*(1 - Tr)**0.354 + 10.95*self.omega*(1 - Tr)**0.456)
@@ -1388,7 +1388,7 @@ class Volume(Unit):
     # cube applied to unit value in convert function
     # ie actual L conversion is by a factor of 10 * 10 * 10
     to_standard_conversions = {
-        "uL": lambda x: x/1E-3,
+        "uL": lambda x: x*1E-3,
         "mL": lambda x: x/100,
         "cL": lambda x: x/46.41588,
         "dL": lambda x: x/21.544346,
@@ -1400,11 +1400,11 @@ class Volume(Unit):
         "dm^3": lambda x: x/(10),
         "km^3": lambda x: x*(1000),
         "ft^3": lambda x: x*0.3048,
-        "gal": lambda x: x*0.00454609,
+        "gal": lambda x: x*0.00454609**(1/3),
     }
     # form standard unit to the target unit 
     from_standard_conversions = {
-        "uL": lambda x: x*1E-3,
+        "uL": lambda x: x/1E-3,
         "mL": lambda x: x*100,
         "cL": lambda x: x*46.41588,
         "dL": lambda x: x*21.544346,
@@ -1416,7 +1416,7 @@ class Volume(Unit):
         "dm^3": lambda x: x*(10),
         "km^3": lambda x: x/(1000),
         "ft^3": lambda x: x/0.3048,
-        "gal": lambda x: x/0.00454609,
+        "gal": lambda x: x/0.00454609**(1/3),
     }
     def __init__(self, value: float, unit: str, exponent: int = 1):
         if "^" in unit:
@@ -1424,6 +1424,31 @@ class Volume(Unit):
             super().__init__(value, unit, float(exponent))
         else:
             super().__init__(value, unit, exponent)
+            
+    def convert_to(self, unit: str, inplace: bool =False):
+        """Converts a volume to another given unit, the conversions are cubed to a
+        factor before scaling the value (not applied to the value and then cubed)
+
+        :param unit: The unit to convert to ie "L" or "cm^3"
+        :type unit: str
+        :param inplace: whether the conversion should create a new object or not, defaults to False
+        :type inplace: bool, optional
+        :raises UnitConversionError: Raises an error if a unit can't be converted
+        :return: Returns a Volume with the new value and unit
+        :rtype: Volume
+        """
+        current = self._unit if self._exponent == 1 else f"{self._unit}^{remove_zero(self._exponent)}"
+        if current == unit:
+            return self
+        try:
+            to_standard = 1 if current == self.standard else self.to_standard_conversions[current](1)**3
+            from_standard = 1 if unit == self.standard else self.from_standard_conversions[unit](1)**3
+        except KeyError as _:
+            raise UnitConversionError(f"{current} can not be converted to {unit}")
+        val = self._value*to_standard*from_standard
+        if inplace:
+            return self.__class__.__init__(self, val, unit)
+        return self.__class__(val, unit)
 class Area(Unit):
     standard = "m^2"
         
@@ -1,6 +1,11 @@
 from .constants import *
+from .conversions import *
 from .equation_solving import *
 from .dimensionless import *
 from .get_chemical_properties import *
+from .components import *
+from .mixtures import *
+from .surrogate import *
+from .ode_solvers import *
 
 __all__ = [s for s in dir()]
\ No newline at end of file
@@ -0,0 +1,181 @@
+import csv
+import os
+from collections import namedtuple
+from functools import lru_cache
+from typing import List
+import numpy as np
+from cheme_calculations.units import MolecularWeight, MultiUnit
+from cheme_calculations.units.units import Pressure, Temperature
+
+class UnknownComponent(Exception):
+    pass
+
+class AmbiguousComponent(Exception):
+    pass
+
+__all__ = ["Component", "ComponentArrays", "get_component", "get_components"]
+
+
+# component_data.txt is the readable source, component_data.npz is the compact
+# columnar copy that is actually loaded, rebuild it with _build_component_data()
+# after editing the text file
+COMPONENT_SOURCE_PATH = os.path.join(os.path.dirname(__file__), "component_data.txt")
+COMPONENT_DATA_PATH = os.path.join(os.path.dirname(__file__), "component_data.npz")
+
+# text column -> key in the npz file
+COMPONENT_COLUMNS = {"Name": "name",
+                     "Formula": "formula",
+                     "CAS": "cas",
+                     "Molecular Weight (g/mol)": "molecular_weight",
+                     "Tc (K)": "Tc",
+                     "Pc (bar)": "Pc",
+                     "Acentric Factor": "omega",
+                     "Vc (cm3/mol)": "Vc",
+                     "Tb (K)": "Tb",
+                     "Diffusion Volume (cm3/mol)": "diffusion_volume"}
+
+COMPONENT_TEXT_KEYS = ["name", "formula", "cas"]
+
+Component = namedtuple(
+    'Component', ["name", "formula", "cas", "molecular_weight", "Tc", "Pc",
+                  "omega", "Vc", "Tb", "diffusion_volume"]
+)
+
+ComponentArrays = namedtuple(
+    'ComponentArrays', Component._fields
+)
+
+
+def _build_component_data(source: str=COMPONENT_SOURCE_PATH, destination: str=COMPONENT_DATA_PATH):
+
+    with open(source, "r", encoding="utf8", newline="\n") as component_file:
+        rows = list(csv.DictReader(component_file, delimiter="\t"))
+
+    columns = {}
+    for column, key in COMPONENT_COLUMNS.items():
+        values = [row[column] for row in rows]
+        if key in COMPONENT_TEXT_KEYS:
+            columns[key] = np.array(values, dtype=str)
+        else:
+            columns[key] = np.array(values, dtype=float)
+
+    np.savez_compressed(destination, **columns)
+
+
+@lru_cache(maxsize=None)
+def _load_component_data()-> tuple:
+
+    with np.load(COMPONENT_DATA_PATH, allow_pickle=False) as data:
+        columns = {key: data[key] for key in COMPONENT_COLUMNS.values()}
+
+    # one index for names, formulas and CAS numbers, formulas shared by
+    # isomers are marked as ambiguous instead of picking one
+    index = {}
+    ambiguous = set()
+    for i in range(len(columns["name"])):
+        index[columns["name"][i].lower()] = i
+        index[columns["cas"][i]] = i
+        formula = columns["formula"][i]
+        if formula in index and index[formula] != i:
+            ambiguous.add(formula)
+        index[formula] = i
+
+    for formula in ambiguous:
+        index.pop(formula)
+
+    return columns, index, frozenset(ambiguous)
+
+
+def _get_component_index(identifier: str)-> int:
+    _, index, ambiguous = _load_component_data()
+
+    if identifier in ambiguous:
+        raise AmbiguousComponent(f"The formula {identifier} matches more than one component, use the name or CAS number")
+
+    # names are case insensitive, formulas and CAS numbers are not
+    for key in (identifier, identifier.strip().lower()):
+        if key in index:
+            return index[key]
+
+    raise UnknownComponent(f"The component {identifier} is not in the component database")
+
+
+@lru_cache(maxsize=None)
+def _get_component_record(i: int)-> Component:
+    columns, _, _ = _load_component_data()
+
+    return Component(name=str(columns["name"][i]),
+                     formula=str(columns["formula"][i]),
+                     cas=str(columns["cas"][i]),
+                     molecular_weight=MolecularWeight(float(columns["molecular_weight"][i]), "g/mol"),
+                     Tc=Temperature(float(columns["Tc"][i]), "K"),
+                     Pc=Pressure(float(columns["Pc"][i]), "bar"),
+                     omega=float(columns["omega"][i]),
+                     Vc=MultiUnit(float(columns["Vc"][i]), "cm^3/mol"),
+                     Tb=Temperature(float(columns["Tb"][i]), "K"),
+                     diffusion_volume=MultiUnit(float(columns["diffusion_volume"][i]), "cm^3/mol"))
+
+
+def get_component(identifier: str)-> Component:
+    """Looks up a component in the bundled component database by its name, formula
+    or CAS number. The database is loaded the first time it is used and records are
+    cached so repeated lookups are cheap.
+
+    Properties include:
+
+    - molecular weight (g/mol)
+    - critical temperature, Tc (K)
+    - critical pressure, Pc (bar)
+    - acentric factor, omega
+    - critical volume, Vc (cm^3/mol)
+    - normal boiling point, Tb (K)
+    - Fuller diffusion volume (cm^3/mol)
+
+    NOTE: The record is shared between lookups, convert its units into new objects
+    instead of in place
+
+    :param identifier: Name (case insensitive), formula or CAS number of the component
+    :type identifier: str
+    :raises UnknownComponent: Raises an error if the component is not in the database
+    :raises AmbiguousComponent: Raises an error if a formula matches more than one component ie C4H10
+    :return: The record for the component
+    :rtype: Component
+
+    :Example:
+
+    >>> from cheme_calculations.utility import get_component
+    >>> propane = get_component("propane")
+    >>> print(propane.Tc)
+    >>> 369.83 K
+    >>> print(get_component("124-38-9").name)
+    >>> Carbon Dioxide
+    """
+    return _get_component_record(_get_component_index(identifier))
+
+
+def get_components(identifiers: List[str])-> ComponentArrays:
+    """Looks up several components at once and returns their properties as arrays
+    aligned with the order of the identifiers, useful for setting up a multicomponent
+    calculation in one call. Values are plain floats in the units listed for
+    :func:`get_component`.
+
+    :param identifiers: Names, formulas or CAS numbers of the components
+    :type identifiers: List[str]
+    :raises UnknownComponent: Raises an error if a component is not in the database
+    :raises AmbiguousComponent: Raises an error if a formula matches more than one component
+    :return: The properties of each component, one array per property
+    :rtype: ComponentArrays
+
+    :Example:
+
+    >>> from cheme_calculations.utility import get_components
+    >>> c = get_components(["methane", "CO2", "n-Butane"])
+    >>> print(c.Tc)
+    >>> [190.56 304.12 425.12]
+    >>> print(c.omega)
+    >>> [0.011 0.225 0.2  ]
+    """
+    columns, _, _ = _load_component_data()
+    rows = np.array([_get_component_index(x) for x in identifiers], dtype=int)
+
+    return ComponentArrays(**{key: columns[key][rows] for key in ComponentArrays._fields})
@@ -0,0 +1,30 @@
+import numpy as np
+
+__all__ = ["unit_value"]
+
+
+def unit_value(value, unit_class, unit: str)-> np.ndarray:
+    """The value of a quantity in a given unit as a float array, for handing unit objects
+    or plain numbers to array code. Unit objects are converted once, plain numbers and
+    arrays are taken to already be in the unit.
+
+    :param value: The quantity
+    :type value: Unit | float | np.ndarray
+    :param unit_class: The class of unit expected ie Temperature
+    :type unit_class: type
+    :param unit: The unit of the result ie "K"
+    :type unit: str
+    :return: The value in the unit
+    :rtype: np.ndarray
+
+    :Example:
+
+    >>> from cheme_calculations.utility import unit_value
+    >>> print(unit_value(Temperature(25, "C"), Temperature, "K"))
+    >>> 298.15
+    >>> print(unit_value(Volume(2, "L"), Volume, "m^3"))
+    >>> 0.002
+    """
+    if isinstance(value, unit_class):
+        return np.asarray(value.convert_to(unit)/unit_class(1, unit), dtype=float)
+    return np.asarray(value, dtype=float)
@@ -1,14 +1,17 @@
+from functools import lru_cache
 from math import ceil, floor
 from typing import List
+import numpy as np
 from cheme_calculations.units.heat_transfer import ThermalConductivity
 from cheme_calculations.units.property_units import Cp, Cv, Density, DynamicViscosity, Enthalpy, Entropy, InternalEnergy, SpecificVolume
 from cheme_calculations.units.units import Pressure, Temperature
-from .water_data import WATER_PROPERTIES, WATER_PROPERTY_KEYS
+from .water_data import WATER_PROPERTIES, WATER_PROPERTY_KEYS, WATER_SATURATED_LIQUID, WATER_SATURATION_TEMPERATURE
 
 class OutOfRangeProperty(Exception):
     pass
 
-__all__ = ["Water", "get_water_properties"]
+__all__ = ["Water", "get_water_properties", "water_T_from_h", "water_T_from_s",
+           "water_T_from_density"]
 
 
 class Water:
@@ -114,7 +117,120 @@ def get_water_properties(temperature: float, return_object: bool=True)-> List |
         
     else:
         raise OutOfRangeProperty("Please enter a temperature between 275 and 1345 K")
-        
+
+
+@lru_cache(maxsize=None)
+def _get_inverse_branches(property_key: str)-> tuple:
+    
+    # split the table into its liquid and vapor branches, the saturated liquid 
+    # point closes the liquid branch so the gap between them is the two phase region
+    temperatures = sorted(x for x in WATER_PROPERTIES if 275 <= x <= 1345)
+    liquid = [x for x in temperatures if WATER_PROPERTIES[x]["Phase"] == "liquid"]
+    vapor = [x for x in temperatures if WATER_PROPERTIES[x]["Phase"] == "vapor"]
+    
+    liquid_T = np.array(liquid + [WATER_SATURATION_TEMPERATURE])
+    liquid_y = np.array([WATER_PROPERTIES[x][property_key] for x in liquid] + [WATER_SATURATED_LIQUID[property_key]])
+    vapor_T = np.array(vapor)
+    vapor_y = np.array([WATER_PROPERTIES[x][property_key] for x in vapor])
+    
+    branches = []
+    for T, y in ((liquid_T, liquid_y), (vapor_T, vapor_y)):
+        # searchsorted needs ascending values, density falls with temperature
+        if y[-1] < y[0]:
+            T, y = T[::-1], y[::-1]
+        if np.any(np.diff(y) <= 0):
+            raise ValueError(f"{property_key} is not monotonic on a branch of the water table")
+        branches.append((T, y))
+    
+    return tuple(branches)
+
+
+def _invert_water_property(values, property_key: str):
+    
+    values = np.asarray(values, dtype=float)
+    branches = _get_inverse_branches(property_key)
+    
+    lowest = min(y[0] for _, y in branches)
+    highest = max(y[-1] for _, y in branches)
+    if np.any((values < lowest) | (values > highest)):
+        raise OutOfRangeProperty(f"Please enter {property_key} values between {lowest} and {highest}")
+    
+    # anything not on a branch falls in the two phase region which sits at Tsat
+    temperatures = np.full(values.shape, WATER_SATURATION_TEMPERATURE)
+    for T, y in branches:
+        on_branch = (values >= y[0]) & (values <= y[-1])
+        v = values[on_branch]
+        idx = np.clip(np.searchsorted(y, v, side="right") - 1, 0, len(y) - 2)
+        temperatures[on_branch] = T[idx] + (v - y[idx]) * ((T[idx+1] - T[idx])/(y[idx+1] - y[idx]))
+    
+    if temperatures.ndim == 0:
+        return float(temperatures)
+    return temperatures
+
+
+def water_T_from_h(enthalpy)-> float | np.ndarray:
+    """Finds the temperature of water at 1 atm from its enthalpy, the inverse of 
+    :func:`get_water_properties`. Each point is found with a binary search over 
+    the tabulated data and a linear inversion between the two bounding points.
+    
+    Enthalpies between the saturated liquid and saturated vapor values are in the 
+    two phase region and return the saturation temperature (373.12 K).
+
+    :param enthalpy: Enthalpy in kJ/kg, a single value or an array of values
+    :type enthalpy: float | np.ndarray
+    :raises OutOfRangeProperty: Raises an error if a value is outside of the table (275 to 1345 K)
+    :return: The temperature in Kelvin, an array if an array was supplied
+    :rtype: float | np.ndarray
     
+    :Example:
     
-    
\ No newline at end of file
+    >>> from cheme_calculations.utility import water_T_from_h
+    >>> print(water_T_from_h(133.55))
+    >>> 305.0
+    >>> print(water_T_from_h([49.877, 1500, 2700]))
+    >>> [285.   373.12 385.  ]
+    """
+    return _invert_water_property(enthalpy, 'Enthalpy (kJ/kg)')
+
+
+def water_T_from_s(entropy)-> float | np.ndarray:
+    """Finds the temperature of water at 1 atm from its entropy, the inverse of 
+    :func:`get_water_properties`. Entropies in the two phase region return the 
+    saturation temperature (373.12 K).
+
+    :param entropy: Entropy in J/g*K, a single value or an array of values
+    :type entropy: float | np.ndarray
+    :raises OutOfRangeProperty: Raises an error if a value is outside of the table (275 to 1345 K)
+    :return: The temperature in Kelvin, an array if an array was supplied
+    :rtype: float | np.ndarray
+    
+    :Example:
+    
+    >>> from cheme_calculations.utility import water_T_from_s
+    >>> print(water_T_from_s(0.46215))
+    >>> 305.0
+    """
+    return _invert_water_property(entropy, 'Entropy (J/g*K)')
+
+
+def water_T_from_density(density)-> float | np.ndarray:
+    """Finds the temperature of water at 1 atm from its density, the inverse of 
+    :func:`get_water_properties`. Densities in the two phase region return the 
+    saturation temperature (373.12 K).
+    
+    NOTE: The tabulated liquid density has its maximum at 275 K so the liquid 
+    density maximum near 277 K is not resolved
+
+    :param density: Density in kg/m^3, a single value or an array of values
+    :type density: float | np.ndarray
+    :raises OutOfRangeProperty: Raises an error if a value is outside of the table (275 to 1345 K)
+    :return: The temperature in Kelvin, an array if an array was supplied
+    :rtype: float | np.ndarray
+    
+    :Example:
+    
+    >>> from cheme_calculations.utility import water_T_from_density
+    >>> print(water_T_from_density(995.08))
+    >>> 305.0
+    """
+    return _invert_water_property(density, 'Density (kg/m3)')
@@ -0,0 +1,188 @@
+import numpy as np
+
+__all__ = ["mole_fractions", "mass_fractions", "mixture_average", "wilke_viscosity",
+           "wassiljewa_conductivity", "ideal_gas_density"]
+
+
+# Every function here takes a composition matrix of shape (streams x components), a
+# single stream can be passed as a 1D array. Per-component properties are either one
+# value per component, shape (components,), or one value per stream and component,
+# shape (streams x components), when the streams are at different temperatures.
+# Results are plain SI arrays with one value per stream so they can be passed
+# straight into reynolds, prandtl and schmidt.
+
+
+def _as_output(x: np.ndarray):
+    if x.ndim == 0:
+        return float(x)
+    return x
+
+
+def mole_fractions(amounts)-> np.ndarray:
+    """Normalises molar amounts or flows to mole fractions, row by row
+
+    :param amounts: Moles or molar flow rates of each component, (streams x components)
+    :type amounts: np.ndarray
+    :return: The mole fractions of each stream
+    :rtype: np.ndarray
+
+    :Example:
+
+    >>> from cheme_calculations.utility import mole_fractions
+    >>> print(mole_fractions([[1, 3], [2, 2]]))
+    >>> [[0.25 0.75]
+         [0.5  0.5 ]]
+    """
+    n = np.asarray(amounts, dtype=float)
+    return n/n.sum(axis=-1, keepdims=True)
+
+
+def mass_fractions(x, molecular_weights)-> np.ndarray:
+    """Converts mole fractions to mass fractions
+
+    :param x: Mole fractions, (streams x components)
+    :type x: np.ndarray
+    :param molecular_weights: Molecular weight of each component
+    :type molecular_weights: np.ndarray
+    :return: The mass fractions of each stream
+    :rtype: np.ndarray
+    """
+    mass = np.asarray(x, dtype=float)*np.asarray(molecular_weights, dtype=float)
+    return mass/mass.sum(axis=-1, keepdims=True)
+
+
+def mixture_average(x, values)-> float | np.ndarray:
+    """Mole (or mass) fraction weighted average of a property, the usual mixing rule
+    for molecular weight and ideal heat capacity
+
+    .. math:: \\theta_{mix} = \\sum_i x_i \\theta_i
+
+    NOTE: The fractions must be on the same basis as the property ie mole fractions
+    for a molar Cp and mass fractions for a Cp in J/kg*K
+
+    :param x: Fractions of each component, (streams x components)
+    :type x: np.ndarray
+    :param values: Property of each component
+    :type values: np.ndarray
+    :return: The mixture property of each stream
+    :rtype: float | np.ndarray
+
+    :Example:
+
+    >>> from cheme_calculations.utility import mixture_average
+    >>> x = np.array([[0.79, 0.21], [0.5, 0.5]])
+    >>> print(mixture_average(x, [28.014, 31.999]))
+    >>> [28.85085 30.0065 ]
+    """
+    return _as_output((np.asarray(x, dtype=float)*np.asarray(values, dtype=float)).sum(axis=-1))
+
+
+def _wilke_phi(mu: np.ndarray, molecular_weights: np.ndarray)-> np.ndarray:
+    # phi[..., i, j] for every pair of components
+    mu_ratio = mu[..., :, None]/mu[..., None, :]
+    m_ratio = molecular_weights[..., None, :]/molecular_weights[..., :, None]
+    return (1 + mu_ratio**0.5*m_ratio**0.25)**2/(8*(1 + 1/m_ratio))**0.5
+
+
+def _wilke_sum(x: np.ndarray, values: np.ndarray, phi: np.ndarray)-> np.ndarray:
+    denominator = np.einsum("...ij,...j->...i", phi, x)
+    return (x*values/denominator).sum(axis=-1)
+
+
+def wilke_viscosity(x, mu, molecular_weights)-> float | np.ndarray:
+    """Viscosity of a low pressure gas mixture using Wilke's mixing rule. The interaction
+    terms for every pair of components are built once and applied to all streams as a
+    single batched product.
+
+    .. math:: \\mu_{mix} = \\sum_i \\dfrac{x_i \\mu_i}{\\sum_j x_j \\phi_{ij}}
+
+    .. math:: \\phi_{ij} = \\dfrac{[1 + (\\mu_i/\\mu_j)^{1/2}(M_j/M_i)^{1/4}]^2}{[8(1 + M_i/M_j)]^{1/2}}
+
+    :param x: Mole fractions, (streams x components)
+    :type x: np.ndarray
+    :param mu: Viscosity of each pure component, any consistent units
+    :type mu: np.ndarray
+    :param molecular_weights: Molecular weight of each component
+    :type molecular_weights: np.ndarray
+    :return: The viscosity of each stream in the units of mu
+    :rtype: float | np.ndarray
+
+    :Example:
+
+    >>> from cheme_calculations.utility import wilke_viscosity
+    >>> # nitrogen and oxygen at 300 K, Pa*s
+    >>> mu = [1.79E-5, 2.07E-5]
+    >>> M = [28.014, 31.999]
+    >>> print(wilke_viscosity([0.79, 0.21], mu, M))
+    >>> 1.8489711799400548e-05
+
+    :Reference:
+
+    Poling, B. E., Prausnitz, J. M., & O'Connell, J. P. (2001). The Properties of Gases
+    and Liquids, 5th ed. McGraw-Hill.
+    """
+    x = np.asarray(x, dtype=float)
+    mu = np.asarray(mu, dtype=float)
+    phi = _wilke_phi(mu, np.asarray(molecular_weights, dtype=float))
+
+    return _as_output(_wilke_sum(x, mu, phi))
+
+
+def wassiljewa_conductivity(x, k, mu, molecular_weights)-> float | np.ndarray:
+    """Thermal conductivity of a low pressure gas mixture using the Wassiljewa equation
+    with the Mason and Saxena interaction terms (the same terms as Wilke's viscosity rule)
+
+    .. math:: k_{mix} = \\sum_i \\dfrac{x_i k_i}{\\sum_j x_j A_{ij}}
+
+    :param x: Mole fractions, (streams x components)
+    :type x: np.ndarray
+    :param k: Thermal conductivity of each pure component, any consistent units
+    :type k: np.ndarray
+    :param mu: Viscosity of each pure component, any consistent units
+    :type mu: np.ndarray
+    :param molecular_weights: Molecular weight of each component
+    :type molecular_weights: np.ndarray
+    :return: The thermal conductivity of each stream in the units of k
+    :rtype: float | np.ndarray
+
+    :Example:
+
+    >>> from cheme_calculations.utility import wassiljewa_conductivity
+    >>> # nitrogen and oxygen at 300 K, W/m*K and Pa*s
+    >>> k = [0.0259, 0.0267]
+    >>> mu = [1.79E-5, 2.07E-5]
+    >>> M = [28.014, 31.999]
+    >>> print(wassiljewa_conductivity([0.79, 0.21], k, mu, M))
+    >>> 0.026073411967388552
+    """
+    x = np.asarray(x, dtype=float)
+    A = _wilke_phi(np.asarray(mu, dtype=float), np.asarray(molecular_weights, dtype=float))
+
+    return _as_output(_wilke_sum(x, np.asarray(k, dtype=float), A))
+
+
+def ideal_gas_density(x, molecular_weights, temperature, pressure)-> float | np.ndarray:
+    """Mass density of an ideal gas mixture
+
+    .. math:: \\rho = \\dfrac{P \\sum_i x_i M_i}{RT}
+
+    :param x: Mole fractions, (streams x components)
+    :type x: np.ndarray
+    :param molecular_weights: Molecular weight of each component in g/mol
+    :type molecular_weights: np.ndarray
+    :param temperature: Temperature of each stream in Kelvin
+    :type temperature: float | np.ndarray
+    :param pressure: Pressure of each stream in Pa
+    :type pressure: float | np.ndarray
+    :return: The density of each stream in kg/m^3
+    :rtype: float | np.ndarray
+
+    :Example:
+
+    >>> from cheme_calculations.utility import ideal_gas_density
+    >>> print(ideal_gas_density([0.79, 0.21], [28.014, 31.999], 300, 101325))
+    >>> 1.1719788800787174
+    """
+    M = mixture_average(x, molecular_weights)
+    # g/mol to kg/mol
+    return _as_output(np.asarray(pressure)*np.asarray(M)/(1000*8.314462618*np.asarray(temperature)))
@@ -0,0 +1,307 @@
+from collections import namedtuple
+from typing import Callable
+import numpy as np
+
+__all__ = ["solve_ode", "ODESolution"]
+
+
+ODESolution = namedtuple(
+    'ODESolution', ["t", "y", "steps", "rejected", "success"]
+)
+
+# Dormand-Prince 5(4) tableau
+DP_C = np.array([0, 1/5, 3/10, 4/5, 8/9, 1, 1])
+DP_A = [np.array([]),
+        np.array([1/5]),
+        np.array([3/40, 9/40]),
+        np.array([44/45, -56/15, 32/9]),
+        np.array([19372/6561, -25360/2187, 64448/6561, -212/729]),
+        np.array([9017/3168, -355/33, 46732/5247, 49/176, -5103/18656]),
+        np.array([35/384, 0, 500/1113, 125/192, -2187/6784, 11/84])]
+# fifth order weights minus the embedded fourth order weights
+DP_E = np.array([71/57600, 0, -71/16695, 71/1920, -17253/339200, 22/525, -1/40])
+# fourth order continuous extension, y(t + theta*h) = y + h*sum(K_i*P_i.[theta, theta^2, theta^3, theta^4])
+DP_P = np.array([
+    [1, -8048581381/2820520608, 8663915743/2820520608, -12715105075/11282082432],
+    [0, 0, 0, 0],
+    [0, 131558114200/32700410799, -68118460800/10900136933, 87487479700/32700410799],
+    [0, -1754552775/470086768, 14199869525/1410260304, -10690763975/1880347072],
+    [0, 127303824393/49829197408, -318862633887/49829197408, 701980252875/199316789632],
+    [0, -282668133/205662961, 2019193451/616988883, -1453857185/822651844],
+    [0, 40617522/29380423, -110615467/29380423, 69997945/29380423]])
+
+# Rosenbrock 2(3) constants of Shampine and Reichelt's ode23s
+ROS_D = 1/(2 + np.sqrt(2))
+ROS_E32 = 6 + np.sqrt(2)
+
+
+def _rms(x: np.ndarray)-> np.ndarray:
+    return np.sqrt(np.mean(x**2, axis=-1))
+
+
+def _initial_step(f: Callable, t: np.ndarray, y: np.ndarray, f0: np.ndarray, direction: float,
+                  order: int, rtol: float, atol: float)-> np.ndarray:
+    # Hairer, Norsett and Wanner's starting step, one per trajectory
+    scale = atol + rtol*np.abs(y)
+    d0 = _rms(y/scale)
+    d1 = _rms(f0/scale)
+    h0 = np.where((d0 < 1E-5) | (d1 < 1E-5), 1E-6, 0.01*d0/np.maximum(d1, 1E-300))
+    f1 = f(t + direction*h0, y + direction*h0[:, None]*f0)
+    d2 = _rms((f1 - f0)/scale)/h0
+    h1 = np.where(np.maximum(d1, d2) <= 1E-15, np.maximum(1E-6, h0*1E-3),
+                  (0.01/np.maximum(np.maximum(d1, d2), 1E-300))**(1/(order + 1)))
+    return np.minimum(100*h0, h1)
+
+
+def _jacobian(f: Callable, t: np.ndarray, y: np.ndarray, f0: np.ndarray)-> np.ndarray:
+    # forward differences, one column of every trajectory's jacobian per call
+    k, n = y.shape
+    J = np.empty((k, n, n))
+    delta = np.sqrt(np.finfo(float).eps)*np.maximum(np.abs(y), 1)
+    for j in range(n):
+        shifted = y.copy()
+        shifted[:, j] += delta[:, j]
+        J[:, :, j] = (f(t, shifted) - f0)/delta[:, j, None]
+    return J
+
+
+def _dense_output(out: np.ndarray, t_eval: np.ndarray, t_old: np.ndarray, h: np.ndarray,
+                  trajectories: np.ndarray, interpolate: Callable, direction: float):
+    # fill every output time in (t_old, t_old + h] of each accepted step
+    lo = np.minimum(t_old, t_old + h)[:, None]
+    hi = np.maximum(t_old, t_old + h)[:, None]
+    inside = (t_eval > lo) & (t_eval <= hi) if direction > 0 else (t_eval >= lo) & (t_eval < hi)
+    rows, points = np.nonzero(inside)
+    if len(rows):
+        theta = (t_eval[points] - t_old[rows])/h[rows]
+        out[trajectories[rows], points] = interpolate(rows, theta[:, None])
+
+
+def _dormand_prince(f, t0, t1, y0, t_eval, rtol, atol, max_step, max_steps):
+    m, n = y0.shape
+    direction = 1.0 if t1 >= t0 else -1.0
+    t = np.full(m, float(t0))
+    y = y0.copy()
+    fy = f(t, y)
+    h = _initial_step(f, t, y, fy, direction, 4, rtol, atol)
+    out = np.full((m, len(t_eval), n), np.nan)
+    out[:, t_eval == t0] = y0[:, None, :]
+    steps = np.zeros(m, dtype=int)
+    rejected = np.zeros(m, dtype=int)
+    active = np.ones(m, dtype=bool)
+    while active.any():
+        # every trajectory goes through f so per trajectory parameters line up, finished
+        # ones take a zero step
+        hi = np.where(active, np.minimum(np.minimum(h, max_step), np.abs(t1 - t)), 0)*direction
+
+        K = np.empty((7, m, n))
+        K[0] = fy
+        for s in range(1, 7):
+            increment = np.tensordot(DP_A[s], K[:s], axes=(0, 0))
+            K[s] = f(t + DP_C[s]*hi, y + hi[:, None]*increment)
+        y_new = y + hi[:, None]*np.tensordot(DP_A[6], K[:6], axes=(0, 0))
+        error = hi[:, None]*np.tensordot(DP_E, K, axes=(0, 0))
+        scale = atol + rtol*np.maximum(np.abs(y), np.abs(y_new))
+        norm = _rms(error/scale)
+        accepted = np.isfinite(norm) & (norm <= 1)
+
+        # step size control, never growing after a rejection
+        with np.errstate(divide="ignore"):
+            factor = np.clip(0.9*norm**-0.2, 0.2, 10)
+        factor = np.where(np.isfinite(norm), factor, 0.2)
+        factor = np.where(accepted, factor, np.minimum(factor, 1))
+        h = np.where(active, np.abs(hi)*factor, h)
+        rejected[active & ~accepted] += 1
+
+        done = np.flatnonzero(active & accepted)
+        if len(done):
+            y_old, K_done, step = y[done], K[:, done], hi[done]
+
+            def continuous(rows, theta):
+                powers = theta**np.arange(1, 5)
+                weights = powers @ DP_P.T
+                return y_old[rows] + step[rows, None]*np.einsum("rk,krn->rn", weights, K_done[:, rows])
+
+            _dense_output(out, t_eval, t[done], step, done, continuous, direction)
+            t[done] = t[done] + step
+            y[done] = y_new[done]
+            fy[done] = K[6][done]
+            steps[done] += 1
+            finished = np.abs(t1 - t[done]) <= 1E-12*max(abs(t1), abs(t0), 1)
+            active[done[finished]] = False
+
+        too_small = np.abs(h) < 1E-14*np.maximum(np.abs(t), 1)
+        active &= (steps + rejected < max_steps) & ~too_small
+
+    success = np.abs(t1 - t) <= 1E-12*max(abs(t1), abs(t0), 1)
+    return out, steps, rejected, success
+
+
+def _dense_solver(J: np.ndarray, h: np.ndarray)-> Callable:
+    # solves (I - h J) x = rhs for every trajectory with batched LU
+    W = np.eye(J.shape[-1]) - h[:, None, None]*J
+
+    def solve(rhs):
+        return np.linalg.solve(W, rhs[..., None])[..., 0]
+    return solve
+
+
+def _rosenbrock(f, t0, t1, y0, t_eval, rtol, atol, max_step, max_steps, jacobian, linear_solver):
+    m, n = y0.shape
+    direction = 1.0 if t1 >= t0 else -1.0
+    t = np.full(m, float(t0))
+    y = y0.copy()
+    fy = f(t, y)
+    h = _initial_step(f, t, y, fy, direction, 2, rtol, atol)
+    out = np.full((m, len(t_eval), n), np.nan)
+    out[:, t_eval == t0] = y0[:, None, :]
+    steps = np.zeros(m, dtype=int)
+    rejected = np.zeros(m, dtype=int)
+    active = np.ones(m, dtype=bool)
+    linear_solver = _dense_solver if linear_solver is None else linear_solver
+    # the jacobian of each trajectory is kept through rejected steps, it only changes when y does
+    J = None
+    dfdt = np.empty((m, n))
+    current = np.zeros(m, dtype=bool)
+    while active.any():
+        hi = np.where(active, np.minimum(np.minimum(h, max_step), np.abs(t1 - t)), 0)*direction
+
+        stale = active & ~current
+        if stale.any():
+            J_new = jacobian(t, y) if jacobian is not None else _jacobian(f, t, y, fy)
+            delta = np.sqrt(np.finfo(float).eps)*np.maximum(np.abs(t), 1)
+            dfdt_new = (f(t + delta, y) - fy)/delta[:, None]
+            if J is None:
+                J = np.empty_like(J_new)
+            J[stale] = J_new[stale]
+            dfdt[stale] = dfdt_new[stale]
+            current |= stale
+
+        T = (hi*ROS_D)[:, None]*dfdt
+
+        with np.errstate(all="ignore"):
+            solve = linear_solver(J, hi*ROS_D)
+            k1 = solve(fy + T)
+            F1 = f(t + hi/2, y + hi[:, None]/2*k1)
+            k2 = solve(F1 - k1) + k1
+            y_new = y + hi[:, None]*k2
+            F2 = f(t + hi, y_new)
+            k3 = solve(F2 - ROS_E32*(k2 - F1) - 2*(k1 - fy) + T)
+            error = hi[:, None]/6*(k1 - 2*k2 + k3)
+            scale = atol + rtol*np.maximum(np.abs(y), np.abs(y_new))
+            norm = _rms(error/scale)
+        accepted = np.isfinite(norm) & (norm <= 1)
+
+        with np.errstate(divide="ignore"):
+            factor = np.clip(0.8*norm**(-1/3), 0.2, 5)
+        factor = np.where(np.isfinite(norm), factor, 0.2)
+        factor = np.where(accepted, factor, np.minimum(factor, 1))
+        h = np.where(active, np.abs(hi)*factor, h)
+        rejected[active & ~accepted] += 1
+
+        done = np.flatnonzero(active & accepted)
+        if len(done):
+            y_old, k1a, k2a, step = y[done], k1[done], k2[done], hi[done]
+
+            def continuous(rows, theta):
+                s = step[rows, None]
+                return y_old[rows] + s*(theta*(1 - theta)/(1 - 2*ROS_D)*k1a[rows]
+                                        + theta*(theta - 2*ROS_D)/(1 - 2*ROS_D)*k2a[rows])
+
+            _dense_output(out, t_eval, t[done], step, done, continuous, direction)
+            t[done] = t[done] + step
+            y[done] = y_new[done]
+            fy[done] = F2[done]
+            steps[done] += 1
+            finished = np.abs(t1 - t[done]) <= 1E-12*max(abs(t1), abs(t0), 1)
+            active[done[finished]] = False
+            current[done] = False
+
+        too_small = np.abs(h) < 1E-14*np.maximum(np.abs(t), 1)
+        active &= (steps + rejected < max_steps) & ~too_small
+
+    success = np.abs(t1 - t) <= 1E-12*max(abs(t1), abs(t0), 1)
+    return out, steps, rejected, success
+
+
+def solve_ode(f: Callable, t_span: tuple, y0: np.ndarray, t_eval: np.ndarray=None,
+              method: str="rk45", rtol: float=1E-6, atol: float=1E-9, max_step: float=np.inf,
+              max_steps: int=100000, jacobian: Callable=None, linear_solver: Callable=None)-> ODESolution:
+    """Integrates a system of ordinary differential equations dy/dt = f(t, y) with
+    adaptive step sizes, for one trajectory or many at once.
+
+    Passing y0 with one row per trajectory integrates all of them together, every
+    trajectory keeps its own time and step size but f is called once for all of them
+    (the rows are always in the order of y0, trajectories that have finished take zero
+    steps), so sweeps over initial conditions or parameters cost about as many calls to
+    f as a single trajectory.
+
+    Methods:
+
+    - "rk45": the explicit Dormand-Prince 5(4) pair, for non stiff problems
+    - "stiff": the linearly implicit Rosenbrock 2(3) pair of ode23s, L-stable for stiff
+      problems ie fast and slow reactions together, the jacobian is found by finite
+      differences unless one is given
+
+    The solution at t_eval comes from the continuous extension of each step.
+
+    :param f: The right hand side, f(t, y) with t of shape (k,) and y of shape (k, n)
+        returns dy/dt of shape (k, n)
+    :type f: Callable
+    :param t_span: The (start, end) of the integration
+    :type t_span: tuple
+    :param y0: The initial values (n,) or one row per trajectory (trajectories, n)
+    :type y0: np.ndarray
+    :param t_eval: The times to return the solution at, defaults to None for 101 evenly spaced times
+    :type t_eval: np.ndarray, optional
+    :param method: "rk45" or "stiff", defaults to "rk45"
+    :type method: str, optional
+    :param rtol: The relative tolerance, defaults to 1E-6
+    :type rtol: float, optional
+    :param atol: The absolute tolerance, defaults to 1E-9
+    :type atol: float, optional
+    :param max_step: The largest step allowed, defaults to np.inf
+    :type max_step: float, optional
+    :param max_steps: The most steps (accepted and rejected) for each trajectory, defaults to 100000
+    :type max_steps: int, optional
+    :param jacobian: The jacobian of f, jacobian(t, y) returns shape (k, n, n), only used by "stiff", defaults to None
+    :type jacobian: Callable, optional
+    :param linear_solver: For jacobians that are not dense arrays ie sparse matrices, jacobian(t, y)
+        then returns an object array (k,) of matrices and linear_solver(J, h) returns a function
+        solving (I - h[i] J[i]) x[i] = rhs[i] for every trajectory, only used by "stiff", defaults
+        to None for dense LU
+    :type linear_solver: Callable, optional
+    :raises ValueError: Raises an error if the method is unknown
+    :return: The output times, the solution (points, n) or (trajectories, points, n), the accepted and
+        rejected steps and whether each trajectory reached the end
+    :rtype: ODESolution
+
+    :Example:
+
+    >>> from cheme_calculations.utility import solve_ode
+    >>> # A -> B with k = 0.5, 1 and 2
+    >>> k = np.array([0.5, 1, 2])
+    >>> def f(t, y):
+    ...     return np.column_stack([-k*y[:, 0], k*y[:, 0]])
+    >>> solution = solve_ode(f, (0, 2), np.tile([1.0, 0.0], (3, 1)), t_eval=[0, 1, 2])
+    >>> print(solution.y[:, -1, 0])
+    >>> [0.36787944 0.13533528 0.01831564]
+    """
+    if method not in ("rk45", "stiff"):
+        raise ValueError(f"Unknown method {method}, use rk45 or stiff")
+
+    t0, t1 = (float(x) for x in t_span)
+    y0 = np.asarray(y0, dtype=float)
+    single = y0.ndim == 1
+    y0 = np.atleast_2d(y0)
+    t_eval = np.linspace(t0, t1, 101) if t_eval is None else np.asarray(t_eval, dtype=float)
+
+    if method == "rk45":
+        y, steps, rejected, success = _dormand_prince(f, t0, t1, y0, t_eval, rtol, atol, max_step, max_steps)
+    else:
+        y, steps, rejected, success = _rosenbrock(f, t0, t1, y0, t_eval, rtol, atol, max_step, max_steps, jacobian,
+                                                    linear_solver)
+
+    if single:
+        return ODESolution(t_eval, y[0], int(steps[0]), int(rejected[0]), bool(success[0]))
+    return ODESolution(t_eval, y, steps, rejected, success)
@@ -0,0 +1,126 @@
+import os
+from typing import Callable
+import numpy as np
+
+__all__ = ["SurrogateTable"]
+
+
+class SurrogateTable:
+    """Interpolating table that stands in for an expensive two variable property
+    function, ie Z(Tr, Pr) from an iterative equation of state.
+
+    The table is built the first time it is used by evaluating the exact function on
+    the grid, and is saved to ``cache_path`` (if given) so later sessions load it instead
+    of rebuilding. A ``read_only`` cache is only loaded, if it is missing or was built on
+    a different grid the table is built in memory and the file is left alone. Queries inside the grid are answered by bilinear interpolation,
+    queries outside of it fall back to the exact function.
+
+    While building, the exact function is also evaluated at the centre of every cell
+    and the largest difference from the interpolated value is stored as ``error_bound``.
+    This is an estimate, refine the grid where the function has sharp features ie
+    across a phase boundary.
+
+    NOTE: The cached file is only checked against the grid, delete it if the function
+    it was built from changes
+
+    :param func: The exact function, f(x, y) -> float
+    :type func: Callable
+    :param x_grid: Strictly increasing grid points for the first argument
+    :type x_grid: np.ndarray
+    :param y_grid: Strictly increasing grid points for the second argument
+    :type y_grid: np.ndarray
+    :param cache_path: Path of a .npz file to persist the table to, defaults to None
+    :type cache_path: str, optional
+    :param vectorized: Whether func accepts arrays, otherwise it is called point by point, defaults to False
+    :type vectorized: bool, optional
+    :param read_only: Whether the cache is never written, ie a table shipped with a package, defaults to False
+    :type read_only: bool, optional
+
+    :Example:
+
+    >>> from cheme_calculations.utility import SurrogateTable
+    >>> from cheme_calculations.thermodynamics import soave_rendlich_kwong
+    >>> def z(Tr, Pr):
+    ...     return soave_rendlich_kwong(Temperature(Tr, "K"), Pressure(Pr, "Pa"), Temperature(1, "K"),
+    ...                                 Pressure(1, "Pa"), "vapor", 0.152, 50)
+    >>> table = SurrogateTable(z, np.linspace(1.2, 3, 50), np.linspace(0.01, 1, 50), "srk_propane.npz")
+    >>> print(table(1.5, 0.5))
+    >>> 0.9634433086744909
+    >>> print(table.error_bound)
+    >>> 0.0005218553899625222
+    """
+    def __init__(self, func: Callable, x_grid: np.ndarray, y_grid: np.ndarray,
+                 cache_path: str=None, vectorized: bool=False, read_only: bool=False):
+        self.x_grid = np.asarray(x_grid, dtype=float)
+        self.y_grid = np.asarray(y_grid, dtype=float)
+        if np.any(np.diff(self.x_grid) <= 0) or np.any(np.diff(self.y_grid) <= 0):
+            raise ValueError("The grid points must be strictly increasing")
+
+        self.cache_path = cache_path
+        self.read_only = read_only
+        self._exact = func if vectorized else np.vectorize(func, otypes=[float])
+        self.values = None
+        self.error_bound = None
+
+    def build(self):
+        """Evaluates the exact function on the grid (or loads the cached table) and
+        estimates the interpolation error. Called automatically on first use.
+        """
+        if self.cache_path and os.path.exists(self.cache_path):
+            with np.load(self.cache_path, allow_pickle=False) as cached:
+                if np.array_equal(cached["x_grid"], self.x_grid) and np.array_equal(cached["y_grid"], self.y_grid):
+                    self.values = cached["values"]
+                    self.error_bound = float(cached["error_bound"])
+                    return
+
+        X, Y = np.meshgrid(self.x_grid, self.y_grid, indexing="ij")
+        self.values = np.asarray(self._exact(X, Y), dtype=float)
+
+        # compare against the exact function where the interpolation is worst
+        x_mid = (self.x_grid[:-1] + self.x_grid[1:])/2
+        y_mid = (self.y_grid[:-1] + self.y_grid[1:])/2
+        X_mid, Y_mid = np.meshgrid(x_mid, y_mid, indexing="ij")
+        exact = np.asarray(self._exact(X_mid, Y_mid), dtype=float)
+        self.error_bound = float(np.max(np.abs(self._interpolate(X_mid, Y_mid) - exact)))
+
+        if self.cache_path and not self.read_only:
+            self.save(self.cache_path)
+
+    def save(self, path: str):
+        """Writes the table to a .npz file that can be given as ``cache_path`` later
+
+        :param path: The path of the file
+        :type path: str
+        """
+        if self.values is None:
+            self.build()
+        np.savez_compressed(path, x_grid=self.x_grid, y_grid=self.y_grid,
+                            values=self.values, error_bound=self.error_bound)
+
+    def _interpolate(self, x: np.ndarray, y: np.ndarray)-> np.ndarray:
+        i = np.clip(np.searchsorted(self.x_grid, x, side="right") - 1, 0, len(self.x_grid) - 2)
+        j = np.clip(np.searchsorted(self.y_grid, y, side="right") - 1, 0, len(self.y_grid) - 2)
+
+        tx = (x - self.x_grid[i])/(self.x_grid[i+1] - self.x_grid[i])
+        ty = (y - self.y_grid[j])/(self.y_grid[j+1] - self.y_grid[j])
+
+        v = self.values
+        return ((1 - tx)*(1 - ty)*v[i, j] + tx*(1 - ty)*v[i+1, j]
+                + (1 - tx)*ty*v[i, j+1] + tx*ty*v[i+1, j+1])
+
+    def __call__(self, x, y)-> float | np.ndarray:
+        if self.values is None:
+            self.build()
+
+        x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+        inside = ((x >= self.x_grid[0]) & (x <= self.x_grid[-1])
+                  & (y >= self.y_grid[0]) & (y <= self.y_grid[-1]))
+
+        result = np.empty(x.shape)
+        result[inside] = self._interpolate(x[inside], y[inside])
+        if not inside.all():
+            result[~inside] = self._exact(x[~inside], y[~inside])
+
+        if result.ndim == 0:
+            return float(result)
+        return result
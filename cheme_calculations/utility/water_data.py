@@ -2283,4 +2283,15 @@ WATER_PROPERTIES = {275.0: {'Cp (J/g*K)': 4.2135,
           'Sound Spd. (m/s)': 1048.6,
           'Therm. Cond. (W/m*K)': 'undefined',
           'Viscosity (uPa*s)': 'undefined',
-          'Volume (m3/kg)': 9.0872}}
\ No newline at end of file
+          'Volume (m3/kg)': 9.0872}}
+
+# saturated liquid at 1 atm, the table above jumps straight from 365 K liquid to
+# the 373.12 K saturated vapor so this is needed to close the liquid branch
+# found here https://webbook.nist.gov
+WATER_SATURATION_TEMPERATURE = 373.12
+
+WATER_SATURATED_LIQUID = {'Density (kg/m3)': 958.35,
+                          'Enthalpy (kJ/kg)': 419.17,
+                          'Entropy (J/g*K)': 1.3072,
+                          'Phase': 'liquid',
+                          'Pressure (MPa)': 0.10132}
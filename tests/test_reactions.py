@@ -0,0 +1,488 @@
+import numpy as np
+import pytest
+from pytest import approx
+
+from cheme_calculations.reactions import balance_equation, balance_equations, independent_reactions, parse_formula, ELEMENT_INDEX, ReactionNetwork, SparseMatrix, molecular_weight, integral_method, \
+    fit_kinetics, fit_kinetics_batch, fit_arrhenius_kinetics, arrhenius, arrhenius_k, fit_arrhenius, \
+    batch_reactor, pfr, semibatch_reactor, cstr_volume_from_data, pfr_volume_from_data, optimal_cstr_series, levenspiel_curve, \
+    ReactorFlowsheet, Mechanism, gibbs_equilibrium, element_matrix
+from cheme_calculations.reactions.kinetic_fitting import _integrated_rate_law
+from cheme_calculations.reactions.reaction_parameters import _t_quantile
+from cheme_calculations.units import MolecularWeight
+from cheme_calculations.units.reactions import ActivationEnergy, KineticConstant
+from cheme_calculations.units.units import Amount, MultiUnit, Pressure, Temperature, Time, Volume
+from cheme_calculations.units import Concentration, VolumetricFlowrate
+from cheme_calculations.units.reactions import MolarFlowRate, ReactionRate
+from cheme_calculations.reactions.balance import ImproperChemicalEquation, MultipleIndependentReactions
+from cheme_calculations.reactions.formula import InvalidFormula, InvalidParentheses
+from cheme_calculations.reactions.network import NotConverged
+
+
+def test_balance_equation():
+    assert(balance_equation("Al + O2 -> Al2O3") == "4.0 Al + 3.0 O2 -> 2.0 Al2O3")
+    assert(balance_equation("KI + Pb(NO3)2 -> KNO3 + PbI2") == "2.0 KI + 1.0 Pb(NO3)2 -> 2.0 KNO3 + 1.0 PbI2")
+    assert(balance_equation("H3PO4 + (NH4)2MoO4 + HNO3 -> (NH4)3PO4Mo12O36 + NH4NO3 + H2O") 
+           == "1.0 H3PO4 + 12.0 (NH4)2MoO4 + 21.0 HNO3 -> 1.0 (NH4)3PO4Mo12O36 + 21.0 NH4NO3 + 12.0 H2O")
+    assert(balance_equation("K4Fe(CN)6 + KMnO4 + H2SO4 -> KHSO4 + Fe2(SO4)3 + MnSO4 + HNO3 + CO2 + H2O")
+           == "10.0 K4Fe(CN)6 + 122.0 KMnO4 + 299.0 H2SO4 -> 162.0 KHSO4 + 5.0 Fe2(SO4)3 + 122.0 MnSO4 + 60.0 HNO3 + 60.0 CO2 + 188.0 H2O")
+    
+def test_balance_equation_errors():
+    with pytest.raises(ImproperChemicalEquation):
+        balance_equation("NaCl -> Na2 + O2")
+    with pytest.raises(MultipleIndependentReactions):
+        balance_equation("C + O2 -> CO + CO2")
+    
+def test_independent_reactions():
+    assert(independent_reactions("C + O2 -> CO + CO2") == ["2.0 C + 1.0 O2 -> 2.0 CO", "1.0 C + 1.0 O2 -> 1.0 CO2"])
+    assert(independent_reactions("Al + O2 -> Al2O3") == ["4.0 Al + 3.0 O2 -> 2.0 Al2O3"])
+
+def _atoms(formula):
+    parsed = parse_formula(formula)
+    return {element: int(parsed.counts[i]) for element, i in ELEMENT_INDEX.items() if parsed.counts[i]}
+
+def test_parse_formula():
+    assert(_atoms("H2O") == {"H": 2, "O": 1})
+    assert(_atoms("C12H22O11") == {"C": 12, "H": 22, "O": 11})
+    assert(_atoms("Ca3(PO4)2") == {"Ca": 3, "P": 2, "O": 8})
+    assert(_atoms("K4[Fe(CN)6]") == {"K": 4, "Fe": 1, "C": 6, "N": 6})
+    assert(_atoms("CuSO4·5H2O") == {"Cu": 1, "S": 1, "O": 9, "H": 10})
+    assert(_atoms("Na2CO3.10H2O") == _atoms("Na2CO3*10H2O"))
+    
+def test_parse_formula_charge_and_isotopes():
+    assert(parse_formula("SO4^2-").charge == -2)
+    assert(parse_formula("Fe^3+").charge == 3)
+    assert(parse_formula("Fe+++").charge == 3)
+    assert(parse_formula("NH4+").charge == 1)
+    assert(parse_formula("H2O").charge == 0)
+    assert(parse_formula("[13C]O2").isotopes == (("C", 13, 1),))
+    assert(_atoms("[13C]O2") == {"C": 1, "O": 2})
+    assert(parse_formula("D2O").isotopes == (("H", 2, 2),))
+    
+def test_parse_formula_errors():
+    with pytest.raises(InvalidParentheses):
+        parse_formula("Ca3(PO4")
+    with pytest.raises(InvalidParentheses):
+        parse_formula("Ca3PO4)2")
+    with pytest.raises(InvalidFormula):
+        parse_formula("Xx2O")
+    with pytest.raises(InvalidFormula):
+        parse_formula("")
+        
+def test_balance_ionic_equation():
+    assert(balance_equation("MnO4^- + Fe^2+ + H+ -> Mn^2+ + Fe^3+ + H2O")
+           == "1.0 MnO4^- + 5.0 Fe^2+ + 8.0 H+ -> 1.0 Mn^2+ + 5.0 Fe^3+ + 4.0 H2O")
+    assert(balance_equation("CuSO4·5H2O -> CuSO4 + H2O") == "1.0 CuSO4·5H2O -> 1.0 CuSO4 + 5.0 H2O")
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_balance_equations(workers):
+    equations = ["Al + O2 -> Al2O3", "C + O2 -> CO + CO2", "NaCl -> Na2 + O2", "Xx -> Y", "Al + O2"]*3
+    results = list(balance_equations(iter(equations), workers=workers, chunksize=2))
+    assert([x.equation for x in results] == equations)
+    assert([x.status for x in results[:5]] == ["balanced", "multiple", "unbalanceable", "invalid", "invalid"])
+    assert(results[0].reactants == ("Al", "O2"))
+    assert(results[0].products == ("Al2O3",))
+    assert(results[0].coefficients == (4, 3, 2))
+    assert(results[1].coefficients is None)
+
+def test_sparse_matrix():
+    rng = np.random.default_rng(0)
+    A = rng.random((30, 20))*(rng.random((30, 20)) < 0.2)
+    rows, cols = np.nonzero(A)
+    S = SparseMatrix.from_triplets(rows, cols, A[rows, cols], A.shape)
+    x = rng.random((20, 3))
+    assert(S.toarray() == approx(A))
+    assert(S.T.toarray() == approx(A.T))
+    assert(S @ x == approx(A @ x))
+    assert(S @ x[:, 0] == approx(A @ x[:, 0]))
+    assert(x.T @ S.T == approx(x.T @ A.T))
+    
+def test_reaction_network():
+    network = ReactionNetwork(["2 C + O2 -> 2 CO", "C + O2 -> CO2", "2 CO + O2 -> 2 CO2"])
+    assert(network.species == ("C", "O2", "CO", "CO2"))
+    assert(network.elements == ("C", "O"))
+    assert(network.stoichiometry.toarray() == approx(np.array([[-2, -1, 2, 0], [-1, -1, 0, 1], [0, -1, -2, 2]])))
+    assert(network.rank == 2)
+    assert(network.independent_reactions() == [0, 1])
+    assert(network.is_balanced)
+    assert(network.moles([10, 10, 0, 0], [2, 3, 0]) == approx([3, 5, 4, 3]))
+    extents = np.array([[2, 3, 0], [1, 1, 1]])
+    assert(network.changes(extents) == approx(extents @ network.stoichiometry.toarray()))
+    final = network.moles([10, 10, 0, 0], extents)
+    assert(network.moles([10, 10, 0, 0], network.extents([10, 10, 0, 0], final)) == approx(final))
+    
+    # more reactions than species with a repeated reaction ahead of an independent one
+    network = ReactionNetwork(["A -> B", "2 A -> 2 B", "B -> A", "A -> C", "B -> C"], formulas=False)
+    assert(network.rank == 2)
+    assert(network.independent_reactions() == [0, 3])
+    N = network.stoichiometry.toarray()
+    smallest = np.linalg.lstsq(N.T, [-0.5, 0.2, 0.3], rcond=None)[0]
+    assert(network.extents([1, 0, 0], [0.5, 0.2, 0.3]) == approx(smallest))
+    
+def test_reaction_network_balance():
+    network = ReactionNetwork(["H2 + O2 -> H2O", "MnO4^- + 5 Fe^2+ + 8 H+ -> Mn^2+ + 5 Fe^3+ + 4 H2O",
+                               balance_equation("Al + O2 -> Al2O3")])
+    assert(network.elements == ("H", "O", "Al", "Mn", "Fe", "charge"))
+    assert(network.unbalanced() == [0])
+    assert(network.atom_balance()[0] == approx([0, -1, 0, 0, 0, 0]))
+
+def test_molecular_weight():
+    g_mol = MolecularWeight(1, "g/mol")
+    assert(molecular_weight("H2O")/g_mol == approx(18.015))
+    assert(molecular_weight("C3H6O").convert_to("kg/mol")/MolecularWeight(1, "kg/mol") == approx(0.05808))
+    assert(molecular_weight("CuSO4·5H2O")/g_mol == approx(249.677))
+    assert(molecular_weight("D2O")/g_mol == approx(20.0272, abs=1E-4))
+    assert(isinstance(molecular_weight("H2O"), MolecularWeight))
+    weights = molecular_weight(["H2O", "CO2", "Ca3(PO4)2", "D2O"])/g_mol
+    assert(weights[:3] == approx([18.015, 44.009, 310.174]))
+    assert(weights[3] == approx(molecular_weight("D2O")/g_mol))
+
+def test_integral_method():
+    ans = integral_method([0, 10, 20, 30, 40], [0.624, 0.446, 0.318, 0.224, 0.164], (0, 4, .5))
+    assert(ans.order == approx(1))
+    assert(ans.r_squared == approx(0.9997228295541076))
+    
+def test_integral_method_batched():
+    # every order is tested on the raw data, not the previous order's transform
+    t = np.linspace(0, 50, 20)
+    C = np.array([1/(1 + 0.05*t), 1 - 0.015*t, (1 + 0.01*t)**-2])
+    ans = integral_method(t, C, (0, 3, 1E-3))
+    assert(ans.order == approx([2, 0, 1.5], abs=1E-6))
+    assert(ans.r_squared == approx([1, 1, 1]))
+    assert(integral_method(t, C[2], np.array([0.5, 1.5, 2.5])).order == approx(1.5))
+
+def test_t_quantile():
+    assert([_t_quantile(0.95, dof) for dof in (1, 5, 30)] == approx([12.7062, 2.5706, 2.0423], abs=1E-4))
+    
+def test_fit_kinetics():
+    t = np.linspace(0, 60, 15)
+    c = _integrated_rate_law(t, 1.2, 0.02, 1.6)[0]
+    fit = fit_kinetics(t, c)
+    assert(fit.converged)
+    assert([fit.order, fit.k, fit.c0] == approx([1.6, 0.02, 1.2]))
+    
+    noisy = c*(1 + 0.01*np.random.default_rng(1).standard_normal(len(t)))
+    fit = fit_kinetics(t, noisy)
+    assert(abs(fit.order - 1.6) < fit.order_error)
+    assert(abs(fit.k - 0.02) < fit.k_error)
+    assert(fit.r_squared > 0.99)
+    
+    fixed = fit_kinetics(t, noisy, order=2)
+    assert(fixed.order == 2)
+    assert(fixed.order_error == 0)
+    
+def test_fit_kinetics_batch():
+    t = np.linspace(0, 60, 15)
+    ks = [0.01, 0.02, 0.03, 0.04, 0.05]
+    datasets = [(t, _integrated_rate_law(t, 1.0, k, 1.5)[0]) for k in ks]
+    table = fit_kinetics_batch(datasets, workers=1)
+    assert(table.k == approx(ks))
+    assert(table.order == approx([1.5]*5))
+    assert(fit_kinetics_batch(datasets, workers=2, chunksize=2).k == approx(table.k))
+    
+def test_fit_arrhenius_kinetics():
+    T = np.array([300, 320, 340, 360])
+    ks = 5E6*np.exp(-50000/(8.314462618*T))
+    times = [np.linspace(0, 3/k, 12) for k in ks]
+    values = [_integrated_rate_law(t, 1.0, k, 1.5)[0] for t, k in zip(times, ks)]
+    fit = fit_arrhenius_kinetics(times, values, T)
+    assert(fit.converged)
+    assert([fit.order, fit.A, fit.Ea] == approx([1.5, 5E6, 50000], rel=1E-6))
+    assert(fit.c0 == approx([1, 1, 1, 1]))
+
+def test_arrhenius_k():
+    T = np.linspace(300, 400, 5)
+    k = arrhenius_k(Temperature(T, "K"), 1E19, ActivationEnergy(89, "kJ/mol"))
+    assert(isinstance(k, KineticConstant))
+    assert(k/KineticConstant(1, "s^-1") == approx(1E19*np.exp(-89000/(8.314462618*T))))
+    single = arrhenius(1, 1E19, ActivationEnergy(89000, "J/mol"), MultiUnit(8.314462618, "J/mol*K"), Temperature(350, "K"))
+    assert(arrhenius_k(350, 1E19, 89000)/KineticConstant(1, "s^-1") == approx(single/KineticConstant(1, "s^-1")))
+    
+def test_fit_arrhenius():
+    T = np.array([300, 320, 340, 360])
+    k = 5E6*np.exp(-50000/(8.314462618*T))
+    fit = fit_arrhenius(T, k)
+    assert(fit.A == approx(5E6))
+    assert(fit.Ea/ActivationEnergy(1, "J/mol") == approx(50000))
+    assert(fit.r_squared == approx(1))
+    
+    noisy = k*np.exp(0.05*np.array([1, -1, -1, 1]))
+    fit = fit_arrhenius(Temperature(T, "K"), KineticConstant(noisy, "s^-1"))
+    assert(abs(fit.Ea/ActivationEnergy(1, "J/mol") - 50000) < fit.Ea_error/ActivationEnergy(1, "J/mol"))
+    
+    batch = fit_arrhenius(T, np.vstack([k, 2*k]))
+    assert(batch.A == approx([5E6, 1E7]))
+
+def test_batch_reactor():
+    # A -> B -> C against the analytic solution
+    def rates(C, T):
+        return np.column_stack([0.1*C[:, 0], 0.05*C[:, 1]])
+    solution = batch_reactor(rates, [[-1, 1, 0], [0, -1, 1]], Concentration(np.array([1000, 0, 0]), "mol/m^3"),
+                             Time(1, "min"), Temperature(300, "K"))
+    C = solution.concentrations/Concentration(1, "mol/m^3")
+    A = 1000*np.exp(-0.1*60)
+    B = 1000*0.1/(0.05 - 0.1)*(np.exp(-0.1*60) - np.exp(-0.05*60))
+    assert(solution.success)
+    assert(C[-1] == approx([A, B, 1000 - A - B], rel=1E-5))
+    
+def test_batch_reactor_sweep_and_energy():
+    def rates(C, T):
+        return (1E6*np.exp(-50000/(8.314*T)))[:, None]*C[:, :1]
+    T = np.array([300, 320, 340])
+    solution = batch_reactor(rates, [[-1, 1]], [1000, 0], 600, T, method="stiff")
+    k = 1E6*np.exp(-50000/(8.314*T))
+    assert(solution.concentrations._value[:, -1, 0] == approx(1000*np.exp(-k*600), rel=1E-3))
+    
+    # the reaction runs away, so it is stiff by the end
+    adiabatic = batch_reactor(rates, [[-1, 1]], [1000, 0], 600, 300, heat_of_reaction=[-80000],
+                              heat_capacity=[200, 200], method="stiff")
+    converted = 1000 - adiabatic.concentrations._value[-1, 0]
+    assert(adiabatic.temperature._value[-1] == approx(300 + 80000*converted/(200*1000)))
+    
+def test_pfr():
+    def rates(C, T):
+        return 0.1*C[:, :1]
+    solution = pfr(rates, [[-1, 1]], MolarFlowRate(np.array([1, 0]), "mol/s"), VolumetricFlowrate(0.01, "m^3/s"),
+                   Volume(200, "L"), Temperature(300, "K"))
+    assert(solution.flow_rates/MolarFlowRate(1, "mol/s") == approx(np.column_stack([np.exp(-10*solution.volume._value),
+                                                                                    1 - np.exp(-10*solution.volume._value)]), abs=1E-6))
+    # A -> 2B in the gas phase speeds up the flow, so less is converted than in a liquid
+    gas = pfr(rates, [[-1, 2]], [1, 0], 0.01, 0.2, 300, gas_phase=True)
+    assert(gas.flow_rates._value[-1, 0] > np.exp(-2))
+    # the total concentration of an isothermal, isobaric gas stays at the inlet value
+    assert(gas.concentrations._value.sum(axis=-1) == approx(100))
+    
+def test_semibatch_reactor():
+    def rates(C, T):
+        return 0.01*C[:, :1]*C[:, 1:2]
+    solution = semibatch_reactor(rates, [[-1, -1, 1]], Amount(np.array([0, 100, 0]), "mol"), Volume(1000, "L"),
+                                 0.001, [1000, 0, 0], 500, 300)
+    assert(solution.success)
+    assert(solution.volume._value[-1] == approx(1.5))
+    # every mole fed ends up as A or C
+    N = solution.moles/Amount(1, "mol")
+    assert(N[-1, 0] + N[-1, 2] == approx(500))
+    assert(N[-1, 1] + N[-1, 2] == approx(100))
+    
+    # the rate law can give its rates in any units
+    def rates_per_litre(C, T):
+        return ReactionRate(1E-5*C[:, :1]*C[:, 1:2], "mol/L*s")
+    per_litre = semibatch_reactor(rates_per_litre, [[-1, -1, 1]], [0, 100, 0], 1.0, 0.001, [1000, 0, 0], 500, 300)
+    assert(per_litre.moles/Amount(1, "mol") == approx(N))
+    
+    heated = semibatch_reactor(rates, [[-1, -1, 1]], [0, 100, 0], 1.0, 0.001, [1000, 0, 0], 500, 300,
+                               feed_temperature=350, heat_of_reaction=[0], heat_capacity=[100, 100, 100])
+    assert(heated.temperature._value[-1] > 300)
+
+def test_levenspiel_cstr_and_pfr():
+    X = [0, 0.2, 0.4, 0.6, 0.8]
+    rate = ReactionRate(np.array([10, 8, 6, 4, 2]), "mol/m^3*s")
+    Fa0 = MolarFlowRate(5, "mol/s")
+    assert(levenspiel_curve(Fa0, X, rate)._value == approx([0.5, 0.625, 5/6, 1.25, 2.5]))
+    assert(cstr_volume_from_data(Fa0, X, rate, 0.6)._value == approx(0.75))
+    assert(cstr_volume_from_data(Fa0, X, rate, [0.4, 0.6])._value == approx([1/3, 0.75]))
+    with pytest.raises(ValueError):
+        cstr_volume_from_data(Fa0, X, rate, 0.9)
+    with pytest.raises(ValueError):
+        cstr_volume_from_data(1, [0.1, 0.5], [1, 1], 0.3, conversion_in=0.5)
+    with pytest.raises(ValueError):
+        cstr_volume_from_data(1, [0.1, 0.5], [1, 1], 0.3, conversion_in=0)
+    with pytest.raises(ValueError):
+        pfr_volume_from_data(Fa0, X, rate, 0.6, method="euler")
+
+    # first order, V = Fa0/(k CA0) ln(1/(1 - X)) with 1e5 points
+    X = np.linspace(0, 0.95, 100000)
+    rate = 0.1*2000*(1 - X)
+    exact = 0.1*np.log(1/(1 - np.array([0.5, 0.9])))
+    for method in ("trapezoid", "simpson", "gauss"):
+        assert(pfr_volume_from_data(20, X, rate, [0.5, 0.9], method=method)._value == approx(exact))
+    assert(pfr_volume_from_data(20, X, rate, 0.9, conversion_in=0.5)._value == approx(exact[1] - exact[0]))
+
+    # simpson is exact for a quadratic curve on uneven points
+    X = np.sort(np.random.default_rng(0).uniform(0, 1, 50))
+    X[0], X[-1] = 0, 1
+    rate = 1/(1 + X**2)
+    assert(pfr_volume_from_data(1, X, rate, 1, method="simpson")._value == approx(4/3, rel=1E-12))
+    # part intervals at either end use the same polynomial, gauss is exact for a cubic curve
+    X_out = np.array([0.33, 0.77, 1])
+    assert(pfr_volume_from_data(1, X, rate, X_out, 0.123, method="simpson")._value
+           == approx(X_out + X_out**3/3 - 0.123 - 0.123**3/3, rel=1E-12))
+    rate = 1/(1 + X**2 + X**3)
+    assert(pfr_volume_from_data(1, X, rate, X_out, 0.123, method="gauss")._value
+           == approx(X_out + X_out**3/3 + X_out**4/4 - 0.123 - 0.123**3/3 - 0.123**4/4, rel=1E-12))
+
+def test_optimal_cstr_series():
+    X = np.linspace(0, 0.95, 100000)
+    rate = 0.1*2000*(1 - X)
+    # for first order reactions equal volumes are best
+    series = optimal_cstr_series(20, X, rate, 0.9, 3)
+    assert(series.conversions[-1] == approx(0.9))
+    assert(series.conversions[0] == approx(1 - 0.1**(1/3), abs=2E-3))
+    assert(series.volumes._value == approx(series.volumes._value.mean(), rel=1E-2))
+    assert(series.total_volume._value == approx(series.volumes._value.sum()))
+    assert(series.total_volume._value < optimal_cstr_series(20, X, rate, 0.9, 2).total_volume._value)
+    assert(optimal_cstr_series(20, X, rate, 0.9, 1).total_volume._value == approx(0.9))
+
+def test_sparse_matrix_solve():
+    rng = np.random.default_rng(1)
+    A = 4*np.eye(300) + (rng.random((300, 300)) < 0.01)*rng.normal(size=(300, 300))
+    rows, cols = np.nonzero(A)
+    sparse = SparseMatrix.from_triplets(rows, cols, A[rows, cols], A.shape)
+    b = rng.normal(size=300)
+    assert(A @ sparse.solve(b) == approx(b))
+    assert(A @ sparse.solve(b, block_size=3, dense=False) == approx(b))
+    assert(sparse.diagonal_blocks(3)[1] == approx(A[3:6, 3:6]))
+    with pytest.raises(NotConverged):
+        sparse.solve(b, dense=False, max_iterations=2)
+
+def test_reactor_flowsheet():
+    def rates(C, T):
+        return 0.01*C[:, :1]
+    flowsheet = ReactorFlowsheet(rates, [[-1, 1]])
+    cstr = flowsheet.add_cstr(Volume(1, "m^3"))
+    tubular = flowsheet.add_pfr(Volume(1, "m^3"))
+    flowsheet.add_feed(cstr, MolarFlowRate(np.array([10, 0]), "mol/s"), 0.01)
+    flowsheet.connect(cstr, tubular)
+    flowsheet.connect(tubular, cstr, 0.5)
+    solution = flowsheet.solve()
+    assert(solution.converged)
+    # the recycle doubles the flow, the CSTR gives F/(1 + k*tau) and the PFR F*exp(-k*tau)
+    pfr_out = 10/1.5*np.exp(-0.5)/(1 - np.exp(-0.5)/3)
+    assert(solution.flow_rates._value[1, 0] == approx(pfr_out, rel=1E-4))
+    assert(solution.products._value == approx([pfr_out/2, 10 - pfr_out/2], rel=1E-4))
+    assert(solution.volumetric_flow._value == approx([0.02, 0.02]))
+
+    with pytest.raises(ValueError):
+        flowsheet.connect(tubular, cstr, 0.6)
+    flowsheet.add_cstr(1)
+    with pytest.raises(ValueError):
+        flowsheet.solve()
+
+def test_reactor_flowsheet_large():
+    # a train of 400 CSTRs with a bypass and a recycle, A + B -> C
+    def rates(C, T):
+        return (1E-4*np.exp(-2000*(1/T - 1/300)))[:, None]*C[:, :1]*C[:, 1:2]
+    def jacobian(C, T):
+        k = 1E-4*np.exp(-2000*(1/T - 1/300))
+        return np.stack([k*C[:, 1], k*C[:, 0], 0*k], axis=-1)[:, None, :]
+    solutions = []
+    for rate_jacobian in (None, jacobian):
+        flowsheet = ReactorFlowsheet(rates, [[-1, -1, 1]], rate_jacobian)
+        for i in range(400):
+            flowsheet.add_cstr(0.001, 300 + i*0.1)
+        flowsheet.add_feed(0, [1000, 800, 0], 0.01)
+        for i in range(399):
+            flowsheet.connect(i, i + 1, 0.8 if i == 200 else 1)
+        flowsheet.connect(200, 50, 0.2)
+        flowsheet.connect(399, 0, 0.3)
+        solution = flowsheet.solve()
+        assert(solution.converged)
+        products = solution.products._value
+        assert(products[0] + products[2] == approx(1000))
+        assert(products[1] + products[2] == approx(800))
+        solutions.append(products)
+    assert(solutions[0] == approx(solutions[1]))
+
+def test_reaction_network_names():
+    network = ReactionNetwork(["A -> B", "2 B -> B + C"], formulas=False)
+    assert(network.species == ("A", "B", "C"))
+    assert(network.elements == ())
+    assert(network.stoichiometry.toarray() == approx(np.array([[-1, 1, 0], [0, -1, 1]])))
+
+def test_mechanism():
+    mechanism = Mechanism(["A -> B", "2 B -> B + C", "B + C -> A + C"], [0.04, 3E7, 1E4])
+    C = np.array([[0.5, 1E-3, 0.3], [0.2, 0.1, 0.0]])
+    rates = mechanism.rates(C, [300, 300])
+    assert(rates == approx(np.array([[0.04*0.5, 3E7*1E-6, 1E4*3E-4], [0.04*0.2, 3E7*1E-2, 0]])))
+    assert(mechanism.formation_rates(C, [300, 300]) == approx(rates @ mechanism.nu.toarray()))
+
+    J = mechanism.jacobian(C, [300, 300])
+    step = 1E-7
+    for j in range(3):
+        up, down = C.copy(), C.copy()
+        up[:, j] += step
+        down[:, j] -= step
+        difference = (mechanism.formation_rates(up, [300, 300]) - mechanism.formation_rates(down, [300, 300]))/(2*step)
+        assert(J[:, :, j] == approx(difference, rel=1E-6, abs=1E-3))
+    assert(mechanism.jacobian(C, [300, 300], sparse=True)[1].toarray() == approx(J[1]))
+    # the padded order 0 slots are not raised to a power, tiny concentrations do not overflow
+    with np.errstate(over="raise"):
+        tiny = mechanism.jacobian(np.array([[1E-310, 1E-320, 0.3]]), [300])
+    assert(tiny[0, :, 0] == approx([-0.04, 0.04, 0]))
+
+    # Robertson's stiff problem, with dense and sparse linear algebra
+    for sparse in (False, True):
+        solution = mechanism.integrate({"A": 1}, Time(40, "s"), 300, t_eval=[0, 40], sparse=sparse)
+        assert(solution.success)
+        assert(solution.concentrations._value[-1] == approx([0.7158271, 9.185535E-6, 0.2841637], rel=1E-5))
+
+    # a sparse solve that does not converge gives NaN so the step is rejected
+    decay = Mechanism(["A -> B"], [2.0])
+    J = decay.jacobian(np.array([[1.0, 0.0]]), [300], sparse=True)
+    assert(decay._sparse_solver(J, np.array([0.5]))(np.array([[1.0, 0.0]])) == approx(np.array([[0.5, 0.5]])))
+    assert(np.isnan(decay._sparse_solver(J, np.array([-0.5]))(np.array([[1.0, 0.0]]))).all())
+
+def test_mechanism_temperature_sweep():
+    mechanism = Mechanism(["A -> B"], 1E6, ActivationEnergy(50, "kJ/mol"))
+    T = np.array([300, 320, 340])
+    solution = mechanism.integrate([1000, 0], 100, T, t_eval=[0, 100], rtol=1E-8, atol=1E-8)
+    k = 1E6*np.exp(-50000/(8.314462618*T))
+    assert(solution.concentrations._value[:, -1, 0] == approx(1000*np.exp(-k*100), rel=1E-5))
+    with pytest.raises(ValueError):
+        mechanism.integrate({"C": 1}, 100, 300)
+
+def test_element_matrix():
+    elements, A = element_matrix(["CH4", "H2O", "SO4^2-"])
+    assert(elements == ("H", "C", "O", "S", "charge"))
+    assert(A == approx(np.array([[4, 2, 0], [1, 0, 0], [0, 1, 4], [0, 0, 1], [0, 0, -2]])))
+
+def test_gibbs_equilibrium():
+    R = 8.314462618
+    species = ["CH4", "H2O", "CO", "CO2", "H2"]
+    G = np.array([19492, -192590, -200275, -395886, 0])
+    result = gibbs_equilibrium(species, G, [1, 3, 0, 0, 0], Temperature(1000, "K"), Pressure(1, "bar"))
+    assert(result.converged)
+    x = result.mole_fractions
+    # both reactions are at equilibrium and the elements are conserved
+    assert(x[2]*x[4]**3/(x[0]*x[1]) == approx(np.exp(-(G[2] - G[0] - G[1])/(R*1000))))
+    assert(x[3]*x[4]/(x[2]*x[1]) == approx(np.exp(-(G[3] + G[4] - G[2] - G[1])/(R*1000))))
+    _, A = element_matrix(species)
+    assert(A @ result.moles == approx(A @ np.array([1, 3, 0, 0, 0])))
+
+    # higher pressure pushes the reforming back
+    sweep = gibbs_equilibrium(species, G, [1, 3, 0, 0, 0], 1000, np.array([1E5, 1E6, 1E7]))
+    assert(sweep.converged.all())
+    assert(sweep.moles[0] == approx(result.moles))
+    assert(np.all(np.diff(sweep.moles[:, 0]) > 0))
+
+def test_gibbs_equilibrium_condensed():
+    R = 8.314462618
+    species = ["CO", "CO2", "C"]
+    G = np.array([-200275, -395886, 0])
+    # carbon deposits from CO until the Boudouard reaction is at equilibrium
+    result = gibbs_equilibrium(species, G, [1, 0, 0], 1000, 1E5, condensed=[False, False, True])
+    assert(result.converged)
+    assert(result.moles[2] > 0)
+    assert(result.mole_fractions[1]/result.mole_fractions[0]**2 == approx(np.exp(-(G[1] - 2*G[0])/(R*1000))))
+    # but not from a CO2 rich gas
+    result = gibbs_equilibrium(species, G, [0.2, 1, 0], 1000, 1E5, condensed=[False, False, True])
+    assert(result.moles == approx([0.2, 1, 0]))
+
+def test_gibbs_equilibrium_map():
+    species = ["CH4", "H2O", "CO", "CO2", "H2", "O2", "N2", "C"]
+    G298 = np.array([-50.5, -228.6, -137.2, -394.4, 0, 0, 0, 0])*1E3
+    G1000 = np.array([19.5, -192.6, -200.3, -395.9, 0, 0, 0, 0])*1E3
+    def gibbs(T):
+        return G298 + (G1000 - G298)*(T[:, None] - 298)/702
+    T = np.linspace(600, 1300, 20)[:, None, None]
+    P = np.array([1E5, 2E6])[None, :, None]
+    feed = np.zeros((10, 8))
+    feed[:, 0], feed[:, 1], feed[:, 6] = 1, np.linspace(0.3, 3, 10), 0.1
+    result = gibbs_equilibrium(species, gibbs, feed, T, P, condensed=[False]*7 + [True])
+    assert(result.moles.shape == (20, 2, 10, 8))
+    assert(result.converged.all())
+    _, A = element_matrix(species)
+    assert(np.abs(result.moles @ A.T - feed @ A.T).max() < 1E-9)
+    # carbon forms at low steam ratios only
+    assert(result.moles[..., 0, 7].max() > 0)
+    assert(result.moles[..., -1, 7].max() == 0)
+
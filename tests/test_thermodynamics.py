@@ -0,0 +1,275 @@
+import numpy as np
+import pytest
+from pytest import approx
+
+from cheme_calculations.thermodynamics import water_psat, water_tsat, water_hvap, antoine_psat, antoine_tsat, SaturationCurve
+from cheme_calculations.thermodynamics import cubic_z, cubic_z_iterative, cubic_properties, CUBIC_EOS, peng_robinson, soave_rendlich_kwong
+from cheme_calculations.thermodynamics import rachford_rice, CubicMixture
+from cheme_calculations.thermodynamics import VanDerWaals, RendlichKwong, SoaveRendlichKwong, PengRobinson
+from cheme_calculations.thermodynamics import lee_kesler_z, lee_kesler_z_exact
+from cheme_calculations.thermodynamics.lee_kesler import LEE_KESLER_CONSTANTS, _fluid_z, _mbwr_residual
+from cheme_calculations.thermodynamics import RaoultsLaw, bubble_pressure, dew_pressure, bubble_temperature, dew_temperature
+from cheme_calculations.units import Temperature, Pressure
+from cheme_calculations.utility.get_chemical_properties import OutOfRangeProperty
+from cheme_calculations.utility.equation_solving import UnsolvableEquation
+
+
+def test_water_saturation():
+    # IAPWS-IF97 verification values
+    assert(water_psat(300) == approx(3536.58941, rel=1E-8))
+    assert(water_psat(500) == approx(2.63889776E6, rel=1E-8))
+    assert(water_tsat(0.1E6) == approx(372.755919, rel=1E-8))
+    assert(water_tsat(10E6) == approx(584.149488, rel=1E-8))
+    assert(water_hvap(373.15) == approx(2257, rel=0.01))
+    
+    T = np.linspace(280, 640, 50)
+    assert(np.allclose(water_tsat(water_psat(T)), T))
+    
+    with pytest.raises(OutOfRangeProperty):
+        water_psat([300, 700])
+        
+def test_antoine_round_trip():
+    A, B, C = np.array([4.01814, 4.07827]), np.array([1203.835, 1343.943]), np.array([-53.226, -53.773])
+    T = np.array([[340.0], [360.0], [380.0]])
+    P = antoine_psat(T, A, B, C)
+    assert(P.shape == (3, 2))
+    assert(np.allclose(antoine_tsat(P, A, B, C), T))
+    
+def test_saturation_curve():
+    curve = SaturationCurve.from_components(["propane", "n-butane", "water"])
+    # normal boiling points
+    assert(np.allclose(curve.tsat(101325), [231.02, 272.66, 373.15], rtol=0.01))
+    
+    T = curve.tsat(np.array([[1E4], [1E5], [1E6]]))
+    assert(np.allclose(curve.psat(T), [[1E4], [1E5], [1E6]]))
+    assert(np.all(curve.hvap(T) > 0))
+    with pytest.raises(UnsolvableEquation):
+        curve.tsat(1E4, max_iterations=1)
+    
+    
+@pytest.mark.parametrize("eos", ["vdw", "rk", "srk", "pr"])
+@pytest.mark.parametrize("phase", ["vapor", "liquid"])
+def test_cubic_z_solves_eos(eos, phase):
+    rng = np.random.default_rng(1)
+    Tr = rng.uniform(0.4, 3, 10000)
+    Pr = rng.uniform(0.01, 5, 10000)
+    z = cubic_z(eos, Tr, Pr, phase, 0.2)
+    
+    e = CUBIC_EOS[eos]
+    B = e.omega*Pr/Tr
+    q = e.psi*e.alpha(Tr, 0.2)/(e.omega*Tr)
+    residual = z - (1 + B - q*B*(z - B)/((z + e.epsilon*B)*(z + e.sigma*B)))
+    assert(np.abs(residual).max() < 1E-12)
+    assert(np.all(z > B))
+    
+def test_cubic_z_phase_mask():
+    Tr = np.array([0.8, 0.8, 1.5])
+    Pr = np.array([0.3, 0.3, 0.3])
+    z = cubic_z("pr", Tr, Pr, np.array([True, False, True]), 0.152)
+    assert(z[0] > 0.7 and z[1] < 0.1)
+    assert(z[2] == approx(cubic_z("pr", 1.5, 0.3, "liquid", 0.152)))
+    
+def test_cubic_wrappers():
+    T = Temperature(300, "K")
+    P = Pressure(1000, "kPa")
+    Tc = Temperature(369.83, "K")
+    Pc = Pressure(4248, "kPa")
+    z = peng_robinson(T, P, Tc, Pc, "vapor", 0.152, 6)
+    assert(z == approx(cubic_z("pr", 300/369.83, 1000/4248, "vapor", 0.152)))
+    assert(soave_rendlich_kwong(T, P, Tc, Pc, "liquid", 0.152, 6) < 0.1)
+    
+@pytest.mark.parametrize("method", ["newton", "halley"])
+@pytest.mark.parametrize("phase", ["vapor", "liquid"])
+def test_cubic_z_iterative_matches_analytic(method, phase):
+    rng = np.random.default_rng(2)
+    Tr = rng.uniform(0.5, 3, 10000)
+    Pr = rng.uniform(0.01, 5, 10000)
+    result = cubic_z_iterative("pr", Tr, Pr, phase, 0.2, method)
+    assert(result.converged.all())
+    assert(np.allclose(result.z, cubic_z("pr", Tr, Pr, phase, 0.2), atol=1E-9))
+    assert(np.abs(result.residual).max() < 1E-12)
+    
+def test_cubic_z_iterative_cap():
+    result = cubic_z_iterative("srk", 0.8, 0.3, "liquid", 0.152, "newton", max_iterations=1)
+    assert(result.iterations == 1)
+    assert(not result.converged)
+    
+def test_rachford_rice():
+    z = np.array([[0.5, 0.3, 0.2], [0.5, 0.3, 0.2], [0.5, 0.3, 0.2]])
+    K = np.array([[3.0, 1.2, 0.2], [0.9, 0.5, 0.1], [5.0, 3.0, 1.1]])
+    beta = rachford_rice(z, K)
+    assert(beta[1] == 0 and beta[2] == 1)
+    assert((z[0]*(K[0] - 1)/(1 + beta[0]*(K[0] - 1))).sum() == approx(0, abs=1E-12))
+    
+@pytest.mark.parametrize("method", ["gdem", "newton"])
+def test_flash(method):
+    mixture = CubicMixture.from_components("pr", ["methane", "propane", "n-pentane"])
+    rng = np.random.default_rng(0)
+    z = rng.dirichlet([1, 1, 1], 500)
+    T = rng.uniform(200, 450, 500)
+    P = rng.uniform(1E5, 8E6, 500)
+    result = mixture.flash(z, T, P, method)
+    assert(result.converged.all())
+    
+    # material balance and equal fugacities in the two phase states
+    beta = result.vapor_fraction[:, None]
+    assert(np.allclose(beta*result.y + (1 - beta)*result.x, z))
+    two = (result.vapor_fraction > 0) & (result.vapor_fraction < 1)
+    assert(two.any() and not two.all())
+    x, y = result.x[two], result.y[two]
+    f_l = np.log(x) + mixture.ln_phi(x, T[two], P[two], "liquid")
+    f_v = np.log(y) + mixture.ln_phi(y, T[two], P[two], "vapor")
+    assert(np.abs(f_l - f_v).max() < 1E-8)
+    
+def test_flash_single_state():
+    mixture = CubicMixture.from_components("srk", ["methane", "propane", "n-pentane"])
+    assert(mixture.flash([0.5, 0.3, 0.2], 300, 3E6).vapor_fraction == approx(0.55, abs=0.05))
+    assert(mixture.flash([0.5, 0.3, 0.2], 400, 1E5).vapor_fraction == 1)
+    assert(mixture.flash([0.01, 0.09, 0.9], 250, 3E6).vapor_fraction == 0)
+    assert(mixture.stability([0.5, 0.3, 0.2], 400, 1E5).stable)
+    assert(not mixture.stability([0.5, 0.3, 0.2], 300, 3E6).stable)
+    
+@pytest.mark.parametrize("eos", ["vdw", "rk", "srk", "pr"])
+@pytest.mark.parametrize("phase", ["vapor", "liquid"])
+def test_cubic_properties(eos, phase):
+    rng = np.random.default_rng(1)
+    Tr = rng.uniform(0.6, 2, 1000)
+    Pr = rng.uniform(0.05, 3, 1000)
+    props = cubic_properties(eos, Tr, Pr, phase, 0.2)
+    assert(np.allclose(props.z, cubic_z(eos, Tr, Pr, phase, 0.2)))
+    
+    # H^R/RT = -Tr dln(phi)/dTr, dln(phi)/dln(Pr) = Z - 1 and G^R = H^R - TS^R
+    h = 1E-6
+    d_ln_phi_T = (cubic_properties(eos, Tr*(1 + h), Pr, phase, 0.2).ln_phi
+                  - cubic_properties(eos, Tr*(1 - h), Pr, phase, 0.2).ln_phi)/(2*h)
+    d_ln_phi_P = (cubic_properties(eos, Tr, Pr*(1 + h), phase, 0.2).ln_phi
+                  - cubic_properties(eos, Tr, Pr*(1 - h), phase, 0.2).ln_phi)/(2*h)
+    assert(np.allclose(-d_ln_phi_T, props.h_residual, atol=1E-7))
+    assert(np.allclose(d_ln_phi_P + 1, props.z, atol=1E-7))
+    assert(np.allclose(props.h_residual - props.s_residual, props.ln_phi))
+    
+def test_cubic_properties_scalar():
+    props = cubic_properties("pr", 300/369.83, 1E6/4.248E6, "vapor", 0.152)
+    assert(isinstance(props.ln_phi, float))
+    assert(props.z == approx(0.81463, rel=1E-4))
+    
+@pytest.mark.parametrize("eos_class,eos", [(VanDerWaals, "vdw"), (RendlichKwong, "rk"), 
+                                           (SoaveRendlichKwong, "srk"), (PengRobinson, "pr")])
+def test_eos_objects(eos_class, eos):
+    fluid = eos_class(Temperature(369.83, "K"), Pressure(42.48, "bar"), 0.152)
+    T = np.linspace(250, 450, 200)
+    for phase in ("vapor", "liquid"):
+        assert(np.allclose(fluid.z(T, 2E6, phase), cubic_z(eos, T/369.83, 2E6/4.248E6, phase, 0.152)))
+        props = fluid.properties(T, 2E6, phase)
+        expected = cubic_properties(eos, T/369.83, 2E6/4.248E6, phase, 0.152)
+        assert(np.allclose(np.array(props), np.array(expected)))
+    assert(isinstance(fluid.z(300, 1E6), float))
+    
+def test_eos_object_components():
+    # one row of states against an array of components
+    fluids = PengRobinson([190.56, 369.83], [45.99E5, 42.48E5], [0.011, 0.152])
+    z = fluids.z(300, 1E6)
+    assert(z.shape == (2,))
+    assert(z[1] == approx(peng_robinson(Temperature(300, "K"), Pressure(1000, "kPa"), 
+                                        Temperature(369.83, "K"), Pressure(4248, "kPa"), "vapor", 0.152, 6)))
+    
+def test_eos_object_sweep():
+    # a temperature sweep of one fluid, the object against one free function call per state
+    T = np.linspace(250, 450, 500)
+    fluid = PengRobinson(369.83, 42.48E5, 0.152)
+    free_functions = [peng_robinson(Temperature(t, "K"), Pressure(2000, "kPa"), Temperature(369.83, "K"), 
+                                    Pressure(4248, "kPa"), "vapor", 0.152, 6) for t in T]
+    assert(np.allclose(free_functions, fluid.z(T, 2E6)))
+    
+def test_lee_kesler_exact():
+    # values from the published Z0 and Z1 tables
+    for Tr, Pr, z0, z1 in [(0.3, 10, 2.8507, -0.7915), (0.3, 0.01, 0.0029, -0.0008), 
+                           (4, 10, 1.1773, 0.2994), (1.5, 2, 0.8328, 0.1806)]:
+        assert(lee_kesler_z_exact(Tr, Pr) == approx(z0, abs=1E-4))
+        assert((lee_kesler_z_exact(Tr, Pr, 0.3978) - z0)/0.3978 == approx(z1, abs=2E-4))
+    
+    # liquid above the vapor pressure, vapor below it
+    assert(lee_kesler_z_exact(0.7, 0.2) < 0.1 < lee_kesler_z_exact(0.7, 0.05))
+    
+    # compressed liquids past the published tables have roots below the starting bracket
+    Tr = np.array([0.3, 0.35, 0.4])
+    Pr = np.array([20, 50, 100])
+    for fluid in LEE_KESLER_CONSTANTS:
+        z = _fluid_z(fluid, Tr, Pr)
+        assert(np.allclose(_mbwr_residual(z*Tr/Pr, Tr, Pr, LEE_KESLER_CONSTANTS[fluid]), 0, atol=1E-8))
+    assert(np.all(np.diff(lee_kesler_z_exact(0.3, [10, 20, 40])) > 0))
+    assert(lee_kesler_z(0.3, 20, 0.2) == approx(lee_kesler_z_exact(0.3, 20, 0.2)))
+    assert(np.isnan(lee_kesler_z_exact(0.3, -1)))
+    
+def test_lee_kesler_interpolated():
+    rng = np.random.default_rng(0)
+    Tr = rng.uniform(0.3, 4, 5000)
+    Pr = np.exp(rng.uniform(np.log(0.01), np.log(10), 5000))
+    omega = rng.uniform(0, 0.5, 5000)
+    z = lee_kesler_z(Tr, Pr, omega)
+    assert(np.abs(z - lee_kesler_z_exact(Tr, Pr, omega)).max() < 1E-3)
+    
+    # next to the critical point
+    Tr = rng.uniform(0.95, 1.05, 2000)
+    Pr = rng.uniform(0.8, 1.3, 2000)
+    assert(np.abs(lee_kesler_z(Tr, Pr, 0.2) - lee_kesler_z_exact(Tr, Pr, 0.2)).max() < 1E-3)
+    
+    # large batches are solved in chunks with the same result
+    assert(_fluid_z("simple", Tr, Pr, chunk_size=7) == approx(_fluid_z("simple", Tr, Pr)))
+    
+    # outside of the tables falls back to the equations
+    assert(lee_kesler_z(5, 12, 0.1) == approx(lee_kesler_z_exact(5, 12, 0.1)))
+    
+def test_raoult_boundaries():
+    # benzene and toluene
+    model = RaoultsLaw([4.01814, 4.07827], [1203.835, 1343.943], [-53.226, -53.773], "K", "bar")
+    x = np.linspace(0.05, 0.95, 19)
+    X = np.column_stack([x, 1 - x])
+    psat = model.psat(353.15)
+    
+    bubble = bubble_pressure(X, Temperature(80, "C"), model)
+    assert(np.allclose(bubble.pressure, X @ psat))
+    assert(np.allclose(bubble.composition, X*psat/bubble.pressure[:, None]))
+    dew = dew_pressure(X, 353.15, model)
+    assert(np.allclose(dew.pressure, 1/(X/psat).sum(axis=1)))
+    
+    # the temperature solvers invert the pressure solvers
+    assert(np.allclose(bubble_temperature(X, bubble.pressure, model).temperature, 353.15))
+    assert(np.allclose(dew_temperature(X, dew.pressure, model).temperature, 353.15))
+    assert(bubble_temperature([0.5, 0.5], Pressure(1.01325, "bar"), model).temperature 
+           == approx(bubble_temperature([0.5, 0.5], 101325, model).temperature))
+    
+@pytest.mark.parametrize("solver", [bubble_pressure, dew_pressure, bubble_temperature, dew_temperature])
+def test_eos_boundaries(solver):
+    mixture = CubicMixture.from_components("pr", ["propane", "n-butane"])
+    x = np.linspace(0.01, 0.99, 99)
+    feed = np.column_stack([x, 1 - x])
+    result = solver(feed, 320 if "pressure" in solver.__name__ else 1E6, mixture)
+    assert(result.converged.all())
+    
+    # equal fugacities between the feed and the incipient phase
+    if "bubble" in solver.__name__:
+        liquid, vapor = feed, result.composition
+    else:
+        liquid, vapor = result.composition, feed
+    f_l = np.log(liquid) + mixture.ln_phi(liquid, result.temperature, result.pressure, "liquid")
+    f_v = np.log(vapor) + mixture.ln_phi(vapor, result.temperature, result.pressure, "vapor")
+    assert(np.abs(f_l - f_v).max() < 1E-8)
+    
+@pytest.mark.parametrize("solver", [bubble_pressure, dew_pressure, bubble_temperature, dew_temperature])
+def test_eos_boundaries_near_critical(solver):
+    # the Wilson start lies past the critical region and falls onto the trivial solution
+    mixture = CubicMixture.from_components("pr", ["methane", "propane", "n-pentane"])
+    feed = np.array([0.217, 0.372, 0.411])
+    result = solver(feed, 397.8 if "pressure" in solver.__name__ else 5E6, mixture)
+    assert(result.converged)
+    if "bubble" in solver.__name__:
+        liquid, vapor = feed, result.composition
+    else:
+        liquid, vapor = result.composition, feed
+    ln_K = mixture.ln_K(liquid, vapor, result.temperature, result.pressure)
+    assert(np.abs(ln_K).max() > 1E-2)
+    assert(np.log(vapor/liquid) == approx(ln_K, abs=1E-8))
+    
+    # a feed with no bubble point at this temperature is not reported as converged
+    assert(not bubble_pressure([0.9, 0.05, 0.05], 397.8, mixture).converged)
@@ -1,2 +1,133 @@
 import pytest
+from pytest import approx
+import numpy as np
+
+from cheme_calculations.utility import get_water_properties, water_T_from_h, water_T_from_s, water_T_from_density
+from cheme_calculations.utility import get_component, get_components
+from cheme_calculations.utility import mole_fractions, wilke_viscosity, wassiljewa_conductivity, ideal_gas_density
+from cheme_calculations.utility import SurrogateTable, solve_ode
+from cheme_calculations.utility.get_chemical_properties import OutOfRangeProperty
+from cheme_calculations.utility.components import AmbiguousComponent, UnknownComponent, _build_component_data, _load_component_data
+from cheme_calculations.units import Temperature
+
+
+@pytest.mark.parametrize("temperature", [280, 333.3, 364, 380, 912.5, 1340])
+def test_water_inverse_round_trip(temperature):
+    w = get_water_properties(temperature)
+    assert(water_T_from_h(w._enthalpy._value) == approx(temperature))
+    assert(water_T_from_s(w._entropy._value) == approx(temperature))
+    assert(water_T_from_density(w._density._value) == approx(temperature))
+    
+def test_water_inverse_two_phase():
+    T = water_T_from_h(np.array([419.17, 1500, 2675.5]))
+    assert(np.allclose(T, 373.12))
+    
+def test_water_inverse_out_of_range():
+    with pytest.raises(OutOfRangeProperty):
+        water_T_from_h([100, 1E5])
+    
+def test_component_lookup():
+    by_name = get_component("Carbon Dioxide")
+    assert(get_component("CO2") is by_name)
+    assert(get_component("124-38-9") is by_name)
+    assert(by_name.Tc == Temperature(304.12, "K"))
+    
+    with pytest.raises(UnknownComponent):
+        get_component("unobtainium")
+    with pytest.raises(AmbiguousComponent):
+        get_component("C4H10")
+        
+def test_component_batch_lookup():
+    c = get_components(["methane", "CO2", "75-28-5"])
+    assert(list(c.name) == ["Methane", "Carbon Dioxide", "Isobutane"])
+    assert(np.allclose(c.Pc, [45.99, 73.74, 36.40]))
+    
+def test_component_data_matches_source(tmp_path):
+    destination = tmp_path / "component_data.npz"
+    _build_component_data(destination=str(destination))
+    columns, _, _ = _load_component_data()
+    with np.load(destination) as rebuilt:
+        for key, values in columns.items():
+            assert(np.array_equal(rebuilt[key], values))
+        
+def test_mixture_pure_limits():
+    mu = np.array([1.79E-5, 2.07E-5])
+    k = np.array([0.0259, 0.0267])
+    M = np.array([28.014, 31.999])
+    x = np.eye(2)
+    assert(np.allclose(wilke_viscosity(x, mu, M), mu))
+    assert(np.allclose(wassiljewa_conductivity(x, k, mu, M), k))
+    
+def test_mixture_batched_matches_single():
+    rng = np.random.default_rng(0)
+    x = mole_fractions(rng.random((20, 4)))
+    mu = 1E-5*(1 + rng.random((20, 4)))
+    M = np.array([2.016, 28.014, 44.01, 16.043])
+    batched = wilke_viscosity(x, mu, M)
+    single = [wilke_viscosity(x[i], mu[i], M) for i in range(20)]
+    assert(np.allclose(batched, single))
+    assert(ideal_gas_density([0.79, 0.21], M[[1, 1]], 300, 101325) == approx(1.1380, rel=1E-3))
+    
+def test_surrogate_table(tmp_path):
+    calls = []
+    def f(x, y):
+        calls.append(1)
+        return np.sin(x)*np.exp(y)
+    
+    path = str(tmp_path / "table.npz")
+    table = SurrogateTable(f, np.linspace(0, 1, 41), np.linspace(0, 1, 41), path)
+    x = np.array([0.1, 0.55, 2.0])
+    y = np.array([0.3, 0.95, 0.5])
+    values = table(x, y)
+    assert(np.all(np.abs(values[:2] - f(x[:2], y[:2])) <= table.error_bound))
+    # outside the grid falls back to the exact function
+    assert(values[2] == approx(f(2.0, 0.5)))
+    
+    calls.clear()
+    cached = SurrogateTable(f, np.linspace(0, 1, 41), np.linspace(0, 1, 41), path)
+    assert(cached(0.55, 0.95) == values[1])
+    assert(not calls)
+    assert(cached.error_bound == table.error_bound)
+    
+    # a read only cache on another grid is built in memory and left untouched
+    before = (tmp_path / "table.npz").read_bytes()
+    other = SurrogateTable(f, np.linspace(0, 1, 21), np.linspace(0, 1, 21), path, read_only=True)
+    assert(other(0.55, 0.95) == approx(f(0.55, 0.95), abs=other.error_bound))
+    assert((tmp_path / "table.npz").read_bytes() == before)
+    missing = SurrogateTable(f, np.linspace(0, 1, 21), np.linspace(0, 1, 21), str(tmp_path / "missing.npz"), read_only=True)
+    missing.build()
+    assert(not (tmp_path / "missing.npz").exists())
+
+
+@pytest.mark.parametrize("method", ["rk45", "stiff"])
+def test_solve_ode_batched(method):
+    # A -> B with a different k for each trajectory
+    k = np.array([0.5, 1, 2])
+    def f(t, y):
+        return np.column_stack([-k*y[:, 0], k*y[:, 0]])
+    t = np.array([0, 0.3, 1, 2])
+    solution = solve_ode(f, (0, 2), np.tile([1.0, 0.0], (3, 1)), t_eval=t, method=method)
+    assert(solution.success.all())
+    assert(solution.y[:, :, 0] == approx(np.exp(-np.outer(k, t)), abs=1E-4))
+    assert(solution.y.sum(axis=-1) == approx(np.ones((3, 4))))
+    
+def test_solve_ode_single():
+    def f(t, y):
+        return np.column_stack([y[:, 1], -y[:, 0]])
+    solution = solve_ode(f, (0, 10), [0, 1], t_eval=np.linspace(0, 10, 7), rtol=1E-9, atol=1E-12)
+    assert(solution.y.shape == (7, 2))
+    assert(solution.y[:, 0] == approx(np.sin(solution.t), abs=1E-6))
+    backward = solve_ode(lambda t, y: -y, (1, 0), [np.exp(-1)], t_eval=[1, 0.5, 0])
+    assert(backward.y[:, 0] == approx(np.exp(-backward.t), rel=1E-5))
+    
+def test_solve_ode_stiff():
+    # Robertson's problem
+    def f(t, y):
+        y1, y2, y3 = y[:, 0], y[:, 1], y[:, 2]
+        return np.column_stack([-0.04*y1 + 1E4*y2*y3, 0.04*y1 - 1E4*y2*y3 - 3E7*y2**2, 3E7*y2**2])
+    solution = solve_ode(f, (0, 40), [1, 0, 0], t_eval=[40], method="stiff", rtol=1E-5, atol=1E-10)
+    assert(solution.success)
+    assert(solution.y[-1] == approx([0.7158271, 9.185535E-6, 0.2841637], rel=1E-3))
+    with pytest.raises(ValueError):
+        solve_ode(f, (0, 1), [1, 0, 0], method="euler")
 